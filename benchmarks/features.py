@@ -0,0 +1,98 @@
+"""
+Derived features: the compiled registry kernel vs pandas column by column.
+
+The pandas version is the Feature Engineering page's original code (one
+Series expression per feature, with Social_Activity_Level read back from
+the frame). Both sides start from the imputed evi.csv rows, resampled to
+each size, and are compared on the same output:
+
+    frame   the five features as typed DataFrame columns (the page):
+            pandas vs derive_frame
+    matrix  the float64 model input, raw columns + features (training and
+            inference): pandas then to_numpy vs FEATURE_KERNEL on the
+            encoded array
+
+Outputs are checked to be equal before anything is timed.
+
+    python benchmarks/features.py                    # 1 row, the dataset, 10x and 50x
+    python benchmarks/features.py --sizes 1 100000
+
+Results go to benchmarks/results/features.json.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results", "features.json")
+
+
+def pandas_features(df):
+    """The page's column-by-column version (Yes/No already encoded as *_encoded)."""
+    out = df.copy()
+    out['Social_Activity_Level'] = out['Social_event_attendance'] + out['Going_outside'] + out['Friends_circle_size']
+    out['Social_Discomfort_Index'] = out['Stage_fear_encoded'] + out['Drained_after_socializing_encoded']
+    out['Social_Balance'] = out['Social_Activity_Level'] / (out['Time_spent_Alone'] + 1)
+    out['Discomfort_Efficiency'] = out['Social_Discomfort_Index'] / (out['Social_Activity_Level'] + 1)
+    out['Posting_Impact'] = out['Post_frequency'] * out['Social_Activity_Level']
+    return out
+
+
+def best_time(fn, repeat):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def main():
+    from utils.data import NUMERIC_COLS, impute_dataset, load_dataset
+    from utils.pipeline import DERIVED_FEATURES, FEATURE_KERNEL, MODEL_FEATURES, YES_NO, derive_frame, encode_raw
+
+    parser = argparse.ArgumentParser(description="Feature kernel vs pandas column-by-column.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=None, help="Row counts (default: 1, n, 10n, 50n)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats; the fastest is kept")
+    args = parser.parse_args()
+
+    base = impute_dataset(load_dataset())
+    # The page's pandas code ran on float32 columns (uint8 products would wrap around)
+    base[NUMERIC_COLS] = base[NUMERIC_COLS].astype('float32')
+    for col in ['Stage_fear', 'Drained_after_socializing']:
+        base[f'{col}_encoded'] = base[col].map(YES_NO).astype('int8')
+    sizes = args.sizes or [1, len(base), 10 * len(base), 50 * len(base)]
+
+    def pandas_matrix(df):
+        return pandas_features(df)[MODEL_FEATURES].to_numpy(dtype=np.float64)
+
+    results = {}
+    for n in sizes:
+        df = base.sample(n, replace=n > len(base), random_state=0).reset_index(drop=True)
+        X = encode_raw(df)
+        if not pandas_features(df)[DERIVED_FEATURES].equals(derive_frame(df)):
+            sys.exit(f"derive_frame differs from the pandas version at {n} rows")
+        if not np.allclose(FEATURE_KERNEL(X), pandas_matrix(df), rtol=1e-6):
+            sys.exit(f"the kernel differs from the pandas version at {n} rows")
+
+        row = {
+            "pandas_frame_s": best_time(lambda: pandas_features(df), args.repeat),
+            "derive_frame_s": best_time(lambda: derive_frame(df), args.repeat),
+            "pandas_matrix_s": best_time(lambda: pandas_matrix(df), args.repeat),
+            "kernel_matrix_s": best_time(lambda: FEATURE_KERNEL(X), args.repeat),
+        }
+        results[str(n)] = row
+        print(f"{n:>9} rows  frame: pandas {row['pandas_frame_s'] * 1e3:8.3f} ms  "
+              f"kernel {row['derive_frame_s'] * 1e3:8.3f} ms ({row['pandas_frame_s'] / row['derive_frame_s']:5.1f}x)  "
+              f"matrix: pandas {row['pandas_matrix_s'] * 1e3:8.3f} ms  "
+              f"kernel {row['kernel_matrix_s'] * 1e3:8.3f} ms ({row['pandas_matrix_s'] / row['kernel_matrix_s']:5.1f}x)")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
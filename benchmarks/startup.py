@@ -0,0 +1,129 @@
+"""
+Cold-start benchmark for the Streamlit pages.
+
+Each page is measured in a fresh interpreter (so nothing is already
+imported):
+    import_s     time to run the page's module-level imports
+    first_run_s  first script run under Streamlit's AppTest harness, which
+                 includes the imports deferred to the rendering path
+    rss_mb       peak resident memory of that interpreter
+
+    python benchmarks/startup.py                      # measure, compare with the baseline
+    python benchmarks/startup.py --update-baseline    # accept the current numbers
+
+Results go to benchmarks/results/startup.json. A page is flagged when a
+metric is more than --tolerance above benchmarks/baselines/startup.json;
+the exit code is 1 if anything regressed.
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results", "startup.json")
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "startup.json")
+METRICS = ["import_s", "first_run_s", "rss_mb"]
+# Differences below these are noise, whatever the relative change
+ABS_SLACK = {"import_s": 0.05, "first_run_s": 0.25, "rss_mb": 10.0}
+
+
+def pages():
+    return [os.path.join(ROOT, "Project_Overview.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+
+def _measure_page(path):
+    """Runs inside the child interpreter; prints one JSON line."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    imports = ast.Module([node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))], [])
+
+    start = time.perf_counter()
+    exec(compile(imports, path, "exec"), {})
+    import_s = time.perf_counter() - start
+
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(path, default_timeout=300)
+    start = time.perf_counter()
+    app.run()
+    first_run_s = time.perf_counter() - start
+
+    print(json.dumps({
+        "import_s": import_s,
+        "first_run_s": first_run_s,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "errors": [e.message for e in app.exception],
+    }))
+
+
+def measure(path):
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONWARNINGS="ignore")
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", path],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for page, metrics in results.items():
+        base = baseline.get(page)
+        if base is None:
+            continue
+        for metric in METRICS:
+            limit = base[metric] * (1 + tolerance) + ABS_SLACK[metric]
+            if metrics[metric] > limit:
+                regressions.append(f"{page}: {metric} {metrics[metric]:.3f} > {base[metric]:.3f} (limit {limit:.3f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-page cold import time and RSS.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per page; the fastest is kept")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        _measure_page(args.child)
+        return
+
+    results = {}
+    for path in pages():
+        name = os.path.relpath(path, ROOT)
+        runs = [measure(path) for _ in range(args.repeat)]
+        best = {metric: min(run[metric] for run in runs) for metric in METRICS}
+        results[name] = best
+        errors = runs[-1]["errors"]
+        print(f"{name:<34} import {best['import_s']:6.3f}s  first run {best['first_run_s']:6.3f}s  "
+              f"rss {best['rss_mb']:7.1f} MB" + (f"  ERRORS: {errors}" if errors else ""))
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline updated: {os.path.relpath(BASELINE_PATH, ROOT)}")
+        return
+
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Benchmark suite: data loading, cleaning, features, inference and pages.
+
+Every stage is timed on evi.csv and on synthetic copies scaled up by
+--scales (rows resampled with replacement, ids renumbered, written to a
+temporary CSV). Metrics are named <stage>/x<scale>/...:
+
+    load/csv_read_s          pd.read_csv with pandas' default types
+    load/csv_typed_s         the same plus compact_dtypes (load_dataset's cold parse)
+    load/parquet_s           reading the typed frame back from Parquet (its warm path)
+    clean/impute_s           impute_dataset with stats_store fill values (show_cleaning)
+    features/derive_frame_s  the five derived columns as a DataFrame (Feature Engineering page)
+    features/kernel_s        FEATURE_KERNEL on the encoded array (training and inference)
+    predict/<model>/batch_s  transform + predict_proba of every row
+    predict/<model>/single_s one row, on evi.csv only (per-request latency)
+
+and once per page (evi.csv):
+
+    page/<page>/run_s        a script run under Streamlit's AppTest harness, with
+                             the shared caches already warm (what a visitor waits for)
+
+Each timing is the fastest of --repeat runs. Results go to
+benchmarks/results/suite.json. A metric is flagged when it is more than
+--tolerance above benchmarks/baselines/suite.json (plus a small absolute
+slack for noise); the exit code is 1 if anything regressed. Compare
+against a baseline taken on the same machine.
+
+    python benchmarks/suite.py                       # measure, compare with the baseline
+    python benchmarks/suite.py --scales 1 10 50 --skip-pages
+    python benchmarks/suite.py --update-baseline     # accept the current numbers
+
+benchmarks/startup.py measures cold starts (imports, first run, RSS) instead.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+import warnings
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+RESULTS_PATH = os.path.join(ROOT, "benchmarks", "results", "suite.json")
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "suite.json")
+# Differences below these (seconds) are noise, whatever the relative change
+ABS_SLACK = {"load": 0.01, "clean": 0.005, "features": 0.002, "predict": 0.002, "page": 0.25}
+
+
+def best_time(fn, repeat):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def pages():
+    return [os.path.join(ROOT, "Project_Overview.py")] + sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+
+def scaled_csv(source, scale, directory):
+    """Path of evi.csv resampled to `scale` times its rows (the file itself for scale 1)."""
+    if scale == 1:
+        return source
+    import pandas as pd
+    df = pd.read_csv(source)
+    df = df.sample(int(len(df) * scale), replace=True, random_state=0).reset_index(drop=True)
+    df['id'] = np.arange(len(df))
+    path = os.path.join(directory, f"evi_x{scale:g}.csv")
+    df.to_csv(path, index=False)
+    return path
+
+
+def bench_data(path, label, repeat, registry, single_row):
+    """{metric: seconds} for one CSV."""
+    import pandas as pd
+    from utils.data import compact_dtypes, impute_dataset
+    from utils.pipeline import FEATURE_KERNEL, derive_frame, encode_raw
+    from utils.stats_store import load_stats
+
+    results = {}
+    results[f"load/{label}/csv_read_s"] = best_time(lambda: pd.read_csv(path), repeat)
+    results[f"load/{label}/csv_typed_s"] = best_time(lambda: compact_dtypes(pd.read_csv(path)), repeat)
+    df = compact_dtypes(pd.read_csv(path))
+    with tempfile.TemporaryDirectory() as directory:
+        parquet_path = os.path.join(directory, "typed.parquet")
+        try:
+            df.to_parquet(parquet_path, index=False)
+            results[f"load/{label}/parquet_s"] = best_time(lambda: pd.read_parquet(parquet_path), repeat)
+        except ImportError:
+            pass   # no pyarrow: load_dataset re-parses the CSV too
+
+    fill_values = load_stats(path).fill_values()
+    results[f"clean/{label}/impute_s"] = best_time(lambda: impute_dataset(df, fill_values), repeat)
+    clean = impute_dataset(df, fill_values)
+    X_raw = encode_raw(clean)
+    results[f"features/{label}/derive_frame_s"] = best_time(lambda: derive_frame(clean), repeat)
+    results[f"features/{label}/kernel_s"] = best_time(lambda: FEATURE_KERNEL(X_raw), repeat)
+
+    X_all = encode_raw(df)
+    for name in registry.names:
+        model, pipeline = registry.get(name)
+        results[f"predict/{label}/{name}/batch_s"] = best_time(
+            lambda: model.predict_proba(pipeline.transform(X_all)), repeat)
+        if single_row:
+            row = X_all[:1]
+            results[f"predict/{label}/{name}/single_s"] = best_time(
+                lambda: model.predict_proba(pipeline.transform(row)), repeat)
+    return results
+
+
+def bench_pages(repeat):
+    from streamlit.testing.v1 import AppTest
+
+    results, errors = {}, {}
+    for path in pages():
+        name = os.path.relpath(path, ROOT)
+        AppTest.from_file(path, default_timeout=300).run()   # fills the shared caches
+
+        def run():
+            app = AppTest.from_file(path, default_timeout=300).run()
+            if app.exception:
+                errors[name] = [e.message for e in app.exception]
+
+        # One script run is far above timeit's autorange threshold
+        results[f"page/{name}/run_s"] = min(timeit.repeat(run, number=1, repeat=repeat))
+    return results, errors
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for metric, value in results.items():
+        base = baseline.get(metric)
+        if base is None:
+            continue
+        limit = base * (1 + tolerance) + ABS_SLACK[metric.split("/")[0]]
+        if value > limit:
+            regressions.append(f"{metric} {value:.4f}s > {base:.4f}s (limit {limit:.4f}s)")
+    return regressions
+
+
+def environment():
+    import pandas as pd
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load, clean, feature, inference and page benchmarks.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10],
+                        help="Dataset sizes as multiples of evi.csv")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats; the fastest is kept")
+    parser.add_argument("--skip-pages", action="store_true", help="Leave out the AppTest page runs")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)   # the pages and caches use paths relative to the repo
+    warnings.filterwarnings("ignore")
+    from utils.data import DATA_PATH
+    from utils.registry import ModelRegistry
+
+    registry = ModelRegistry()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in args.scales:
+            label = f"x{scale:g}"
+            path = scaled_csv(DATA_PATH, scale, directory)
+            timings = bench_data(path, label, args.repeat, registry, single_row=scale == 1)
+            results.update(timings)
+            for metric, seconds in timings.items():
+                print(f"{metric:<50} {seconds * 1e3:10.3f} ms")
+
+    errors = {}
+    if not args.skip_pages:
+        timings, errors = bench_pages(args.repeat)
+        results.update(timings)
+        for metric, seconds in timings.items():
+            page = metric[len("page/"):-len("/run_s")]
+            print(f"{metric:<50} {seconds * 1e3:10.3f} ms" + (f"  ERRORS: {errors[page]}" if page in errors else ""))
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump({"environment": environment(), "errors": errors, "metrics": results}, f, indent=2)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"environment": environment(), "metrics": results}, f, indent=2)
+            f.write("\n")
+        print(f"Baseline updated: {os.path.relpath(BASELINE_PATH, ROOT)}")
+        return
+
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            regressions = compare(results, json.load(f)["metrics"], args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        sys.exit(1 if regressions or errors else 0)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,46 @@
 import pandas as pd
 import streamlit as st
 import io
+from utils.dedup import load_duplicate_index
+from utils.profiling import profile_dataset
 
 # Page setup
 st.set_page_config(page_title="Data Inspection Tool", layout="wide")
 st.title("📊 Data Inspection Dashboard")
 
+# Large exports can be profiled from a random sample of the file
+st.sidebar.header("Profiling")
+scan = st.sidebar.radio("Scan", ["Full file", "Sample"],
+                        help="The full file is read block by block; a sample reads only a share of the blocks.")
+sample = None
+if scan == "Sample":
+    sample = st.sidebar.slider("Sample size (% of file)", 1, 100, 10) / 100
+
 # 1. Load the Dataset
-# We use cache so the file doesn't reload every time you interact with the app
-@st.cache_data
+# profile_dataset computes every table below in one pass over the CSV and
+# caches the result per dataset version
 def load_data():
     try:
-        return pd.read_csv("evi.csv")
+        return profile_dataset(sample=sample)
     except FileNotFoundError:
         st.error("File 'evi.csv' not found. Please ensure the file is in the same directory.")
         return None
 
-df = load_data()
+profile = load_data()
 
-if df is not None:
+if profile is not None:
+    if profile.sample is not None:
+        st.info(f"Profiled {profile.rows_scanned:,} sampled rows; totals are estimated for the whole file.")
     # 2. Preview the First 5 Rows
     st.subheader("1. Preview Data")
     st.caption("Displays the top 5 rows to understand structure.")
-    st.dataframe(df.head())
+    st.dataframe(profile.head())
 
 # 3. Check Data Info (Converted to DataFrame)
     st.subheader("2. Data Info")
     
     # Construct a DataFrame with the info details
-    info_df = pd.DataFrame({
-        'Column': df.columns,
-        'Non-Null Count': df.count().values,
-        'Dtype': df.dtypes.astype(str).values
-    })
+    info_df = profile.info()
     
     # Display as an interactive table
     # hide_index=True makes it look cleaner by removing the 0,1,2 row numbers
@@ -42,14 +50,14 @@ if df is not None:
     st.subheader("3. Dataset Dimensions")
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Total Rows", df.shape[0])
+        st.metric("Total Rows", profile.rows)
     with col2:
-        st.metric("Total Columns", df.shape[1])
+        st.metric("Total Columns", len(profile.header))
 
     # 5. Statistical Summary
     st.subheader("4. Statistical Summary")
     st.caption("Count, mean, std, min, max, and quartiles for numerical columns.")
-    st.dataframe(df.describe())
+    st.dataframe(profile.describe())
 
     # 6. Categorical Data Inspection
     st.subheader("5. Categorical Data Inspection")
@@ -58,28 +66,50 @@ if df is not None:
     
     with c1:
         st.write("**Unique Values in Object Columns:**")
-        st.dataframe(df.select_dtypes(include='object').nunique(), use_container_width=True)
+        st.dataframe(profile.nunique(), use_container_width=True)
 
     with c2:
         st.write("**Personality Distribution:**")
         # Display as a dataframe
-        st.dataframe(df['Personality'].value_counts(), use_container_width=True)
+        personality_counts = profile.value_counts('Personality')
+        st.dataframe(personality_counts, use_container_width=True)
         # Optional: Add a simple chart for better visualization
-        st.bar_chart(df['Personality'].value_counts())
+        st.bar_chart(personality_counts)
 
     # 7. Check for Duplicates
     st.subheader("6. Data Quality Checks")
-    dup_count = df.duplicated().sum()
+    # Row hashes are indexed once; later runs only hash rows appended to the file
+    ignore_id = st.checkbox("Ignore the id column", value=False,
+                            help="Rows that only differ in their id count as duplicates.")
+    dup_index = load_duplicate_index(ignore=["id"] if ignore_id else [])
+    dup_count = dup_index.duplicates
     if dup_count == 0:
         st.success(f"Duplicate Rows: {dup_count}")
     else:
         st.warning(f"Duplicate Rows: {dup_count}")
+        st.write(f"**Largest Duplicate Groups** ({dup_index.group_count()} in total):")
+        groups = dup_index.groups(limit=10)
+        st.dataframe(pd.DataFrame({
+            'Rows in Group': [len(group) for group in groups],
+            'Row Numbers': [", ".join(map(str, group[:10])) + (" ..." if len(group) > 10 else "") for group in groups]
+        }), use_container_width=True, hide_index=True)
 
     # 8. Check for Missing Values
     st.write("**Missing Values per Column:**")
-    missing_data = df.isnull().sum()
+    missing_data = profile.missing()
     st.dataframe(missing_data)
     
     # Visualizing missing data (Filtering only columns with missing values)
     if missing_data.sum() > 0:
-        st.bar_chart(missing_data[missing_data > 0])
\ No newline at end of file
+        st.bar_chart(missing_data[missing_data > 0])
+    # 9. Memory Footprint
+    st.subheader("7. Memory Footprint")
+    st.caption("Bytes per column as pandas parses the CSV by default vs the compact types the app keeps in memory (missing values are kept).")
+    mem_df = profile.memory()
+    default_total, compact_total = mem_df['Default Bytes'].sum(), mem_df['Compact Bytes'].sum()
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Default Layout", f"{default_total / 1024:,.0f} KB")
+    m2.metric("Compact Layout", f"{compact_total / 1024:,.0f} KB")
+    m3.metric("Saved", f"{1 - compact_total / default_total:.0%}")
+    mem_df['Saved'] = (1 - mem_df['Compact Bytes'] / mem_df['Default Bytes']).map("{:.0%}".format)
+    st.dataframe(mem_df, use_container_width=True, hide_index=True)
@@ -1,42 +1,43 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+from utils.correlation import correlation_matrix, top_pairs
+from utils.data import file_hash, impute_dataset, load_dataset
+from utils.eda_store import load_aggregates
+from utils.instrumentation import page_run, span
+from utils.stats_store import load_stats
 
 def show_eda():
     st.title("📊 Complete & Interpreted EDA")
     st.markdown("Understanding the data with automated insights for Numerical, Categorical, and Correlation analysis.")
 
     # --- Data Loading ---
-    @st.cache_data
-    def get_clean_data():
-        try:
-            df = pd.read_csv("evi.csv")
-            # Basic Imputation
-            num_cols = df.select_dtypes(include=['number']).columns
-            cat_cols = df.select_dtypes(include=['object']).columns
-            df[num_cols] = df[num_cols].fillna(df[num_cols].median())
-            for col in cat_cols:
-                df[col] = df[col].fillna(df[col].mode()[0])
-            return df
-        except FileNotFoundError:
-            return None
-
-    df = get_clean_data()
-    if df is None:
+    # Charts read precomputed per-feature aggregates (built once per dataset version)
+    try:
+        with span("load aggregates"):
+            agg = load_aggregates()
+    except FileNotFoundError:
         st.error("⚠️ File 'evi.csv' not found.")
         return
 
+    # cache_resource shares one imputed frame per dataset version (cache_data would copy it per call)
+    @st.cache_resource
+    def get_clean_data(data_hash):
+        # Basic Imputation (medians/modes come from the incremental stats store)
+        return impute_dataset(load_dataset(), load_stats().fill_values())
+
     # ==========================================
     #              SIDEBAR CONTROLS
     # ==========================================
     st.sidebar.header("Settings")
     
     # 1. Numerical Selectors
-    numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
+    numeric_cols = list(agg["numeric"])
     selected_num = st.sidebar.selectbox("Select Numerical Feature:", numeric_cols)
 
     # 2. Categorical Selectors
-    cat_cols = [c for c in df.select_dtypes(include='object').columns if c != 'Personality']
+    cat_cols = list(agg["categorical"])
     selected_cat = st.sidebar.selectbox("Select Categorical Feature:", cat_cols) if cat_cols else None
 
     # ==========================================
@@ -50,8 +51,10 @@ def show_eda():
     # ==========================================
     #       TAB 1: NUMERICAL ANALYSIS
     # ==========================================
-    with tab1:
+    with tab1, span("numerical tab"):
         st.header(f"Analyzing: {selected_num}")
+        num_stats = agg["numeric"][selected_num]
+        group_stats = num_stats["groups"]
         
         # --- Row 1: Average & Distribution ---
         col1, col2 = st.columns(2)
@@ -59,7 +62,8 @@ def show_eda():
         # Plot 1: Average Comparison (Bar)
         with col1:
             st.subheader("1. Compare Averages")
-            avg_df = df.groupby("Personality")[selected_num].mean().reset_index()
+            avg_df = pd.DataFrame({"Personality": list(group_stats),
+                                   selected_num: [s["mean"] for s in group_stats.values()]})
             
             fig_avg = px.bar(
                 avg_df, x="Personality", y=selected_num, color="Personality",
@@ -78,11 +82,19 @@ def show_eda():
         # Plot 2: Distribution Spread (Histogram)
         with col2:
             st.subheader("2. Distribution Spread")
-            fig_hist = px.histogram(
-                df, x=selected_num, color="Personality", 
+            # Pre-binned counts drawn as bars (no raw rows sent to the browser)
+            edges = num_stats["bin_edges"]
+            hist_df = pd.DataFrame([
+                {selected_num: (lo + hi) / 2, "count": c, "Personality": group}
+                for group, s in group_stats.items()
+                for lo, hi, c in zip(edges[:-1], edges[1:], s["hist_counts"])
+            ])
+            fig_hist = px.bar(
+                hist_df, x=selected_num, y="count", color="Personality",
                 barmode="overlay", opacity=0.6,
                 title=f"Distribution of {selected_num}"
             )
+            fig_hist.update_traces(width=edges[1] - edges[0])
             st.plotly_chart(fig_hist, use_container_width=True)
             st.info(" Overlapping colors mean similar behavior. Separated colors mean this feature strongly distinguishes the two personalities.")
 
@@ -95,7 +107,8 @@ def show_eda():
         with col3:
             st.subheader("3. Share of Total")
             # Calculate Sum
-            sum_df = df.groupby("Personality")[selected_num].sum().reset_index()
+            sum_df = pd.DataFrame({"Personality": list(group_stats),
+                                   selected_num: [s["sum"] for s in group_stats.values()]})
             
             fig_pie = px.pie(
                 sum_df, values=selected_num, names="Personality",
@@ -118,21 +131,40 @@ def show_eda():
         # Plot 4: Box Plot (Median & Outliers)
         with col4:
             st.subheader("4. Median & Outliers")
-            fig_box = px.box(
-                df, x="Personality", y=selected_num, color="Personality",
-                title=f"Box Plot of {selected_num}",
-                color_discrete_map={"Introvert": "#636EFA", "Extrovert": "#EF553B"}
-            )
+            # Box drawn from the stored quartiles and whiskers
+            colors = {"Introvert": "#636EFA", "Extrovert": "#EF553B"}
+            fig_box = go.Figure()
+            empty = [group for group, s in group_stats.items() if not s["count"]]
+            for group, s in group_stats.items():
+                if group in empty:
+                    continue
+                fig_box.add_trace(go.Box(
+                    name=group, x=[group], q1=[s["q1"]], median=[s["median"]], q3=[s["q3"]],
+                    lowerfence=[s["lower_fence"]], upperfence=[s["upper_fence"]],
+                    marker_color=colors.get(group), legendgroup=group
+                ))
+                # Capped sample of the outliers instead of every raw point
+                if s["outliers"]:
+                    fig_box.add_trace(go.Scatter(
+                        x=[group] * len(s["outliers"]), y=s["outliers"], mode="markers",
+                        marker_color=colors.get(group), legendgroup=group, showlegend=False,
+                        name=f"{group} outliers ({s['n_outliers']})"
+                    ))
+            fig_box.update_layout(title=f"Box Plot of {selected_num}", xaxis_title="Personality",
+                                  yaxis_title=selected_num, legend_title="Personality")
             st.plotly_chart(fig_box, use_container_width=True)
-            
+            for group in empty:
+                st.caption(f"No {group} rows have a {selected_num} value, so there is no box for them.")
+
             # Interpretation
-            i_med = df[df['Personality'] == 'Introvert'][selected_num].median()
-            e_med = df[df['Personality'] == 'Extrovert'][selected_num].median()
-            
-            if i_med > e_med:
-                st.info(f" The median Introvert ({i_med:.2f}) is higher than the median Extrovert ({e_med:.2f}).")
-            else:
-                st.info(f" The median Extrovert ({e_med:.2f}) is higher than the median Introvert ({i_med:.2f}).")
+            i_med = group_stats.get('Introvert', {}).get('median')
+            e_med = group_stats.get('Extrovert', {}).get('median')
+
+            if i_med is not None and e_med is not None:
+                if i_med > e_med:
+                    st.info(f" The median Introvert ({i_med:.2f}) is higher than the median Extrovert ({e_med:.2f}).")
+                else:
+                    st.info(f" The median Extrovert ({e_med:.2f}) is higher than the median Introvert ({i_med:.2f}).")
 
     # ==========================================
     #       TAB 2: CATEGORICAL ANALYSIS
@@ -140,9 +172,16 @@ def show_eda():
     # ==========================================
     #       TAB 2: CATEGORICAL ANALYSIS
     # ==========================================
-    with tab2:
+    with tab2, span("categorical tab"):
         if selected_cat:
             st.header(f"Analyzing: {selected_cat}")
+            cat_stats = agg["categorical"][selected_cat]
+            # Personality x level counts, long format
+            counts_df = pd.DataFrame([
+                {"Personality": group, selected_cat: level, "Count": c}
+                for group, counts in cat_stats["counts"].items()
+                for level, c in zip(cat_stats["levels"], counts)
+            ])
             
             # --- Row 1: Split & Counts ---
             c1, c2 = st.columns(2)
@@ -151,8 +190,9 @@ def show_eda():
             with c1:
                 st.subheader("1. Proportional Split")
                 # Create a normalized crosstab for percentages
-                cross = pd.crosstab(df['Personality'], df[selected_cat], normalize='index') * 100
-                cross = cross.reset_index().melt(id_vars='Personality', var_name=selected_cat, value_name='Percentage')
+                cross = counts_df.copy()
+                cross['Percentage'] = cross['Count'] / cross.groupby('Personality')['Count'].transform('sum') * 100
+                cross = cross.drop(columns='Count')
                 
                 fig_stack = px.bar(
                     cross, x="Percentage", y="Personality", color=selected_cat,
@@ -172,8 +212,8 @@ def show_eda():
             # Plot 2: Raw Counts Grouped
             with c2:
                 st.subheader("2. Raw Counts")
-                fig_group = px.histogram(
-                    df, x=selected_cat, color="Personality", 
+                fig_group = px.bar(
+                    counts_df, x=selected_cat, y="Count", color="Personality", 
                     barmode="group", text_auto=True,
                     title=f"Count of People by {selected_cat}"
                 )
@@ -190,8 +230,8 @@ def show_eda():
             with c3:
                 st.subheader("3. Overall Distribution")
                 # Global counts regardless of personality
-                global_counts = df[selected_cat].value_counts().reset_index()
-                global_counts.columns = [selected_cat, 'Count']
+                global_counts = counts_df.groupby(selected_cat, as_index=False)['Count'].sum()
+                global_counts = global_counts.sort_values('Count', ascending=False).reset_index(drop=True)
                 
                 fig_pie = px.pie(
                     global_counts, values='Count', names=selected_cat,
@@ -209,7 +249,7 @@ def show_eda():
                 st.subheader("4. Hierarchy (Sunburst)")
                 # Hierarchy: Personality -> Category
                 fig_sun = px.sunburst(
-                    df, path=['Personality', selected_cat], 
+                    counts_df, path=['Personality', selected_cat], values='Count',
                     title=f"Hierarchy: Personality ➝ {selected_cat}"
                 )
                 st.plotly_chart(fig_sun, use_container_width=True)
@@ -222,12 +262,20 @@ def show_eda():
     # ==========================================
     #       TAB 3: CORRELATION HEATMAP
     # ==========================================
-    with tab3:
+    with tab3, span("correlation tab"):
         st.header("Feature Correlations")
         st.markdown("This map shows how features relate to each other. **Red** = Positive relationship (move together). **Blue** = Negative relationship (move opposite).")
 
         # Calculate Correlation
-        corr_matrix = df[numeric_cols].corr()
+        try:
+            with span("clean data"):
+                df = get_clean_data(file_hash())
+        except FileNotFoundError:
+            st.error("⚠️ File 'evi.csv' not found.")
+            return
+        # One float32 matrix product, cached per dataset version and column set
+        with span("correlation matrix"):
+            corr_matrix = correlation_matrix(df, numeric_cols, data_key=file_hash())
 
         # Plot Heatmap
         fig_corr = px.imshow(
@@ -242,13 +290,11 @@ def show_eda():
         # Automated Interpretation of Strongest Correlation
         st.subheader("🔍 Top Relationships")
         
-        # Unstack matrix, remove self-correlations (1.0), and sort
-        corr_unstacked = corr_matrix.abs().unstack()
-        corr_unstacked = corr_unstacked[corr_unstacked < 1.0].sort_values(ascending=False)
+        # Strongest pair of the upper triangle (partial selection, no full sort)
+        pairs = top_pairs(corr_matrix, k=1)
         
-        if not corr_unstacked.empty:
-            top_pair = corr_unstacked.index[0]
-            val = corr_matrix.loc[top_pair]
+        if pairs:
+            *top_pair, val = pairs[0]
             st.info(f" The strongest relationship in the data is between **{top_pair[0]}** and **{top_pair[1]}** (Correlation: {val:.2f}).")
             
             if val > 0:
@@ -258,4 +304,5 @@ def show_eda():
 
 if __name__ == "__main__":
     st.set_page_config(page_title="Interpreted EDA", layout="wide")
-    show_eda()
\ No newline at end of file
+    with page_run("show_eda"):
+        show_eda()
\ No newline at end of file
@@ -1,44 +1,46 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+from utils.binning import bin_centers, grouped_histogram, histogram_edges
+from utils.data import impute_dataset, load_dataset
+from utils.instrumentation import page_run, span
+from utils.stats_store import load_stats
 
 def show_cleaning():
     st.title("Tx Data Cleaning & Preprocessing")
     st.markdown("This module handles missing values (Imputation) and prepares the data for analysis.")
 
     # --- 1. Load Raw Data ---
-    @st.cache_data
     def load_raw_data():
         try:
-            return pd.read_csv("evi.csv")
+            return load_dataset()
         except FileNotFoundError:
             return None
 
-    df_raw = load_raw_data()
+    with span("load dataset"):
+        df_raw = load_raw_data()
     
     if df_raw is None:
         st.error("⚠️ File 'evi.csv' not found.")
         return
 
-    # Create a copy for cleaning
-    df_clean = df_raw.copy()
+    # Medians, modes, means and missing counts are kept up to date incrementally
+    with span("load stats"):
+        stats = load_stats()
+        fill_values = stats.fill_values()
+        missing = stats.missing()
 
     # Define Columns
     num_cols = df_raw.select_dtypes(include=['number']).columns.tolist()
-    cat_cols = df_raw.select_dtypes(include=['object']).columns.tolist()
+    cat_cols = df_raw.select_dtypes(include=['object', 'category']).columns.tolist()
     if 'Personality' in cat_cols: cat_cols.remove('Personality')
 
     # --- 2. Perform Cleaning (Backend) ---
-    # Impute Numerical with Median
-    for col in num_cols:
-        median_val = df_clean[col].median()
-        df_clean[col] = df_clean[col].fillna(median_val)
-
-    # Impute Categorical with Mode
-    for col in cat_cols:
-        mode_val = df_clean[col].mode()[0]
-        df_clean[col] = df_clean[col].fillna(mode_val)
+    # Impute Numerical with Median, Categorical with Mode
+    with span("impute"):
+        df_clean = impute_dataset(df_raw, fill_values)
 
     # ==========================================
     #              SIDEBAR CONTROLS
@@ -48,7 +50,7 @@ def show_cleaning():
     # --- MOVED: Feature Selector in Sidebar ---
     st.sidebar.subheader(" Inspect Feature")
     # Identify columns that originally had missing values
-    cols_with_missing = [col for col in df_raw.columns if df_raw[col].isnull().sum() > 0]
+    cols_with_missing = [col for col in df_raw.columns if missing.get(col, 0) > 0]
     
     selected_col = None
     if cols_with_missing:
@@ -69,10 +71,10 @@ def show_cleaning():
     col1, col2 = st.columns(2)
     
     # BEFORE Chart
-    with col1:
+    with col1, span("missing before chart"):
         st.subheader(" Before Cleaning")
-        missing_raw = df_raw.isnull().sum().reset_index()
-        missing_raw.columns = ['Feature', 'Missing Count']
+        missing_raw = pd.DataFrame({'Feature': list(df_raw.columns),
+                                    'Missing Count': [missing.get(col, 0) for col in df_raw.columns]})
         missing_raw = missing_raw[missing_raw['Missing Count'] > 0]
         
         if not missing_raw.empty:
@@ -85,7 +87,7 @@ def show_cleaning():
             st.error(f"Total Missing Values: {missing_raw['Missing Count'].sum()}")
 
     # AFTER Chart
-    with col2:
+    with col2, span("missing after chart"):
         st.subheader(" After Cleaning")
         missing_clean = df_clean.isnull().sum().reset_index()
         missing_clean.columns = ['Feature', 'Missing Count']
@@ -111,21 +113,28 @@ def show_cleaning():
         
         # Determine strategy and value used
         strategy = "Median" if selected_col in num_cols else "Mode"
-        fill_value = df_clean[selected_col].mode()[0] if strategy == "Mode" else df_clean[selected_col].median()
+        fill_value = fill_values[selected_col]
         
         c1, c2 = st.columns([2, 1]) # Make chart wider
         
         # --- Visual Comparison ---
-        with c1:
+        with c1, span("deep dive chart"):
             if selected_col in num_cols:
-                # Numerical: Histogram Overlay
+                # Numerical: Histogram Overlay, binned here so only the counts reach the browser
+                raw_values = df_raw[selected_col].to_numpy(dtype='float64', na_value=float('nan'))
+                clean_values = df_clean[selected_col].to_numpy(dtype='float64')
+                edges = histogram_edges(clean_values)
+                raw_hist = grouped_histogram(raw_values, np.zeros(len(raw_values), dtype=int), 1, edges)[0]
+                clean_hist = grouped_histogram(clean_values, np.zeros(len(clean_values), dtype=int), 1, edges)[0]
+                centers, width = bin_centers(edges), edges[1] - edges[0]
+
                 fig_overlay = go.Figure()
-                fig_overlay.add_trace(go.Histogram(
-                    x=df_raw[selected_col], name='Original (with NaNs)',
+                fig_overlay.add_trace(go.Bar(
+                    x=centers, y=raw_hist, width=width, name='Original (with NaNs)',
                     opacity=0.5, marker_color='#EF553B'
                 ))
-                fig_overlay.add_trace(go.Histogram(
-                    x=df_clean[selected_col], name=f'Cleaned (NaNs → {fill_value:.1f})',
+                fig_overlay.add_trace(go.Bar(
+                    x=centers, y=clean_hist, width=width, name=f'Cleaned (NaNs → {fill_value:.1f})',
                     opacity=0.5, marker_color='#636EFA'
                 ))
                 fig_overlay.update_layout(barmode='overlay', title=f"Before vs After: {selected_col}")
@@ -133,11 +142,12 @@ def show_cleaning():
             
             else:
                 # Categorical: Grouped Bar
-                raw_counts = df_raw[selected_col].value_counts(dropna=False).reset_index()
+                # load_dataset returns categoricals, which only accept their own categories:
+                # label the missing values on a plain object copy before counting
+                raw_labels = df_raw[selected_col].astype(object).fillna("Missing (NaN)")
+                raw_counts = raw_labels.value_counts().reset_index()
                 raw_counts.columns = [selected_col, 'Count']
                 raw_counts['Type'] = 'Original'
-                # Fill NaN string for plotting
-                raw_counts[selected_col] = raw_counts[selected_col].fillna("Missing (NaN)")
                 
                 clean_counts = df_clean[selected_col].value_counts().reset_index()
                 clean_counts.columns = [selected_col, 'Count']
@@ -152,17 +162,17 @@ def show_cleaning():
                 st.plotly_chart(fig_cat, use_container_width=True)
 
         # --- Statistical Stats ---
-        with c2:
+        with c2, span("impact stats"):
             st.subheader("Impact Stats")
-            missing_count = df_raw[selected_col].isnull().sum()
+            missing_count = missing[selected_col]
             
             st.metric("Missing Rows Filled", f"{missing_count}")
             st.metric("Imputation Strategy", strategy)
             st.metric("Fill Value", f"{fill_value}")
             
             if selected_col in num_cols:
-                mean_before = df_raw[selected_col].mean()
-                mean_after = df_clean[selected_col].mean()
+                mean_before = stats.columns[selected_col].mean
+                mean_after = stats.mean_after_fill(selected_col)
                 delta = mean_after - mean_before
                 st.metric("Mean Shift", f"{mean_after:.2f}", delta=f"{delta:.4f}")
 
@@ -171,4 +181,5 @@ def show_cleaning():
 
 if __name__ == "__main__":
     st.set_page_config(page_title="Data Cleaning", layout="wide")
-    show_cleaning()
+    with page_run("show_cleaning"):
+        show_cleaning()
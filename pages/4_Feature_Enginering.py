@@ -1,29 +1,27 @@
 import streamlit as st
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+import plotly.express as px
+from utils.correlation import correlations_with
+from utils.data import file_hash, impute_dataset, load_dataset
+from utils.features import definitions_hash
+from utils.instrumentation import page_run, span
+from utils.pipeline import derive_frame
+from utils.stats_store import load_stats
 
 def show_feature_engineering():
     st.title("⚙️ Feature Engineering ")
     st.markdown("Transforming raw data into meaningful metrics using domain-specific formulas.")
 
     # --- 1. Load Data ---
-    @st.cache_data
-    def load_data():
-        try:
-            df = pd.read_csv("evi.csv")
-            # Basic Imputation to ensure math doesn't fail
-            num_cols = df.select_dtypes(include=['number']).columns
-            cat_cols = df.select_dtypes(include=['object']).columns
-            df[num_cols] = df[num_cols].fillna(df[num_cols].median())
-            for col in cat_cols:
-                df[col] = df[col].fillna(df[col].mode()[0])
-            return df
-        except FileNotFoundError:
-            return None
-
-    df = load_data()
-    if df is None:
+    @st.cache_resource
+    def load_data(data_hash):
+        # Basic Imputation to ensure math doesn't fail (medians/modes from the stats store)
+        return impute_dataset(load_dataset(), load_stats().fill_values())
+
+    try:
+        with span("load clean data"):
+            df = load_data(file_hash())
+    except FileNotFoundError:
         st.error("⚠️ File 'evi.csv' not found.")
         return
 
@@ -42,19 +40,19 @@ def show_feature_engineering():
     # 1. Personality Encoding
     with col1:
         st.write("**Target: Personality**")
-        df_eng['Personality_encoded'] = df_eng['Personality'].map({'Introvert': 0, 'Extrovert': 1})
+        df_eng['Personality_encoded'] = df_eng['Personality'].map({'Introvert': 0, 'Extrovert': 1}).astype('int8')
         st.code("Introvert: 0\nExtrovert: 1")
         
     # 2. Stage Fear Encoding
     with col2:
         st.write("**Feature: Stage Fear**")
-        df_eng['Stage_fear_encoded'] = df_eng['Stage_fear'].map({'No': 0, 'Yes': 1})
+        df_eng['Stage_fear_encoded'] = df_eng['Stage_fear'].map({'No': 0, 'Yes': 1}).astype('int8')
         st.code("No: 0\nYes: 1")
 
     # 3. Drained Encoding
     with col3:
         st.write("**Feature: Drained**")
-        df_eng['Drained_after_socializing_encoded'] = df_eng['Drained_after_socializing'].map({'No': 0, 'Yes': 1})
+        df_eng['Drained_after_socializing_encoded'] = df_eng['Drained_after_socializing'].map({'No': 0, 'Yes': 1}).astype('int8')
         st.code("No: 0\nYes: 1")
             
 
@@ -66,13 +64,17 @@ def show_feature_engineering():
     st.header("2. Creating Derived Features")
     st.markdown("Combining multiple columns to create deeper insights.")
 
+    # All five come from the feature registry in one vectorized pass (utils/features.py)
+    with span("derived features"):
+        derived = derive_frame(df_eng)
+
     # --- Feature 1: Social Activity Level ---
     st.subheader("🔹 Social Activity Level")
     st.latex(r'''
         \text{Activity Level} = \text{Events} + \text{Going Outside} + \text{Friends Circle}
     ''')
     st.code("df['Social_Activity_Level'] = df['Social_event_attendance'] + df['Going_outside'] + df['Friends_circle_size']")
-    df_eng['Social_Activity_Level'] = df_eng['Social_event_attendance'] + df_eng['Going_outside'] + df_eng['Friends_circle_size']
+    df_eng['Social_Activity_Level'] = derived['Social_Activity_Level']
     st.caption("Aggregates all indicators of social busyness into one score.")
 
     # --- Feature 2: Social Discomfort Index ---
@@ -81,7 +83,7 @@ def show_feature_engineering():
         \text{Discomfort Index} = \text{Stage Fear (0/1)} + \text{Drained (0/1)}
     ''')
     st.code("df['Social_Discomfort_Index'] = df['Stage_fear_encoded'] + df['Drained_after_socializing_encoded']")
-    df_eng['Social_Discomfort_Index'] = df_eng['Stage_fear_encoded'] + df_eng['Drained_after_socializing_encoded']
+    df_eng['Social_Discomfort_Index'] = derived['Social_Discomfort_Index']
     st.caption("A higher score (max 2) indicates higher social anxiety or fatigue.")
 
     # --- Feature 3: Social Balance ---
@@ -90,7 +92,7 @@ def show_feature_engineering():
         \text{Social Balance} = \frac{\text{Activity Level}}{\text{Time Spent Alone} + 1}
     ''')
     st.code("df['Social_Balance'] = df['Social_Activity_Level'] / (df['Time_spent_Alone'] + 1)")
-    df_eng['Social_Balance'] = df_eng['Social_Activity_Level'] / (df_eng['Time_spent_Alone'] + 1)
+    df_eng['Social_Balance'] = derived['Social_Balance']
     st.caption("Ratio of socialization to solitude. We add +1 to avoid division by zero.")
 
     # --- Feature 4: Discomfort Efficiency ---
@@ -99,7 +101,7 @@ def show_feature_engineering():
         \text{Efficiency} = \frac{\text{Discomfort Index}}{\text{Activity Level} + 1}
     ''')
     st.code("df['Discomfort_Efficiency'] = df['Social_Discomfort_Index'] / (df['Social_Activity_Level'] + 1)")
-    df_eng['Discomfort_Efficiency'] = df_eng['Social_Discomfort_Index'] / (df_eng['Social_Activity_Level'] + 1)
+    df_eng['Discomfort_Efficiency'] = derived['Discomfort_Efficiency']
     st.caption("Measures how much 'pain' (discomfort) a person endures per unit of social activity.")
 
     # --- Feature 5: Posting Impact ---
@@ -108,7 +110,7 @@ def show_feature_engineering():
         \text{Impact} = \text{Post Frequency} \times \text{Activity Level}
     ''')
     st.code("df['Posting_Impact'] = df['Post_frequency'] * df['Social_Activity_Level']")
-    df_eng['Posting_Impact'] = df_eng['Post_frequency'] * df_eng['Social_Activity_Level']
+    df_eng['Posting_Impact'] = derived['Posting_Impact']
     st.caption("Correlates online activity with real-world social activity.")
 
     st.divider()
@@ -183,17 +185,26 @@ def show_feature_engineering():
     corr_check = X.copy()
     corr_check['Personality_Target'] = y
     
-    # Calculate correlation
-    corr_series = corr_check.corr()['Personality_Target'].sort_values(ascending=False)
+    # Calculate correlation (one matrix-vector product, cached per dataset version, feature
+    # definitions and column set: a changed formula must not reuse the old correlations)
+    with span("target correlations"):
+        data_key = f"{file_hash()}-{definitions_hash()}"
+        corr_series = correlations_with(corr_check, 'Personality_Target', data_key=data_key).sort_values(ascending=False)
     
-    # Plot
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.barplot(x=corr_series.values, y=corr_series.index, palette="coolwarm", ax=ax)
-    ax.set_title("Correlation of Engineered Features with Target")
-    st.pyplot(fig)
+    # Plot (plotly like the other pages; seaborn + matplotlib cost ~2s of imports on first visit)
+    fig = px.bar(
+        x=corr_series.values, y=corr_series.index, orientation='h',
+        color=corr_series.values, color_continuous_scale="RdBu_r", color_continuous_midpoint=0,
+        labels={'x': 'Correlation', 'y': 'Feature', 'color': 'Correlation'},
+        title="Correlation of Engineered Features with Target"
+    )
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    with span("correlation chart"):
+        st.plotly_chart(fig, use_container_width=True)
     
     st.info(" **Insight:** Look at 'Social_Activity_Level' and 'Social_Balance'. If they are high positive, they are strong predictors for Extroverts.")
 
 if __name__ == "__main__":
     st.set_page_config(page_title="Feature Engineering", layout="wide")
-    show_feature_engineering()
+    with page_run("show_feature_engineering"):
+        show_feature_engineering()
@@ -1,21 +1,32 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+
+from utils.data import file_hash
+from utils.evaluation import cached_results
+from utils.features import FEATURES
+from utils.registry import MANIFEST_PATH
+from utils.shap_store import global_importance
+
+METRICS = ["Accuracy", "Precision", "Recall", "F1-Score"]
 
 def show_model_evaluation():
     st.title("🏆 Model Evaluation & Benchmarking")
-    st.markdown("Comparing the performance of 5 different algorithms to find the best predictor.")
-
-    # --- 1. Load the Provided Results ---
-    data = {
-        "Model": ["CatBoost", "Logistic Regression", "LightGBM", "XGBoost", "Random Forest"],
-        "Accuracy": [0.968961, 0.968691, 0.968421, 0.968151, 0.964103],
-        "Precision": [0.968840, 0.968563, 0.968287, 0.968045, 0.963987],
-        "Recall": [0.968961, 0.968691, 0.968421, 0.968151, 0.964103],
-        "F1-Score": [0.968880, 0.968604, 0.968327, 0.968085, 0.964034]
-    }
-    
-    df_results = pd.DataFrame(data).set_index("Model")
+
+    # --- 1. Results of the Trained Models (scored by `python -m utils.evaluation`, never in a page view) ---
+    results, missing = cached_results()
+    if missing:
+        st.info(f"No evaluation results yet for: {', '.join(missing)}. "
+                "Run `python -m utils.evaluation` to score the trained models, then reload this page.")
+    if not results:
+        return
+    st.markdown(f"Comparing the performance of {len(results)} different algorithms to find the best predictor.")
+
+    df_results = pd.DataFrame(
+        {r["display_name"]: {m: r[m] for m in METRICS} for r in results.values()}
+    ).T.rename_axis("Model").sort_values(by=["F1-Score", "Accuracy"], ascending=False)
+    best = df_results.iloc[0]
 
     # ==========================================
     #              SIDEBAR CONTROLS
@@ -45,9 +56,10 @@ def show_model_evaluation():
     
     col_win, col_close = st.columns(2)
     with col_win:
-        st.success("🥇 **Winner:** CatBoost (Highest F1-Score: 0.968880)")
-    with col_close:
-        st.info("🥈 **Runner Up:** Logistic Regression (Very close behind!)")
+        st.success(f"🥇 **Winner:** {best.name} (Highest F1-Score: {best['F1-Score']:.6f})")
+    if len(df_results) > 1:
+        with col_close:
+            st.info(f"🥈 **Runner Up:** {df_results.index[1]} (Very close behind!)")
 
     st.divider()
 
@@ -56,13 +68,16 @@ def show_model_evaluation():
     
     # Prepare data for plotting (Melt)
     df_melt = df_results.reset_index().melt(id_vars="Model", var_name="Metric", value_name="Score")
+    # Zoom in around the scores to see differences
+    low, high = df_melt["Score"].min(), df_melt["Score"].max()
+    pad = max((high - low) * 0.5, 0.001)
     
     if selected_metric == "All":
         # Grouped Bar Chart
         fig = px.bar(
             df_melt, x="Score", y="Model", color="Metric", barmode="group",
             orientation='h', title="All Metrics Comparison",
-            range_x=[0.95, 0.98] # Zoom in to see differences
+            range_x=[low - pad, high + pad] # Zoom in to see differences
         )
     else:
         # Single Metric Bar Chart
@@ -71,7 +86,7 @@ def show_model_evaluation():
             subset, x="Score", y="Model", orientation='h',
             text="Score", title=f"Comparison of {selected_metric}",
             color="Score", color_continuous_scale="Blues",
-            range_x=[0.96, 0.97] # Zoom in strictly
+            range_x=[subset["Score"].min() - pad, subset["Score"].max() + pad] # Zoom in strictly
         )
         fig.update_traces(texttemplate='%{text:.5f}', textposition='inside')
 
@@ -84,48 +99,87 @@ def show_model_evaluation():
 
     with col1:
         st.subheader("🎯 Accuracy")
-        st.metric("Score", "96.8%")
-        st.info("**\"Overall Correctness\"**\n\nIf the model predicts the personality of 100 random people, it gets the label (Introvert or Extrovert) exactly right for **97 of them**.")
+        st.metric("Score", f"{best['Accuracy']:.1%}")
+        st.info(f"**\"Overall Correctness\"**\n\nIf the model predicts the personality of 100 random people, it gets the label (Introvert or Extrovert) exactly right for **{best['Accuracy'] * 100:.0f} of them**.")
 
     with col2:
         st.subheader("💎 Precision")
-        st.metric("Score", "96.8%")
-        st.info("**\"The Trust Factor\"**\n\nWhen the model flags someone and says *'This person is an Extrovert'*, it is correct 96.8% of the time. It rarely makes the mistake of calling a quiet Introvert an Extrovert.")
+        st.metric("Score", f"{best['Precision']:.1%}")
+        st.info(f"**\"The Trust Factor\"**\n\nWhen the model flags someone and says *'This person is an Extrovert'*, it is correct {best['Precision']:.1%} of the time. It rarely makes the mistake of calling a quiet Introvert an Extrovert.")
 
     with col3:
         st.subheader("🔍 Recall")
-        st.metric("Score", "96.9%")
-        st.info("**\"The Coverage\"**\n\nOut of all the **actual Extroverts** that exist in your dataset, the model managed to find 96.9% of them. It didn't let many Extroverts 'slip through' and get mislabeled as Introverts.")
+        st.metric("Score", f"{best['Recall']:.1%}")
+        st.info(f"**\"The Coverage\"**\n\nOut of all the **actual Extroverts** that exist in your dataset, the model managed to find {best['Recall']:.1%} of them. It didn't let many Extroverts 'slip through' and get mislabeled as Introverts.")
 
     with col4:
         st.subheader("⚖️ F1-Score")
-        st.metric("Score", "96.9%")
+        st.metric("Score", f"{best['F1-Score']:.1%}")
         st.info("**\"The Reliability\"**\n\nThis confirms the model isn't cheating. It proves the model is good at finding Extroverts (High Recall) *AND* it is honest about it (High Precision). It's a robust predictor.")
     st.divider()
 
+    # --- 5. Diagnostics ---
+    st.header("4. Diagnostics on the Test Set")
+    names = {r["display_name"]: name for name, r in results.items()}
+    selected = st.selectbox("Model:", list(df_results.index))
+    r = results[names[selected]]
+    st.caption(f"{r['holdout_rows']} held-out rows (same 80/20 split as the notebook).")
+
+    col_cm, col_roc, col_pr = st.columns(3)
+    with col_cm:
+        labels = ["Introvert", "Extrovert"]
+        fig_cm = px.imshow(r["confusion_matrix"], x=labels, y=labels, text_auto=True,
+                           color_continuous_scale="Blues",
+                           labels=dict(x="Predicted", y="Actual", color="Rows"),
+                           title="Confusion Matrix")
+        st.plotly_chart(fig_cm, use_container_width=True)
+    with col_roc:
+        fig_roc = go.Figure(go.Scatter(x=r["roc_curve"]["fpr"], y=r["roc_curve"]["tpr"], mode="lines",
+                                       name=selected))
+        fig_roc.add_shape(type="line", x0=0, y0=0, x1=1, y1=1, line=dict(dash="dash", color="grey"))
+        fig_roc.update_layout(title=f"ROC Curve (AUC = {r['ROC-AUC']:.4f})",
+                              xaxis_title="False Positive Rate", yaxis_title="True Positive Rate")
+        st.plotly_chart(fig_roc, use_container_width=True)
+    with col_pr:
+        fig_pr = go.Figure(go.Scatter(x=r["pr_curve"]["recall"], y=r["pr_curve"]["precision"], mode="lines",
+                                      name=selected))
+        fig_pr.update_layout(title=f"Precision-Recall (AP = {r['Average Precision']:.4f})",
+                             xaxis_title="Recall", yaxis_title="Precision")
+        st.plotly_chart(fig_pr, use_container_width=True)
+    st.divider()
+
+# Why each feature matters (shown for the ones that make the top 5)
+FEATURE_WHY = {
+    "Social_Balance": "This feature captures the **trade-off**. It separates people who socialize *despite* loving alone time vs. those who socialize because they *hate* alone time.",
+    "Social_Discomfort_Index": "This feature combines the two strongest negative feelings (Fear + Fatigue), making it a massive \"Red Flag\" indicator for Introversion.",
+    "Posting_Impact": "This bridges the gap between digital and physical life. An Extrovert tends to score high on *both*, amplifying this signal significantly.",
+    "Social_Activity_Level": "The total amount of in-person social activity.",
+    "Discomfort_Efficiency": "How uncomfortable socializing makes someone relative to how much they do it.",
+}
+# The equations come from the feature declarations, so they always match the models' inputs
+FEATURE_NOTES = {f.name: f"Equation: `{f.formula}`. {FEATURE_WHY.get(f.name, '')}".strip() for f in FEATURES}
+
+# Mean |SHAP| per feature, read from the precomputed store (built once per model + dataset version)
+@st.cache_resource
+def load_shap_importance(model, data_hash, manifest_hash):
+    return global_importance(model)
+
 def show_catboost_importance():
+    results, _ = cached_results()
+    catboost = results.get("catboost")
+    if catboost is None:
+        return
+
     st.header("🏆 CatBoost Feature Importance")
-    st.markdown("The specific features that drove the high accuracy (96.9%) of the winning CatBoost model.")
-
-    # --- 1. Define the Data ---
-    data = {
-        "Feature": [
-            "Social_Balance", 
-            "Social_Discomfort_Index", 
-            "Posting_Impact", 
-            "Going_outside", 
-            "Friends_circle_size"
-        ],
-        "Importance (%)": [
-            16.417291, 
-            15.023017, 
-            13.207929, 
-            11.251043, 
-            9.834892
-        ]
-    }
-    
-    df_imp = pd.DataFrame(data).sort_values(by="Importance (%)", ascending=True)
+    st.markdown(f"The specific features that drove the high accuracy ({catboost['Accuracy']:.1%}) of the CatBoost model.")
+    st.caption("Share of the mean absolute SHAP value of each feature over the whole dataset.")
+
+    # --- 1. Top 5 of the Trained Model's SHAP Importances ---
+    with st.spinner("Computing SHAP values (first run only)..."):
+        importance = load_shap_importance("catboost", file_hash(), file_hash(MANIFEST_PATH))
+    df_imp = (pd.Series(importance, name="Importance (%)")
+              .rename_axis("Feature").reset_index()
+              .nlargest(5, "Importance (%)").sort_values(by="Importance (%)", ascending=True))
 
     # --- 2. Create the Plot ---
     fig = px.bar(
@@ -145,21 +199,11 @@ def show_catboost_importance():
     # --- 3. Interpretation (Why these won?) ---
     st.subheader("💡 Why are these the top predictors?")
     
-    
-    st.write(f"""
-    **1. Social_Balance (16.4%)** *Equation: Social Activity / (Time Alone + 1)* This is the #1 predictor because it captures the **trade-off**. It separates people who socialize *despite* loving alone time vs. those who socialize because they *hate* alone time.
-    """)
-    
-    st.write(f"""
-    **2. Social_Discomfort_Index (15.0%)** *Equation: Stage Fear + Drained Status* This feature combines the two strongest negative feelings (Fear + Fatigue), making it a massive "Red Flag" indicator for Introversion.
-    """)
-
-    st.write(f"""
-    **3. Posting_Impact (13.2%)** *Equation: Post Freq × Activity Level* This bridges the gap between digital and physical life. An Extrovert tends to score high on *both*, amplifying this signal significantly.
-    """)
-    
-    st.write("""
-    **4 & 5.  *Going Outside & Friends Circle* These are the 4th and 5th Top Features which Impact Catboost Model
+    top = df_imp.sort_values(by="Importance (%)", ascending=False)
+    for rank, (feature, importance) in enumerate(zip(top["Feature"], top["Importance (%)"]), start=1):
+        note = FEATURE_NOTES.get(feature, "A raw survey answer that the model relies on directly.")
+        st.write(f"""
+    **{rank}. {feature} ({importance:.1f}%)** {note}
     """)
 
 if __name__ == "__main__":
@@ -1,10 +1,15 @@
 import streamlit as st
 import pandas as pd
-import joblib
-import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 import warnings
+from utils.data import load_dataset
+from utils.instrumentation import page_run, span
+from utils.pipeline import FEATURE_KERNEL, MODEL_FEATURES, RAW_FEATURES
+from utils.prediction_cache import PredictionCache
+from utils.registry import ModelRegistry
+from utils.sensitivity import grid_rows, score_grid
+from utils.shap_store import SUPPORTED as EXPLAINABLE, BackgroundExplainer
 with warnings.catch_warnings():
     warnings.filterwarnings("ignore")
     # Code that might generate warnings goes here
@@ -16,33 +21,41 @@ def show_live_testing():
     st.markdown("Enter your data to see your **Personality Fingerprint** evolve in real-time.")
 
     # --- 1. Load Resources ---
+    # The registry only reads trained_models/manifest.json here; a model is
+    # loaded the first time it is selected (shared by all sessions)
     @st.cache_resource
-    def load_resources():
-        # Load Models
-        models = {}
-        model_files = {
-            "CatBoost": "trained_models/catboost_model.joblib",
-            "Logistic Regression": "trained_models/logreg_model.joblib",
-            "Random Forest": "trained_models/rf_model.joblib"
-        }
-        for name, filename in model_files.items():
-            try:
-                models[name] = joblib.load(filename)
-            except: 
-                pass
-        
-        # Load Data for Benchmarking (Averages)
+    def load_registry():
         try:
-            df = pd.read_csv("evi.csv")
-            means = df.groupby('Personality')[['Social_event_attendance', 'Going_outside', 'Friends_circle_size', 'Time_spent_Alone']].mean()
-            return models, means
-        except:
-            return models, None
+            return ModelRegistry()
+        except FileNotFoundError:
+            return None
+
+    # Load Data for Benchmarking (Averages)
+    @st.cache_resource
+    def load_means():
+        try:
+            df = load_dataset()
+            return df.groupby('Personality', observed=True)[['Social_event_attendance', 'Going_outside', 'Friends_circle_size', 'Time_spent_Alone']].mean()
+        except FileNotFoundError:
+            return None
+
+    # Scores shared by all sessions, keyed by model hash + inputs
+    @st.cache_resource
+    def load_prediction_cache():
+        return PredictionCache()
 
-    models, means = load_resources()
+    # SHAP explanations computed on a background thread, shared by all sessions
+    @st.cache_resource
+    def load_explainer():
+        return BackgroundExplainer()
+
+    with span("load resources"):
+        registry = load_registry()
+        means = load_means()
+        prediction_cache = load_prediction_cache()
 
-    if not models:
-        st.error("⚠️ No models found. Please save your trained models as .joblib files first.")
+    if registry is None or not registry.names:
+        st.error("⚠️ No models found. Train the models, then run `python -m utils.registry` to build trained_models/manifest.json.")
         return
     # Predict
 
@@ -67,25 +80,15 @@ def show_live_testing():
     stage_fear_enc = 1 if stage_fear == "Yes" else 0
     drained_enc = 1 if drained == "Yes" else 0
     
-    social_act_level = social_events + going_outside + friends_circle
-    discomfort_idx = stage_fear_enc + drained_enc
-    social_balance = social_act_level / (time_alone + 1)
-    
-    # Input DF for Model
-    input_data = pd.DataFrame({
-        'Time_spent_Alone': [time_alone],
-        'Social_event_attendance': [social_events],
-        'Going_outside': [going_outside],
-        'Friends_circle_size': [friends_circle],
-        'Post_frequency': [post_freq],
-        'Stage_fear_encoded': [stage_fear_enc],
-        'Drained_after_socializing_encoded': [drained_enc],
-        'Social_Activity_Level': [social_act_level],
-        'Social_Discomfort_Index': [discomfort_idx],
-        'Social_Balance': [social_balance],
-        'Discomfort_Efficiency': [discomfort_idx / (social_act_level + 1)],
-        'Posting_Impact': [post_freq * social_act_level]
-    })
+    # Raw input row, in utils.pipeline.RAW_FEATURES order
+    raw_input = np.array([[time_alone, stage_fear_enc, social_events, going_outside,
+                           drained_enc, friends_circle, post_freq]], dtype=np.float64)
+
+    # Derived features from the same kernel the models were trained with
+    with span("derived features"):
+        derived = dict(zip(MODEL_FEATURES, FEATURE_KERNEL(raw_input)[0]))
+    social_act_level = derived['Social_Activity_Level']
+    social_balance = derived['Social_Balance']
 
     
     # ==========================================
@@ -120,23 +123,48 @@ def show_live_testing():
     ))
 
     fig_radar.update_layout(polar=dict(radialaxis=dict(visible=True)), showlegend=True, height=350, margin=dict(t=30, b=30))
-    st.plotly_chart(fig_radar, use_container_width=True)
+    with span("radar chart"):
+        st.plotly_chart(fig_radar, use_container_width=True)
 
     # --- 2. Prediction Section ---
     
     st.subheader("Prediction Using Catboost")
     
-    model_choice = st.selectbox("Select Model:", list(models.keys()))
-    model = models[model_choice]
+    model_choice = st.selectbox("Select Model:", registry.names, format_func=registry.display_name)
+    try:
+        with span("load model"):
+            registry.get(model_choice)
+    except (OSError, ValueError) as e:
+        st.error(f"⚠️ Could not load {registry.display_name(model_choice)}: {e}")
+        return
+
+    # Start explaining the current inputs now, so the result is usually ready by "Analyze Me"
+    explainer = load_explainer() if model_choice in EXPLAINABLE else None
+    if explainer is not None:
+        explainer.prefetch(model_choice, raw_input)
+
+    with st.sidebar.expander("Model cache"):
+        st.caption(f"Resident: {registry.resident_bytes / 1e6:.1f} MB of {registry.budget_bytes / 1e6:.0f} MB budget")
+        st.dataframe(pd.DataFrame(registry.stats()), hide_index=True)
+
+    with st.sidebar.expander("Prediction cache"):
+        cache_stats = prediction_cache.stats()
+        hit_rate = cache_stats['hit_rate']
+        st.caption(f"{cache_stats['entries']:,} of {cache_stats['max_entries']:,} rows cached, "
+                   f"hit rate {'-' if hit_rate is None else f'{hit_rate:.0%}'}")
+        st.dataframe(pd.DataFrame([cache_stats]), hide_index=True)
+        if st.button("Warm up from evi.csv", help="Pre-score the most common input combinations with every model."):
+            with st.spinner("Scoring common inputs..."):
+                rows = prediction_cache.warm_up(registry)
+            st.caption(f"Scored {rows:,} input rows per model.")
 
     if st.button("🔮 Analyze Me", type="primary", use_container_width=True):
         
-        
-        label = "EXTROVERT" if social_balance >= 2.5 else "INTROVERT"
-
-        # Probability
-        probs = model.predict_proba(input_data)[0]
+        # Probability (class 1 = Extrovert)
+        with span("predict"):
+            probs = prediction_cache.predict_proba(registry, model_choice, raw_input)[0]
         confidence = max(probs)
+        label = "EXTROVERT" if probs[1] >= 0.5 else "INTROVERT"
         
         # Display Big Result
         color = "#EF553B" if label == "EXTROVERT" else "#636EFA"
@@ -167,34 +195,99 @@ def show_live_testing():
         else:
             st.warning(" You are in the **Ambivert** range.")
 
+        # --- What drove this prediction (SHAP) ---
+        contributions = None
+        if explainer is not None:
+            try:
+                with span("explain"):
+                    contributions = explainer.explain(model_choice, raw_input, timeout=30)[0]
+            except TimeoutError:
+                st.warning("⏳ The explanation is taking longer than usual. Press **Analyze Me** again in a moment to see it.")
+        if contributions is not None:
+            df_shap = (pd.DataFrame({'Feature': MODEL_FEATURES, 'Contribution': contributions[:-1]})
+                       .assign(Strength=lambda d: d['Contribution'].abs())
+                       .nlargest(6, 'Strength').sort_values('Strength'))
+            fig_shap = go.Figure(go.Bar(
+                x=df_shap['Contribution'], y=df_shap['Feature'], orientation='h',
+                marker_color=np.where(df_shap['Contribution'] > 0, 'orange', 'blue')
+            ))
+            fig_shap.update_layout(title="What Drove This Prediction (SHAP, log-odds)",
+                                   xaxis_title="← Introvert   |   Extrovert →", height=300, margin=dict(t=40, b=30))
+            st.plotly_chart(fig_shap, use_container_width=True)
+
    
 
-   # --- ADDITION 3: Download Result ---
-    # Create a simple text report
-    report_text = f"""
-    PERSONALITY PREDICTION REPORT
-    -----------------------------
-    Predicted Type: {label}
-    Confidence: {confidence*100:.2f}%
-    
-    YOUR INPUTS:
-    - Social Events: {social_events}/month
-    - Going Outside: {going_outside}/week
-    - Friend Circle: {friends_circle}
-    - Time Alone: {time_alone} hrs/day
-    
-    CALCULATED METRICS:
-    - Social Balance Score: {social_balance:.2f}
-    - Social Activity Level: {social_act_level}
-    
-    """
-    
-    st.sidebar.divider()
-    st.sidebar.download_button(
-        label="📄 Download Report",
-        data=report_text,
-        file_name="my_personality_report.txt",
-        mime="text/plain"
-    )
+        # --- ADDITION 3: Download Result ---
+        # Create a simple text report
+        report_text = f"""
+        PERSONALITY PREDICTION REPORT
+        -----------------------------
+        Predicted Type: {label}
+        Confidence: {confidence*100:.2f}%
+    
+        YOUR INPUTS:
+        - Social Events: {social_events}/month
+        - Going Outside: {going_outside}/week
+        - Friend Circle: {friends_circle}
+        - Time Alone: {time_alone} hrs/day
+    
+        CALCULATED METRICS:
+        - Social Balance Score: {social_balance:.2f}
+        - Social Activity Level: {social_act_level:g}
+    
+        """
+    
+        st.sidebar.divider()
+        st.sidebar.download_button(
+            label="📄 Download Report",
+            data=report_text,
+            file_name="my_personality_report.txt",
+            mime="text/plain"
+        )
+
+    # --- 4. What-If Sensitivity ---
+    st.divider()
+    st.subheader("What If?")
+    st.caption("How the Extrovert probability moves when one or two of your answers change and the rest stay as entered.")
+
+    input_labels = {
+        'Social_event_attendance': "🎉 Social Events", 'Going_outside': "🌳 Going Outside",
+        'Friends_circle_size': "👥 Friend Circle Size", 'Time_spent_Alone': "🏠 Time Alone",
+        'Post_frequency': "📱 Social Posts", 'Stage_fear': "🎤 Stage Fear", 'Drained_after_socializing': "🔋 Drained",
+    }
+    w1, w2 = st.columns(2)
+    x_feature = w1.selectbox("Vary:", list(input_labels), format_func=input_labels.get)
+    y_options = [None] + [f for f in input_labels if f != x_feature]
+    # Time alone is the default axis unless it is the one being varied
+    y_default = y_options.index('Time_spent_Alone') if 'Time_spent_Alone' in y_options else 0
+    y_feature = w2.selectbox("Against:", y_options, index=y_default,
+                             format_func=lambda f: "Nothing (curve)" if f is None else input_labels[f])
+
+    # The whole grid is scored in one batch, bypassing the prediction cache
+    with span("what-if grid"):
+        grid, xs, ys = grid_rows(raw_input, x_feature, y_feature)
+        extrovert = score_grid(registry, model_choice, grid)[:, 1]
+    user_x = raw_input[0, RAW_FEATURES.index(x_feature)]
+
+    fig_whatif = go.Figure()
+    if y_feature is None:
+        fig_whatif.add_trace(go.Scatter(x=xs, y=extrovert, mode='lines', name='P(Extrovert)', line_color='orange'))
+        fig_whatif.add_hline(y=0.5, line_dash='dash', line_color='gray')
+        fig_whatif.add_trace(go.Scatter(x=[user_x], y=[np.interp(user_x, xs, extrovert)], mode='markers',
+                                        name='YOU', marker=dict(color='red', size=12)))
+        fig_whatif.update_layout(yaxis=dict(title='P(Extrovert)', range=[0, 1]))
+    else:
+        fig_whatif.add_trace(go.Heatmap(x=xs, y=ys, z=extrovert.reshape(len(ys), len(xs)), zmin=0, zmax=1,
+                                        colorscale='RdBu_r', colorbar=dict(title='P(Extrovert)')))
+        fig_whatif.add_trace(go.Scatter(x=[user_x], y=[raw_input[0, RAW_FEATURES.index(y_feature)]],
+                                        mode='markers', name='YOU',
+                                        marker=dict(color='black', size=12, symbol='x')))
+        fig_whatif.update_layout(yaxis_title=input_labels[y_feature])
+    fig_whatif.update_layout(xaxis_title=input_labels[x_feature], height=400, margin=dict(t=30, b=30))
+    with span("what-if chart"):
+        st.plotly_chart(fig_whatif, use_container_width=True)
+
+
 if __name__ == "__main__":
-    show_live_testing()
+    with page_run("show_live_testing"):
+        show_live_testing()
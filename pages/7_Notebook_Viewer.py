@@ -1,8 +1,8 @@
 import streamlit as st
-import nbformat
-from nbconvert import HTMLExporter
 import streamlit.components.v1 as components
 import os
+from utils.instrumentation import page_run, span
+from utils.notebook_render import DEFAULT_CELLS_PER_PAGE, NOTEBOOK_PATH, page_count, render_html
 
 st.set_page_config(
     page_title="Notebook Report",
@@ -24,26 +24,31 @@ st.markdown(
 
 st.markdown("---")
 
-NOTEBOOK_PATH = "Introverts_vs_Extroverts.ipynb"
-
 if not os.path.exists(NOTEBOOK_PATH):
     st.error("Notebook file not found.")
     st.stop()
 
-# Load notebook
-with open(NOTEBOOK_PATH, "r", encoding="utf-8") as f:
-    notebook = nbformat.read(f, as_version=4)
-
-# Convert notebook to HTML
-html_exporter = HTMLExporter()
-html_exporter.exclude_input_prompt = True
-html_exporter.exclude_output_prompt = True
-
-(body, _) = html_exporter.from_notebook_node(notebook)
-
-# Display notebook
-components.html(
-    body,
-    height=1000,
-    scrolling=True
-)
+# Rendered HTML is cached on disk per notebook version (see utils/notebook_render.py)
+st.sidebar.header("View")
+paged = st.sidebar.toggle("Show in pages", value=False, help="Load a few cells at a time instead of the whole notebook.")
+
+with page_run("notebook_viewer"):
+    if paged:
+        cells_per_page = st.sidebar.select_slider("Cells per page", options=[5, 10, 20, 40], value=DEFAULT_CELLS_PER_PAGE)
+        with span("page count"):
+            pages = page_count(NOTEBOOK_PATH, cells_per_page)
+        page = st.sidebar.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+        st.caption(f"Page {page} of {pages}")
+        with span("render html"):
+            body = render_html(NOTEBOOK_PATH, page - 1, cells_per_page)
+    else:
+        with span("render html"):
+            body = render_html(NOTEBOOK_PATH)
+
+    # Display notebook
+    with span("display"):
+        components.html(
+            body,
+            height=1000,
+            scrolling=True
+        )
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Score a CSV of people with one of the trained models.
+
+The input is streamed in fixed-size chunks, encoded in the main process and
+scored in a pool of worker processes. At most `2 * workers` chunks are in
+flight at once, so memory stays bounded no matter how large the file is.
+Results are written in input order.
+
+    python -m utils.batch_score survey.csv -o predictions.parquet --model catboost
+    python -m utils.batch_score survey.csv -o predictions.csv --chunksize 200000 --workers 8
+
+Input needs the raw evi.csv feature columns (missing values are imputed by
+the model's pipeline); an `id` column is carried over when present.
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.data import CATEGORICAL_COLS
+from utils.pipeline import LABELS, MODELS_DIR, RAW_FEATURES, encode_raw
+
+_model = None
+_pipeline = None
+_thread_limits = None
+
+
+def resolve_model_path(model):
+    """'catboost' -> trained_models/catboost_model.joblib; paths are returned unchanged."""
+    if os.path.exists(model):
+        return model
+    return os.path.join(MODELS_DIR, f"{model}_model.joblib")
+
+
+def _init_worker(model_path, threads):
+    global _model, _pipeline, _thread_limits
+    from threadpoolctl import threadpool_limits
+
+    from utils.compiled_trees import load_model
+    from utils.pipeline import load_pipeline
+    _model = load_model(model_path)
+    _pipeline = load_pipeline(model_path)
+    # One process per core already: cap the BLAS/OpenMP pools of every library loaded
+    # by now (the model's included) for the life of the worker. Setting OMP_NUM_THREADS
+    # here would be too late, the pools are sized when the libraries load.
+    _thread_limits = threadpool_limits(limits=threads)
+
+
+def _score_chunk(X):
+    probs = _model.predict_proba(_pipeline.transform(X))
+    return probs[:, 1].astype(np.float32)
+
+
+def _result_frame(ids, p_extrovert):
+    out = pd.DataFrame()
+    if ids is not None:
+        out['id'] = ids.to_numpy()
+    pred = (p_extrovert >= 0.5).astype(np.int8)
+    out['Personality'] = pd.Categorical.from_codes(pred, [LABELS[0], LABELS[1]])
+    out['Confidence'] = np.where(pred == 1, p_extrovert, 1 - p_extrovert)
+    out['P_Extrovert'] = p_extrovert
+    return out
+
+
+class _Writer:
+    """Appends result chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._pq_writer = None
+        self._first = True
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._pq_writer is None:
+                self._pq_writer = pq.ParquetWriter(self.path, table.schema)
+            self._pq_writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+
+
+def score_file(input_path, output_path, model="catboost", chunksize=100_000, workers=None):
+    """Score `input_path` into `output_path`; returns the number of rows scored."""
+    model_path = resolve_model_path(model)
+    workers = workers or os.cpu_count() or 1
+    header = pd.read_csv(input_path, nrows=0).columns
+    usecols = [c for c in ['id'] + RAW_FEATURES if c in header]
+    dtypes = {col: 'category' for col in CATEGORICAL_COLS}
+
+    writer = _Writer(output_path)
+    pending = deque()
+    n_rows = 0
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_path, 1)) as pool:
+            reader = pd.read_csv(input_path, usecols=usecols, dtype=dtypes, chunksize=chunksize)
+            for chunk in reader:
+                ids = chunk['id'] if 'id' in chunk else None
+                pending.append((ids, pool.submit(_score_chunk, encode_raw(chunk))))
+                # Bounded number of chunks in flight: wait for the oldest before reading on
+                while len(pending) >= 2 * workers:
+                    n_rows += _drain_one(pending, writer)
+            while pending:
+                n_rows += _drain_one(pending, writer)
+    finally:
+        writer.close()
+    return n_rows
+
+
+def _drain_one(pending, writer):
+    ids, future = pending.popleft()
+    p_extrovert = future.result()
+    writer.write(_result_frame(ids, p_extrovert))
+    return len(p_extrovert)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-score a CSV file with a trained model.")
+    parser.add_argument("input", help="CSV with the evi.csv feature columns")
+    parser.add_argument("-o", "--output", required=True, help="Output .csv or .parquet file")
+    parser.add_argument("-m", "--model", default="catboost",
+                        help="Model name in trained_models/ (catboost, lightgbm, ...) or a .joblib path")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    n_rows = score_file(args.input, args.output, args.model, args.chunksize, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {n_rows:,} rows in {elapsed:.1f}s ({n_rows / max(elapsed, 1e-9):,.0f} rows/s) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Server-side binning and box-plot statistics.
+
+Charts are built from these summaries instead of handing Plotly the raw
+column, so the browser payload is a few dozen numbers per group however many
+rows the dataset has.
+
+    edges = histogram_edges(values)
+    counts = grouped_histogram(values, codes, n_groups, edges)     # (n_groups, n_bins)
+    stats = grouped_box_stats(values, codes, n_groups)             # list of dicts
+"""
+import numpy as np
+
+MAX_BINS = 50
+MAX_OUTLIERS = 200   # outlier points kept per group (extremes always included)
+
+
+def histogram_edges(values, max_bins=MAX_BINS):
+    """Shared bin edges; integer-valued data gets one bin per value when that fits."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return np.array([0.0, 1.0])
+    lo, hi = float(values.min()), float(values.max())
+    if hi - lo + 1 <= max_bins and np.array_equal(values, np.round(values)):
+        return np.arange(lo - 0.5, hi + 1.5)
+    return np.histogram_bin_edges(values, bins=min(max_bins, max(10, int(np.sqrt(values.size)))))
+
+
+def grouped_histogram(values, codes, n_groups, edges):
+    """
+    Histogram counts of `values` per group in one pass.
+
+    `codes` are integer group ids (0..n_groups-1, negative = skip); NaN values
+    are skipped. Returns an (n_groups, len(edges) - 1) int64 array.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes)
+    n_bins = len(edges) - 1
+    keep = np.isfinite(values) & (codes >= 0) & (values >= edges[0]) & (values <= edges[-1])
+    bins = np.searchsorted(edges, values[keep], side="right") - 1
+    np.clip(bins, 0, n_bins - 1, out=bins)   # the last edge belongs to the last bin
+    flat = codes[keep].astype(np.int64) * n_bins + bins
+    return np.bincount(flat, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+
+def box_stats(values, max_outliers=MAX_OUTLIERS, seed=0):
+    """Quartiles, 1.5 IQR whiskers and a capped outlier sample of one group."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return None
+    # One partial sort gives all three quartiles (linear interpolation, like Plotly)
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    low, high = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    inside = (values >= low) & (values <= high)
+    outliers = values[~inside]
+    if outliers.size > max_outliers:
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(outliers, max_outliers - 2, replace=False)
+        outliers = np.concatenate([[outliers.min(), outliers.max()], sample])
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "sum": float(values.sum()),
+        "min": float(values.min()),
+        "q1": float(q1),
+        "median": float(median),
+        "q3": float(q3),
+        "max": float(values.max()),
+        "lower_fence": float(values[inside].min()),
+        "upper_fence": float(values[inside].max()),
+        "n_outliers": int((~inside).sum()),
+        "outliers": np.sort(outliers).tolist(),
+    }
+
+
+def grouped_box_stats(values, codes, n_groups, max_outliers=MAX_OUTLIERS):
+    """box_stats per group; the rows are sorted by group once instead of masked per group."""
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(n_groups + 1))
+    sorted_values = values[order]
+    return [box_stats(sorted_values[bounds[g]:bounds[g + 1]], max_outliers) for g in range(n_groups)]
+
+
+def bin_centers(edges):
+    edges = np.asarray(edges, dtype=np.float64)
+    return (edges[:-1] + edges[1:]) / 2
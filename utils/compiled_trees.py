@@ -0,0 +1,333 @@
+"""
+Boosted-tree models compiled into flat NumPy arrays.
+
+`compile_model` turns a fitted XGBoost, LightGBM or CatBoost classifier into
+a CompiledForest: contiguous arrays of split features, thresholds, child
+indices and leaf values (or, for CatBoost's oblivious trees, one split per
+depth level and a leaf table per tree). The evaluator only needs NumPy, so
+serving a compiled model skips importing and unpickling the booster library.
+
+    python -m utils.compiled_trees        # compile + verify every boosted model
+
+writes trained_models/<name>_compiled.npz next to each <name>_model.joblib;
+`load_model` picks it up in place of the pickle wherever models are served.
+Inputs are the pipeline's (imputed, scaled) model features.
+
+Missing values follow each library's rule per split node: XGBoost sends NaN
+the default way; LightGBM reads NaN as 0.0 (missing_type None), sends 0 and
+NaN the default way (Zero) or only NaN (NaN); CatBoost's oblivious splits
+treat NaN as smaller than every border. export_compiled checks the compiled
+model against the original on rows with NaNs and zeros as well.
+"""
+import glob
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# Rows scored per block; bounds the (rows x trees) index arrays
+BLOCK_ROWS = 2048
+# Per-node missing-value rule of "tree" models (LightGBM's missing_type)
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+# LightGBM's kZeroThreshold: |x| below it counts as zero
+ZERO_THRESHOLD = 1e-35
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class CompiledForest:
+    """Array form of a binary boosted-tree classifier."""
+
+    def __init__(self, kind, arrays, base_score, sigmoid_scale=1.0, source=""):
+        self.kind = kind                    # "tree" (XGBoost/LightGBM) or "oblivious" (CatBoost)
+        self.arrays = arrays
+        self.base_score = float(base_score)
+        self.sigmoid_scale = float(sigmoid_scale)
+        self.source = source
+        self._splits = None                 # CatBoost distinct-split tables, built on first use
+
+    # --- evaluation ---
+
+    def decision_function(self, X):
+        X = np.ascontiguousarray(X, dtype=self.arrays["threshold"].dtype)
+        out = np.empty(X.shape[0], dtype=np.float64)
+        evaluate = self._eval_trees if self.kind == "tree" else self._eval_oblivious
+        for start in range(0, X.shape[0], BLOCK_ROWS):
+            out[start:start + BLOCK_ROWS] = evaluate(X[start:start + BLOCK_ROWS])
+        return out + self.base_score
+
+    def predict_proba(self, X):
+        p = _sigmoid(self.sigmoid_scale * self.decision_function(X))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return (self.decision_function(X) > 0).astype(np.int64)
+
+    def _eval_trees(self, X):
+        a = self.arrays
+        feature, threshold, children = a["feature"], a["threshold"], a["children"]
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_base = (np.arange(n_rows) * n_features)[:, None]
+        # Models compiled before missing_type was stored sent every NaN the default way
+        missing_type = a.get("missing_type")
+        if missing_type is None:
+            missing_type = np.full(feature.shape, MISSING_NAN, dtype=np.int8)
+        has_nan = np.isnan(flat_X).any()
+        has_zero_rule = bool((missing_type == MISSING_ZERO).any())
+        # One cursor per (row, tree); leaves point to themselves, so after
+        # max_depth steps every cursor sits on its leaf
+        node = np.tile(a["roots"], (n_rows, 1))
+        for _ in range(int(a["max_depth"])):
+            x = flat_X.take(row_base + feature.take(node))
+            t = threshold.take(node)
+            missing = None
+            if has_nan or has_zero_rule:
+                rule = missing_type.take(node)
+                if has_nan:
+                    nan = np.isnan(x)
+                    # Only NaN-type nodes keep NaN as missing; the others read it as 0.0
+                    x = np.where(nan & (rule != MISSING_NAN), 0.0, x)
+                    missing = nan & (rule == MISSING_NAN)
+                if has_zero_rule:
+                    zero = (rule == MISSING_ZERO) & (np.abs(x) <= ZERO_THRESHOLD)
+                    missing = zero if missing is None else missing | zero
+            go_right = x >= t if a["strict"] else x > t
+            if missing is not None:
+                go_right = np.where(missing, ~a["default_left"].take(node), go_right)
+            node = children.take(2 * node + go_right)
+        return a["value"].take(node).sum(axis=1)
+
+    def _eval_oblivious(self, X):
+        if self._splits is None:
+            self._prepare_oblivious()
+        split_feature, split_border, split_of_level, leaf_base = self._splits
+        # Every distinct split is evaluated once, as one row of bits per split
+        bits = np.zeros((split_feature.size + 1, X.shape[0]), dtype=np.uint8)
+        np.greater(X.T[split_feature], split_border[:, None], out=bits[:-1])
+        # Leaf index per (tree, row): the tree's split bits, deepest level first
+        index = bits[split_of_level[-1]].astype(np.int64)
+        for level in range(split_of_level.shape[0] - 2, -1, -1):
+            index <<= 1
+            index |= bits[split_of_level[level]]
+        index += leaf_base
+        return self.arrays["leaf_values"].take(index).sum(axis=0)
+
+    def _prepare_oblivious(self):
+        feature, border = self.arrays["feature"], self.arrays["threshold"]
+        real = np.isfinite(border)   # padded levels have border +inf and never fire
+        pairs = np.stack([feature[real].astype(np.float64), border[real].astype(np.float64)], axis=1)
+        unique, inverse = np.unique(pairs, axis=0, return_inverse=True)
+        # Padded levels point at the extra all-zero bits row
+        split_of_level = np.full(feature.shape, len(unique), dtype=np.int64)
+        split_of_level[real] = inverse.ravel()
+        leaf_base = np.arange(feature.shape[0], dtype=np.int64)[:, None] * self.arrays["leaf_values"].shape[1]
+        self._splits = (unique[:, 0].astype(np.int64), unique[:, 1].astype(border.dtype),
+                        np.ascontiguousarray(split_of_level.T), leaf_base)
+
+    # --- persistence ---
+
+    def save(self, path):
+        meta = {"kind": self.kind, "base_score": self.base_score,
+                "sigmoid_scale": self.sigmoid_scale, "source": self.source}
+        np.savez(path, __meta__=np.array(json.dumps(meta)), **self.arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["__meta__"]))
+            arrays = {k: data[k] for k in data.files if k != "__meta__"}
+        return cls(meta["kind"], arrays, meta["base_score"], meta["sigmoid_scale"], meta["source"])
+
+
+def _flat_tree_arrays(trees, strict, threshold_dtype):
+    """trees: list of dicts of per-node lists (feature, threshold, left, right, value, default_left, missing_type)."""
+    offsets = np.cumsum([0] + [len(t["feature"]) for t in trees])
+    cat = lambda key, dtype: np.concatenate([np.asarray(t[key], dtype=dtype) for t in trees])
+    left = cat("left", np.int32)
+    right = cat("right", np.int32)
+    own = np.arange(offsets[-1], dtype=np.int32)
+    tree_of = np.repeat(np.arange(len(trees)), np.diff(offsets)).astype(np.int32)
+    leaf = left < 0
+    # Local child ids -> global ids; leaves loop back to themselves
+    left = np.where(leaf, own, left + offsets[tree_of])
+    right = np.where(leaf, own, right + offsets[tree_of])
+    return {
+        "feature": np.where(leaf, 0, cat("feature", np.int32)).astype(np.int32),
+        "threshold": cat("threshold", threshold_dtype),
+        # children[2 * node] is the left child, children[2 * node + 1] the right one
+        "children": np.column_stack([left, right]).ravel().astype(np.int32),
+        "default_left": cat("default_left", bool),
+        "missing_type": cat("missing_type", np.int8),
+        "value": np.where(leaf, cat("value", np.float64), 0.0),
+        "roots": offsets[:-1].astype(np.int32),
+        "max_depth": np.array(max(t["depth"] for t in trees)),
+        "strict": np.array(strict),
+    }
+
+
+def _depth(left, right, node=0):
+    if left[node] < 0:
+        return 0
+    return 1 + max(_depth(left, right, left[node]), _depth(left, right, right[node]))
+
+
+def compile_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+    if learner["objective"]["name"] != "binary:logistic":
+        raise ValueError(f"unsupported XGBoost objective {learner['objective']['name']}")
+    trees = []
+    for t in learner["gradient_booster"]["model"]["trees"]:
+        left, right = t["left_children"], t["right_children"]
+        trees.append({
+            "feature": t["split_indices"], "threshold": t["split_conditions"],
+            "left": left, "right": right, "default_left": t["default_left"],
+            "missing_type": [MISSING_NAN] * len(left),
+            # Leaves keep their weight in split_conditions
+            "value": t["split_conditions"], "depth": _depth(left, right),
+        })
+    base = float(learner["learner_model_param"]["base_score"].strip("[]"))
+    # XGBoost compares float32 features with float32 thresholds: go left if x < t
+    arrays = _flat_tree_arrays(trees, strict=True, threshold_dtype=np.float32)
+    return CompiledForest("tree", arrays, np.log(base / (1 - base)), source="xgboost")
+
+
+def compile_lightgbm(model):
+    dump = model.booster_.dump_model()
+    if not dump["objective"].startswith("binary"):
+        raise ValueError(f"unsupported LightGBM objective {dump['objective']}")
+    sigmoid = float(dump["objective"].split("sigmoid:")[1].split()[0])
+    trees = []
+    for info in dump["tree_info"]:
+        nodes = {k: [] for k in ("feature", "threshold", "left", "right", "default_left", "missing_type", "value")}
+
+        def visit(node):
+            i = len(nodes["feature"])
+            for values in nodes.values():
+                values.append(0)
+            if "leaf_value" in node:
+                nodes["left"][i] = nodes["right"][i] = -1
+                nodes["value"][i] = node["leaf_value"]
+                return i
+            if node["decision_type"] != "<=":
+                raise ValueError("categorical LightGBM splits are not supported")
+            nodes["feature"][i] = node["split_feature"]
+            nodes["threshold"][i] = node["threshold"]
+            nodes["default_left"][i] = node["default_left"]
+            nodes["missing_type"][i] = MISSING_TYPES[node["missing_type"]]
+            nodes["left"][i] = visit(node["left_child"])
+            nodes["right"][i] = visit(node["right_child"])
+            return i
+
+        visit(info["tree_structure"])
+        nodes["depth"] = _depth(nodes["left"], nodes["right"])
+        trees.append(nodes)
+    # LightGBM folds the initial score into the first tree; thresholds are doubles, go left if x <= t
+    arrays = _flat_tree_arrays(trees, strict=False, threshold_dtype=np.float64)
+    return CompiledForest("tree", arrays, 0.0, sigmoid, source="lightgbm")
+
+
+def compile_catboost(model):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.json")
+        model.save_model(path, format="json")
+        with open(path) as f:
+            dump = json.load(f)
+    float_index = {f["feature_index"]: f["flat_feature_index"] for f in dump["features_info"]["float_features"]}
+    trees = dump["oblivious_trees"]
+    depth = max(len(t["splits"]) for t in trees)
+    # Shallower trees are padded with never-true splits (border +inf), so their
+    # leaf index only uses the low bits that index the real leaves
+    feature = np.zeros((len(trees), depth), dtype=np.int32)
+    border = np.full((len(trees), depth), np.inf, dtype=np.float32)
+    leaves = np.zeros((len(trees), 2 ** depth), dtype=np.float64)
+    for i, t in enumerate(trees):
+        for level, split in enumerate(t["splits"]):
+            if split["split_type"] != "FloatFeature":
+                raise ValueError(f"unsupported CatBoost split type {split['split_type']}")
+            feature[i, level] = float_index[split["float_feature_index"]]
+            border[i, level] = split["border"]
+        leaves[i, :len(t["leaf_values"])] = t["leaf_values"]
+    scale, bias = dump["scale_and_bias"]
+    leaves *= scale
+    arrays = {"feature": feature, "threshold": border, "leaf_values": leaves}
+    return CompiledForest("oblivious", arrays, float(np.sum(bias)), source="catboost")
+
+
+def compile_model(model):
+    name = type(model).__name__
+    if name == "XGBClassifier":
+        return compile_xgboost(model)
+    if name in ("LGBMClassifier", "LGBMBoosterClassifier"):
+        return compile_lightgbm(model)
+    if name == "CatBoostClassifier":
+        return compile_catboost(model)
+    raise TypeError(f"cannot compile a {name}")
+
+
+def compiled_path(model_path):
+    """trained_models/xgboost_model.joblib -> trained_models/xgboost_compiled.npz"""
+    root = os.path.splitext(model_path)[0]
+    if root.endswith("_model"):
+        root = root[:-len("_model")]
+    return f"{root}_compiled.npz"
+
+
+def load_model(model_path, prefer_compiled=True):
+    """The compiled form of a model when one was exported, else the pickled model itself."""
+    path = compiled_path(model_path)
+    if prefer_compiled and os.path.exists(path):
+        return CompiledForest.load(path)
+    import joblib
+    return joblib.load(model_path)
+
+
+def with_missing(X, rows=1000, share=0.2, seed=0):
+    """Copies of up to `rows` rows of X with about `share` of the values set to NaN and as many to 0."""
+    rng = np.random.default_rng(seed)
+    X = np.array(X[:rows], dtype=np.float64)
+    draw = rng.random(X.shape)
+    X[draw < share] = np.nan
+    X[(draw >= share) & (draw < 2 * share)] = 0.0
+    return X
+
+
+def export_compiled(model, model_path, X, tolerance=1e-5):
+    """
+    Compile `model`, check it against the original on X and save it next to model_path.
+
+    The check also covers copies of X with missing values and zeros
+    (with_missing), where the libraries' missing-value rules apply. Raises
+    TypeError for unsupported models and ValueError when the compiled
+    predictions differ by more than `tolerance`. Returns (path, max |dp|).
+    """
+    compiled = compile_model(model)
+    X = np.vstack([np.asarray(X, dtype=np.float64), with_missing(X)])
+    diff = float(np.abs(compiled.predict_proba(X)[:, 1] - model.predict_proba(X)[:, 1]).max())
+    if diff > tolerance:
+        raise ValueError(f"{model_path}: compiled predictions differ by {diff:.2e}")
+    compiled.save(compiled_path(model_path))
+    return compiled_path(model_path), diff
+
+
+if __name__ == "__main__":
+    import joblib
+
+    from utils.data import load_dataset
+    from utils.pipeline import MODELS_DIR, load_pipeline
+
+    df = load_dataset()
+    for model_path in sorted(glob.glob(os.path.join(MODELS_DIR, "*_model.joblib"))):
+        model = joblib.load(model_path)
+        try:
+            path, diff = export_compiled(model, model_path, load_pipeline(model_path).transform_frame(df))
+        except TypeError:
+            continue
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"Saved {path} (max |dp| = {diff:.1e})")
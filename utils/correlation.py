@@ -0,0 +1,137 @@
+"""
+Pearson correlations from one matrix product.
+
+The selected numeric columns are standardized (float64 column statistics)
+into a single contiguous float32 block Z, scaled so that Z.T @ Z is the
+correlation matrix. That product is done by BLAS (sgemm per BLOCK_ROWS
+rows, summed in float64) instead of pandas' pairwise loop. Correlations
+with a single column (e.g. the target) are the matrix-vector product with
+that column. Top pairs are taken from the upper triangle with
+np.argpartition, so only the k winners get sorted.
+
+Results are cached in memory and in .cache/correlation/ under the caller's
+dataset key plus the column list, so a rerun or another session doesn't
+recompute them.
+
+Inputs are expected without missing values (the pages pass imputed data);
+any NaN is treated as the column mean. Constant columns correlate as NaN,
+like pandas.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.path.join(".cache", "correlation")
+# float32 products are summed per block of rows into float64, which keeps the
+# rounding error of long dot products around 1e-7
+BLOCK_ROWS = 8192
+
+_lock = threading.Lock()
+_memory = {}   # cache name -> result
+
+
+def standardized_block(df, columns):
+    """(n, p) C-contiguous float32 Z with Z.T @ Z = correlation matrix (constant columns -> NaN)."""
+    n = len(df)
+    Z = np.empty((n, len(columns)), dtype=np.float32)
+    for j, col in enumerate(columns):
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        mean = np.nanmean(values) if n else 0.0
+        centered = np.where(np.isnan(values), 0.0, values - mean)
+        norm = np.sqrt(np.dot(centered, centered))
+        Z[:, j] = centered / norm if norm > 0 else np.nan
+    return Z
+
+
+def _products(Z, j=None):
+    """Z.T @ Z (or Z.T @ Z[:, j]) accumulated in float64 over row blocks."""
+    out = np.zeros((Z.shape[1], Z.shape[1]) if j is None else Z.shape[1])
+    for start in range(0, len(Z), BLOCK_ROWS):
+        block = Z[start:start + BLOCK_ROWS]
+        out += block.T @ (block if j is None else block[:, j])
+    return out
+
+
+def _numeric(df, columns):
+    columns = list(df.columns if columns is None else columns)
+    return [col for col in columns if pd.api.types.is_numeric_dtype(df[col])]
+
+
+def _cached(kind, data_key, columns, compute):
+    if data_key is None:
+        return compute()
+    digest = hashlib.blake2b(json.dumps([kind, columns]).encode(), digest_size=8).hexdigest()
+    name = f"{data_key}-{digest}.json"
+    with _lock:
+        if name in _memory:
+            return _memory[name]
+        path = os.path.join(CACHE_DIR, name)
+        if os.path.exists(path):
+            with open(path) as f:
+                result = json.load(f)
+        else:
+            result = compute()
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        _memory[name] = result
+        return result
+
+
+def correlation_matrix(df, columns=None, data_key=None):
+    """
+    Correlation matrix of the numeric `columns` (default: all) as a labelled DataFrame.
+
+    `data_key` (e.g. the dataset hash) enables caching; leave it None for
+    data that isn't tied to a dataset version.
+    """
+    columns = _numeric(df, columns)
+
+    def compute():
+        Z = standardized_block(df, columns)
+        corr = _products(Z)
+        np.clip(corr, -1.0, 1.0, out=corr)
+        constant = np.isnan(Z[0]) if len(Z) else np.zeros(len(columns), dtype=bool)
+        np.fill_diagonal(corr, np.where(constant, np.nan, 1.0))
+        return {"columns": columns, "corr": np.where(np.isnan(corr), None, corr).tolist()}
+
+    result = _cached("matrix", data_key, columns, compute)
+    corr = np.array(result["corr"], dtype=np.float64)
+    return pd.DataFrame(corr, index=result["columns"], columns=result["columns"])
+
+
+def correlations_with(df, target, columns=None, data_key=None):
+    """Correlation of each numeric column (the target itself included) with `target`, as a Series."""
+    columns = _numeric(df, columns)
+    if target not in columns:
+        columns.append(target)
+
+    def compute():
+        Z = standardized_block(df, columns)
+        r = _products(Z, columns.index(target))
+        np.clip(r, -1.0, 1.0, out=r)
+        return {"columns": columns, "corr": np.where(np.isnan(r), None, r).tolist()}
+
+    result = _cached("target", data_key, columns, compute)
+    return pd.Series(np.array(result["corr"], dtype=np.float64), index=result["columns"], name=target)
+
+
+def top_pairs(corr, k=5):
+    """The k most strongly correlated distinct pairs (by |r|) as [(col_a, col_b, r)]."""
+    values = corr.to_numpy()
+    rows, cols = np.triu_indices(len(values), 1)
+    r = values[rows, cols]
+    strength = np.where(np.isnan(r), -1.0, np.abs(r))
+    k = min(k, len(r))
+    if k == 0:
+        return []
+    best = np.argpartition(-strength, k - 1)[:k]
+    best = best[np.argsort(-strength[best], kind="stable")]
+    names = corr.columns
+    return [(names[rows[i]], names[cols[i]], float(r[i])) for i in best if not np.isnan(r[i])]
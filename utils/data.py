@@ -0,0 +1,220 @@
+"""
+Shared access to the evi.csv dataset.
+
+The CSV is parsed once per file content, stored as a typed Parquet cache in
+.cache/data/<hash>.v<LAYOUT_VERSION>.parquet, and kept as a single
+in-process DataFrame. Every caller gets a shallow (zero-copy) view of that
+frame, so visiting more pages or opening more sessions doesn't add more
+copies of the data.
+
+The column types are inferred from the values when the CSV is parsed
+(compact_dtypes): whole numbers get the smallest integer type that holds
+their range, text with few distinct values becomes a categorical. Missing
+values stay missing. A column with gaps gets a nullable integer type
+(UInt8, ...), whose pd.NA is counted by isna(), skipped by reductions and
+turned back into NaN by to_numpy(dtype=float, na_value=np.nan).
+"""
+import hashlib
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = "evi.csv"
+CACHE_DIR = os.path.join(".cache", "data")
+
+TARGET = "Personality"
+NUMERIC_COLS = ['Time_spent_Alone', 'Social_event_attendance', 'Going_outside',
+                'Friends_circle_size', 'Post_frequency']
+CATEGORICAL_COLS = ['Stage_fear', 'Drained_after_socializing']
+
+# Fixed dtypes for readers that see the file a chunk at a time (a chunk
+# can't tell the layout of the whole column): numeric columns keep NaN as
+# float32, the Yes/No and target columns are categoricals.
+DTYPES = {'id': 'int32', TARGET: 'category'}
+DTYPES.update({col: 'float32' for col in NUMERIC_COLS})
+DTYPES.update({col: 'category' for col in CATEGORICAL_COLS})
+
+# Incremental readers (utils.stats_store, utils.dedup)
+BLOCK_BYTES = 32 << 20         # bytes of CSV parsed at a time
+FINGERPRINT_BYTES = 64 << 10   # head/tail blocks compared to detect edits
+
+# Bump when compact_dtypes changes, so older Parquet caches aren't reused
+LAYOUT_VERSION = 2
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_RATIO = 0.5
+# Candidates for whole-number columns, smallest first
+_INT_TYPES = [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32, np.int64]
+
+_lock = threading.Lock()
+_hashes = {}   # (path, mtime, size) -> content hash
+_frames = {}   # path -> (content hash, DataFrame)
+
+
+def file_hash(path=DATA_PATH):
+    """Content hash of `path`, recomputed only when its mtime or size change."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _hashes:
+        h = hashlib.blake2b(digest_size=8)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        _hashes[key] = h.hexdigest()
+    return _hashes[key]
+
+
+def file_fingerprint(path, offset):
+    """Hashes of the first and of the last FINGERPRINT_BYTES bytes before `offset`."""
+    with open(path, "rb") as f:
+        head = f.read(min(offset, FINGERPRINT_BYTES))
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        tail = f.read(min(offset, FINGERPRINT_BYTES))
+    return [hashlib.blake2b(head, digest_size=8).hexdigest(), hashlib.blake2b(tail, digest_size=8).hexdigest()]
+
+
+def read_blocks(path, start, header):
+    """DataFrames of the rows from byte `start` to the end of the file, BLOCK_BYTES at a time."""
+    dtypes = {col: DTYPES[col] for col in header if col in DTYPES}
+
+    def parse(data):
+        return pd.read_csv(io.BytesIO(data), names=header, header=None, dtype=dtypes)
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        pending = b""
+        for block in iter(lambda: f.read(BLOCK_BYTES), b""):
+            data = pending + block
+            cut = data.rfind(b"\n") + 1
+            data, pending = data[:cut], data[cut:]
+            if data.strip():
+                yield parse(data)
+        if pending.strip():
+            yield parse(pending)
+
+
+def _nullable(dtype):
+    """uint8 -> UInt8, int16 -> Int16"""
+    name = dtype.name
+    return pd.api.types.pandas_dtype("UInt" + name[4:] if name.startswith("u") else "I" + name[1:])
+
+
+def compact_numeric_dtype(low, high, whole, missing, fits_float32):
+    """
+    compact_dtype's rule for a numeric column summarized by its range, whether
+    every value is whole, whether any is missing and whether float32 holds
+    them all exactly. None keeps the column's own dtype.
+    """
+    if whole and low is not None:
+        for candidate in map(np.dtype, _INT_TYPES):
+            info = np.iinfo(candidate)
+            if info.min <= low and high <= info.max:
+                # numpy integers have no NaN: a column with gaps gets the nullable variant
+                return _nullable(candidate) if missing else candidate
+    return np.dtype(np.float32) if fits_float32 else None
+
+
+def compact_text_dtype(levels, rows):
+    """compact_dtype's rule for a text column with `levels` distinct values in `rows` rows."""
+    return pd.CategoricalDtype() if levels <= CATEGORY_MAX_RATIO * rows else None
+
+
+def compact_dtype(series):
+    """The smallest dtype that holds every value of `series` exactly, or None to keep its own."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+        return None
+    if pd.api.types.is_numeric_dtype(dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        present = values[~np.isnan(values)]
+        finite = len(present) > 0 and bool(np.isfinite(present).all())
+        return compact_numeric_dtype(
+            present.min() if finite else None, present.max() if finite else None,
+            finite and np.array_equal(present, np.round(present)), len(present) < len(values),
+            dtype == np.float64 and np.array_equal(present, present.astype(np.float32)))
+    if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        return compact_text_dtype(series.nunique(dropna=True), len(series))
+    return None
+
+
+def compact_dtypes(df):
+    """`df` with every column converted to its compact_dtype (missing values stay missing)."""
+    dtypes = {}
+    for col in df.columns:
+        dtype = compact_dtype(df[col])
+        if dtype is not None and dtype != df[col].dtype:
+            dtypes[col] = dtype
+    return df.astype(dtypes) if dtypes else df
+
+
+def _read_typed(path, data_hash):
+    cache_path = os.path.join(CACHE_DIR, f"{data_hash}.v{LAYOUT_VERSION}.parquet")
+    try:
+        return pd.read_parquet(cache_path)
+    except (FileNotFoundError, ImportError):
+        pass
+
+    df = compact_dtypes(pd.read_csv(path))
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    except (ImportError, OSError):
+        # No pyarrow or a read-only checkout: still works, just re-parses.
+        pass
+    return df
+
+
+def load_dataset(path=DATA_PATH):
+    """
+    Return a zero-copy view of the typed dataset.
+
+    The view shares its columns with the cached frame. Adding or replacing
+    columns (df[col] = ...) is safe; changing values in place (df.loc[...] =,
+    inplace=True) needs df.copy() first, since before pandas 3 (Copy-on-Write)
+    it would change the shared frame for every caller.
+
+    Raises FileNotFoundError if `path` does not exist, like pd.read_csv.
+    """
+    data_hash = file_hash(path)
+    key = os.path.abspath(path)
+    with _lock:
+        cached_hash, df = _frames.get(key, (None, None))
+        if cached_hash != data_hash:
+            # Replaces the frame of an older version of the same file
+            df = _read_typed(path, data_hash)
+            _frames[key] = (data_hash, df)
+    return df.copy(deep=False)
+
+
+def impute_dataset(df, fill_values=None):
+    """
+    Median-fill numeric columns and mode-fill categorical ones (the pages' basic cleaning).
+
+    `fill_values` ({column: value}, e.g. from utils.stats_store) skips
+    recomputing the medians and modes over the frame. Nullable integer
+    columns come back as plain numpy integers, or float32 when a fill value
+    isn't a whole number.
+    """
+    num_cols = df.select_dtypes(include=['number']).columns
+    cat_cols = df.select_dtypes(include=['object', 'category']).columns
+    df = df.copy(deep=False)
+    if fill_values is None:
+        fill_values = df[num_cols].median().to_dict()
+        fill_values.update({col: df[col].mode()[0] for col in cat_cols})
+    for col in num_cols:
+        column, value = df[col], fill_values[col]
+        if isinstance(column.dtype, pd.api.extensions.ExtensionDtype):
+            # Nothing left to mask once filled; a fractional median needs a float column
+            if float(value).is_integer():
+                df[col] = column.fillna(value).astype(column.dtype.numpy_dtype)
+            else:
+                df[col] = column.astype(np.float32).fillna(value)
+        else:
+            df[col] = column.fillna(value)
+    for col in cat_cols:
+        df[col] = df[col].fillna(fill_values[col])
+    return df
@@ -0,0 +1,211 @@
+"""
+Duplicate rows from a persistent index of 64-bit row hashes.
+
+Each row is hashed once (pandas' hash_pandas_object over the chosen
+columns, numbers normalized to float64 so 3, 3.0 and UInt8 3 agree). The
+index keeps:
+
+    hashes / first   the distinct hashes, sorted, with the row that first had each
+    dup_hashes/rows  every later row whose hash was already there
+
+New rows are looked up with one np.searchsorted over the sorted hashes and
+only their distinct new hashes are inserted, so a batch costs
+O(batch log n) lookups plus one copy of the sorted array, not a rescan of
+the history. Groups of colliding rows come straight from the dup records.
+
+load_duplicate_index keeps one index per file and column choice in
+.cache/dedup/, along with the byte offset it has read up to and
+fingerprints of the file (the same scheme as utils.stats_store): rows
+appended to the CSV are the only ones hashed on the next call, and any
+other edit rebuilds the index.
+
+    index = load_duplicate_index(ignore=("id",))
+    index.duplicates          # rows repeating an earlier row
+    index.groups()            # [[first row, repeat, ...], ...] by row number
+
+Two different rows share a 64-bit hash with probability about n^2 / 2^65,
+i.e. ~10^-11 at this size, so hash equality is taken as row equality.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.data import DATA_PATH, file_fingerprint, read_blocks
+
+CACHE_DIR = os.path.join(".cache", "dedup")
+# Bump when the stored layout or the row hashing changes so stale indexes are rebuilt
+INDEX_VERSION = 1
+
+_lock = threading.Lock()
+_memory = {}   # (path, size, mtime, ignored columns) -> RowHashIndex
+
+
+def hash_rows(df, columns=None):
+    """uint64 hash per row of `df[columns]` (default: every column)."""
+    columns = list(df.columns if columns is None else columns)
+    canonical = {}
+    for col in columns:
+        column = df[col]
+        if pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype):
+            canonical[col] = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            canonical[col] = column.array
+    frame = pd.DataFrame(canonical, index=pd.RangeIndex(len(df)))
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class RowHashIndex:
+    """Sorted distinct row hashes and the rows that repeat them."""
+
+    def __init__(self, ignore=()):
+        self.ignore = list(ignore)
+        self.rows = 0
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.first = np.empty(0, dtype=np.int64)
+        self.dup_hashes = np.empty(0, dtype=np.uint64)
+        self.dup_rows = np.empty(0, dtype=np.int64)
+
+    def columns(self, df):
+        return [col for col in df.columns if col not in self.ignore]
+
+    def add(self, df):
+        """
+        Index the rows of `df` (numbered after the rows already indexed) and
+        return a boolean array marking those that repeat an earlier row.
+        """
+        return self.add_hashes(hash_rows(df, self.columns(df)))
+
+    def add_hashes(self, hashes):
+        rows = self.rows + np.arange(len(hashes), dtype=np.int64)
+        self.rows += len(hashes)
+        # The first row of each hash within the batch (stable sort keeps the earliest)
+        batch, first = np.unique(hashes, return_index=True)
+        repeat = np.ones(len(hashes), dtype=bool)
+        repeat[first] = False
+
+        pos = np.searchsorted(self.hashes, batch)
+        known = np.zeros(len(batch), dtype=bool)
+        inside = pos < len(self.hashes)
+        known[inside] = self.hashes[pos[inside]] == batch[inside]
+        repeat[first[known]] = True
+
+        fresh = ~known
+        self.hashes = np.insert(self.hashes, pos[fresh], batch[fresh])
+        self.first = np.insert(self.first, pos[fresh], rows[first[fresh]])
+        self.dup_hashes = np.concatenate([self.dup_hashes, hashes[repeat]])
+        self.dup_rows = np.concatenate([self.dup_rows, rows[repeat]])
+        return repeat
+
+    def contains(self, df):
+        """Boolean array: which rows of `df` repeat an indexed row (nothing is added)."""
+        hashes = hash_rows(df, self.columns(df))
+        pos = np.minimum(np.searchsorted(self.hashes, hashes), max(len(self.hashes) - 1, 0))
+        return self.hashes[pos] == hashes if len(self.hashes) else np.zeros(len(hashes), dtype=bool)
+
+    @property
+    def duplicates(self):
+        """Rows that repeat an earlier row, like df.duplicated().sum()."""
+        return len(self.dup_rows)
+
+    def groups(self, limit=None):
+        """Groups of identical rows as [first row, repeats...] by row number, largest groups first."""
+        if not len(self.dup_rows):
+            return []
+        order = np.argsort(self.dup_hashes, kind="stable")
+        hashes, rows = self.dup_hashes[order], self.dup_rows[order]
+        keys, starts, sizes = np.unique(hashes, return_index=True, return_counts=True)
+        firsts = self.first[np.searchsorted(self.hashes, keys)]
+        ranked = np.lexsort((firsts, -sizes))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [[int(firsts[g])] + rows[starts[g]:starts[g] + sizes[g]].tolist() for g in ranked]
+
+    def group_count(self):
+        return len(np.unique(self.dup_hashes))
+
+    def save(self, store_path, **meta):
+        tmp_path = f"{store_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, hashes=self.hashes, first=self.first, dup_hashes=self.dup_hashes,
+                     dup_rows=self.dup_rows,
+                     meta=np.array(json.dumps({"ignore": self.ignore, "rows": self.rows, **meta})))
+        os.replace(tmp_path, store_path)
+
+    @classmethod
+    def load(cls, store_path):
+        """(index, stored metadata) from a file written by save."""
+        with np.load(store_path) as data:
+            meta = json.loads(str(data["meta"]))
+            index = cls(meta["ignore"])
+            index.rows = meta["rows"]
+            for name in ["hashes", "first", "dup_hashes", "dup_rows"]:
+                setattr(index, name, data[name])
+        return index, meta
+
+
+def load_duplicate_index(path=DATA_PATH, ignore=()):
+    """
+    RowHashIndex of `path` ignoring the `ignore` columns, read from
+    .cache/dedup/ and brought up to date.
+
+    Rows appended since the last call are hashed and added; an edited file
+    is re-indexed from the start.
+    """
+    ignore = sorted(ignore)
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, tuple(ignore))
+    with _lock:
+        if key in _memory:
+            return _memory[key]
+
+        name = hashlib.blake2b(json.dumps([os.path.abspath(path), ignore]).encode(), digest_size=8).hexdigest()
+        store_path = os.path.join(CACHE_DIR, f"{name}.npz")
+        index = meta = None
+        if os.path.exists(store_path):
+            index, meta = RowHashIndex.load(store_path)
+            offset = meta.get("offset", 0)
+            # Same size but touched means rewritten in place, not appended to
+            rewritten = stat.st_size == offset and stat.st_mtime_ns != meta.get("mtime_ns")
+            if (meta.get("version") != INDEX_VERSION or stat.st_size < offset or rewritten
+                    or file_fingerprint(path, offset) != meta["fingerprint"]):
+                index = meta = None
+
+        with open(path, "rb") as f:
+            header_line = f.readline()
+        header = header_line.decode().strip().split(",")
+        if index is None:
+            index, start = RowHashIndex(ignore), len(header_line)
+        else:
+            start = meta["offset"]
+
+        if meta is None or start < stat.st_size or stat.st_mtime_ns != meta.get("mtime_ns"):
+            for df in read_blocks(path, start, header):
+                index.add(df)
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            index.save(store_path, version=INDEX_VERSION, path=os.path.abspath(path), offset=stat.st_size,
+                       mtime_ns=stat.st_mtime_ns, fingerprint=file_fingerprint(path, stat.st_size))
+
+        _memory[key] = index
+        return index
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Count duplicate rows of a CSV with the row-hash index.")
+    parser.add_argument("path", nargs="?", default=DATA_PATH)
+    parser.add_argument("--ignore", nargs="*", default=[], help="Columns left out of the comparison")
+    parser.add_argument("--groups", type=int, default=5, help="Largest groups to print")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = load_duplicate_index(args.path, args.ignore)
+    print(f"{index.rows:,} rows, {index.duplicates:,} duplicates in {index.group_count():,} groups "
+          f"({time.perf_counter() - start:.3f}s)")
+    for group in index.groups(args.groups):
+        print(f"  {len(group)} rows: {group[:10]}{' ...' if len(group) > 10 else ''}")
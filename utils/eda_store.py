@@ -0,0 +1,95 @@
+"""
+Precomputed per-feature aggregates for the EDA page.
+
+Everything the EDA charts need is computed once per dataset version (after
+the page's median/mode imputation) and persisted as
+.cache/eda/<dataset hash>.json:
+
+    numeric[col]      per-Personality count/mean/sum/min/q1/median/q3/max,
+                      box-plot whiskers, a capped outlier sample and
+                      histogram counts on shared bins (see utils.binning)
+    categorical[col]  Personality x level crosstab counts and overall counts
+
+Chart interactions then only read these small tables, so their cost doesn't
+grow with the number of rows.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from utils.binning import grouped_box_stats, grouped_histogram, histogram_edges
+from utils.data import DATA_PATH, TARGET, file_hash, impute_dataset, load_dataset
+from utils.stats_store import load_stats
+
+CACHE_DIR = os.path.join(".cache", "eda")
+# Bump when the stored layout changes so stale files are rebuilt
+STORE_VERSION = 2
+
+_lock = threading.Lock()
+_stores = {}   # dataset hash -> aggregates
+
+
+def build_aggregates(df):
+    """Aggregates of an already imputed frame."""
+    groups = [str(g) for g in df[TARGET].dropna().unique()]
+    target = df[TARGET].astype(str).to_numpy()
+    masks = {g: target == g for g in groups}
+    codes = np.full(len(df), -1, dtype=np.int64)
+    for i, mask in enumerate(masks.values()):
+        codes[mask] = i
+
+    numeric = {}
+    for col in df.select_dtypes(include=['number']).columns:
+        values = df[col].to_numpy(dtype=np.float64)
+        edges = histogram_edges(values)
+        counts = grouped_histogram(values, codes, len(groups), edges)
+        boxes = grouped_box_stats(values, codes, len(groups))
+        numeric[col] = {
+            "bin_edges": edges.tolist(),
+            # A group without values in this column has no box, only its zero count
+            "groups": {g: {**(boxes[i] or {"count": 0, "mean": None, "sum": 0.0}),
+                           "hist_counts": counts[i].tolist()} for i, g in enumerate(groups)},
+        }
+
+    categorical = {}
+    for col in df.select_dtypes(include=['object', 'category']).columns:
+        if col == TARGET:
+            continue
+        column = df[col].astype(str).to_numpy()
+        levels = sorted(set(column))
+        categorical[col] = {
+            "levels": levels,
+            "counts": {g: [int(np.count_nonzero(column[mask] == level)) for level in levels]
+                       for g, mask in masks.items()},
+        }
+
+    return {"version": STORE_VERSION, "rows": int(len(df)), "groups": groups,
+            "numeric": numeric, "categorical": categorical}
+
+
+def load_aggregates(path=DATA_PATH):
+    """Aggregates for the current version of `path`, built and persisted on first use."""
+    data_hash = file_hash(path)
+    with _lock:
+        if data_hash in _stores:
+            return _stores[data_hash]
+
+        store_path = os.path.join(CACHE_DIR, f"{data_hash}.json")
+        store = None
+        if os.path.exists(store_path):
+            with open(store_path) as f:
+                store = json.load(f)
+            if store.get("version") != STORE_VERSION:
+                store = None
+        if store is None:
+            store = build_aggregates(impute_dataset(load_dataset(path), load_stats(path).fill_values()))
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{store_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(store, f)
+            os.replace(tmp_path, store_path)
+
+        _stores[data_hash] = store
+        return store
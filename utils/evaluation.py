@@ -0,0 +1,184 @@
+"""
+Computed model evaluation for the Model Evaluation page.
+
+Every model in the manifest scores the same holdout set (the notebook's
+split: 20%, random_state=42) in a process pool. Each model's probability
+vector is cached in .cache/evaluation/<data hash>/<model hash>.npy, and the
+metrics derived from it (accuracy and weighted precision/recall/F1 as in the
+notebook, confusion matrix, ROC and PR curves, feature importances) in a
+.json next to it. A retrained model has a new hash and is re-scored.
+
+Scoring happens here only, never in a page view: the Model Evaluation page
+reads the results with cached_results and asks for this to be run when
+some are missing. Run after (re)training:
+    python -m utils.evaluation
+"""
+import json
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.data import DATA_PATH, file_hash, load_dataset
+from utils.pipeline import MODEL_FEATURES, encode_raw, encode_target
+from utils.registry import MANIFEST_PATH, read_manifest
+
+CACHE_DIR = os.path.join(".cache", "evaluation")
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+CURVE_POINTS = 200   # ROC/PR curves are thinned to about this many points
+
+_lock = threading.Lock()
+_memory = {}   # result file path -> results
+
+
+def _save_atomic(path, probs=None, result=None):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb" if result is None else "w") as f:
+        if result is None:
+            np.save(f, probs)
+        else:
+            json.dump(result, f)
+    os.replace(tmp_path, path)
+
+
+def holdout_split(df):
+    """(train, test) frames, the same rows as the notebook's train_test_split."""
+    from sklearn.model_selection import train_test_split
+    return train_test_split(df, test_size=TEST_SIZE, random_state=RANDOM_STATE)
+
+
+def _feature_importances(entry, model):
+    if not hasattr(model, "feature_importances_"):
+        # Compiled models don't keep them; the original pickle does
+        import joblib
+        model = joblib.load(entry["source"])
+    importances = getattr(model, "feature_importances_", None)
+    if importances is None:
+        return None
+    importances = np.asarray(importances, dtype=np.float64)
+    return dict(zip(MODEL_FEATURES, (100 * importances / importances.sum()).tolist()))
+
+
+def _score_model(entry, X_raw):
+    """Worker: P(Extrovert) on the holdout rows plus the model's importances."""
+    from utils.pipeline import load_pipeline
+    from utils.registry import load_artifact
+
+    model = load_artifact(entry)
+    probs = model.predict_proba(load_pipeline(entry["source"]).transform(X_raw))[:, 1]
+    return probs, _feature_importances(entry, model)
+
+
+def _thin(*curves):
+    n = len(curves[0])
+    if n <= CURVE_POINTS:
+        return [c.tolist() for c in curves]
+    keep = np.unique(np.linspace(0, n - 1, CURVE_POINTS).round().astype(int))
+    return [c[keep].tolist() for c in curves]
+
+
+def compute_metrics(y_true, probs):
+    from sklearn.metrics import (accuracy_score, average_precision_score, confusion_matrix,
+                                 precision_recall_curve, precision_recall_fscore_support,
+                                 roc_auc_score, roc_curve)
+
+    y_pred = (probs >= 0.5).astype(np.int64)
+    precision, recall, f1, _ = precision_recall_fscore_support(y_true, y_pred, average="weighted")
+    fpr, tpr, _ = roc_curve(y_true, probs)
+    pr_precision, pr_recall, _ = precision_recall_curve(y_true, probs)
+    fpr, tpr = _thin(fpr, tpr)
+    pr_precision, pr_recall = _thin(pr_precision, pr_recall)
+    return {
+        "Accuracy": accuracy_score(y_true, y_pred),
+        "Precision": precision,
+        "Recall": recall,
+        "F1-Score": f1,
+        "ROC-AUC": roc_auc_score(y_true, probs),
+        "Average Precision": average_precision_score(y_true, probs),
+        # Rows: actual Introvert/Extrovert, columns: predicted
+        "confusion_matrix": confusion_matrix(y_true, y_pred, labels=[0, 1]).tolist(),
+        "roc_curve": {"fpr": fpr, "tpr": tpr},
+        "pr_curve": {"precision": pr_precision, "recall": pr_recall},
+    }
+
+
+def _result_path(cache_dir, entry):
+    return os.path.join(cache_dir, f"{entry['sha256']}.json")
+
+
+def cached_results(path=DATA_PATH, manifest_path=MANIFEST_PATH):
+    """
+    ({model name: results}, [model names without results]) for the manifest
+    models, from the cache only: nothing is scored.
+    """
+    entries = read_manifest(manifest_path)["models"]
+    cache_dir = os.path.join(CACHE_DIR, file_hash(path))
+    results, missing = {}, []
+    with _lock:
+        for entry in entries:
+            result_path = _result_path(cache_dir, entry)
+            if result_path in _memory:
+                results[entry["name"]] = _memory[result_path]
+            elif os.path.exists(result_path):
+                with open(result_path) as f:
+                    results[entry["name"]] = _memory[result_path] = json.load(f)
+            else:
+                missing.append(entry["name"])
+    return results, missing
+
+
+def evaluate_models(path=DATA_PATH, manifest_path=MANIFEST_PATH, workers=None):
+    """
+    {model name: results} for every manifest model; cached per model hash + data hash.
+
+    Only models without cached results are scored, in parallel. The pool
+    spawns its workers instead of forking, so this is safe to call from a
+    threaded process.
+    """
+    entries = read_manifest(manifest_path)["models"]
+    cache_dir = os.path.join(CACHE_DIR, file_hash(path))
+    results, missing = cached_results(path, manifest_path)
+    missing = [entry for entry in entries if entry["name"] in missing]
+
+    if missing:
+        _, test_df = holdout_split(load_dataset(path))
+        X_raw, y_true = encode_raw(test_df), encode_target(test_df)
+        os.makedirs(cache_dir, exist_ok=True)
+        workers = workers or min(len(missing), os.cpu_count() or 1)
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {entry["name"]: (entry, pool.submit(_score_model, entry, X_raw)) for entry in missing}
+            for name, (entry, future) in futures.items():
+                probs, importances = future.result()
+                _save_atomic(os.path.join(cache_dir, f"{entry['sha256']}.npy"), probs=probs)
+                result = {
+                    "model": name,
+                    "display_name": entry["display_name"],
+                    "model_sha256": entry["sha256"],
+                    "holdout_rows": int(len(y_true)),
+                    **compute_metrics(y_true, probs),
+                    "feature_importances": importances,
+                }
+                result_path = _result_path(cache_dir, entry)
+                _save_atomic(result_path, result=result)
+                with _lock:
+                    _memory[result_path] = result
+                results[name] = result
+
+    # Manifest order
+    return {entry["name"]: results[entry["name"]] for entry in entries}
+
+
+def load_probabilities(model_sha256, path=DATA_PATH):
+    """Cached holdout P(Extrovert) vector of one model (after evaluate_models ran)."""
+    return np.load(os.path.join(CACHE_DIR, file_hash(path), f"{model_sha256}.npy"))
+
+
+if __name__ == "__main__":
+    results = evaluate_models()
+    print(f"{'Model':<22} {'Accuracy':>9} {'Precision':>9} {'Recall':>9} {'F1':>9} {'AUC':>9}")
+    for name, r in sorted(results.items(), key=lambda item: -item[1]["Accuracy"]):
+        print(f"{r['display_name']:<22} {r['Accuracy']:9.6f} {r['Precision']:9.6f} "
+              f"{r['Recall']:9.6f} {r['F1-Score']:9.6f} {r['ROC-AUC']:9.6f}")
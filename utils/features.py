@@ -0,0 +1,183 @@
+"""
+The derived features, declared once and compiled into one NumPy kernel.
+
+Each Feature gives its name, an arithmetic formula over input columns or
+earlier features, and the dtype its column gets in a DataFrame. The
+formula's names are its dependencies. FeatureKernel orders the features by
+those dependencies and turns the formulas into a fixed list of ufunc calls
+with out= targets:
+
+    - every feature is written straight into its column of one output array,
+      and later formulas read that column, so Social_Activity_Level is
+      computed once and reused by the three features built on it
+    - sub-expressions that aren't plain columns (the `+ 1` denominators) go to
+      a scratch row that is reused, so nothing is allocated per feature
+
+The kernel walks the rows in blocks of BLOCK_ROWS. A block is computed in a
+small feature-major workspace, so every ufunc runs on contiguous memory that
+stays in cache across all the steps, and is then written to the C-ordered
+output in one transposed copy.
+
+utils.pipeline compiles FEATURES over RAW_FEATURES once, as FEATURE_KERNEL.
+PreprocessingPipeline.engineer (training, batch scoring, the Live Prediction
+page) and derive_frame (the Feature Engineering page) both run it.
+
+    python benchmarks/features.py    # kernel vs the pandas column-by-column version
+"""
+import ast
+import hashlib
+import operator
+from collections import namedtuple
+
+import numpy as np
+
+# Rows per pass of the kernel: the 11-row float64 workspace is ~360 KB
+BLOCK_ROWS = 4096
+
+Feature = namedtuple("Feature", ["name", "formula", "dtype"])
+
+FEATURES = [
+    Feature("Social_Activity_Level", "Social_event_attendance + Going_outside + Friends_circle_size", "float32"),
+    Feature("Social_Discomfort_Index", "Stage_fear + Drained_after_socializing", "int8"),
+    Feature("Social_Balance", "Social_Activity_Level / (Time_spent_Alone + 1)", "float32"),
+    Feature("Discomfort_Efficiency", "Social_Discomfort_Index / (Social_Activity_Level + 1)", "float32"),
+    Feature("Posting_Impact", "Post_frequency * Social_Activity_Level", "float32"),
+]
+
+
+def definitions_hash(features=FEATURES):
+    """Short digest of the declarations, for cache keys of results computed from the features."""
+    text = "\n".join(f"{f.name}={f.formula}:{f.dtype}" for f in features)
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+_UFUNCS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+
+def _parse(feature):
+    tree = ast.parse(feature.formula, mode="eval").body
+    for node in ast.walk(tree):
+        if isinstance(node, ast.BinOp) and type(node.op) not in _UFUNCS:
+            raise ValueError(f"{feature.name}: unsupported operator in {feature.formula!r}")
+        if not isinstance(node, (ast.BinOp, ast.Name, ast.Constant, ast.operator, ast.Load)):
+            raise ValueError(f"{feature.name}: unsupported expression {ast.unparse(node)!r}")
+    return tree
+
+
+def dependencies(feature):
+    """Columns and features the formula reads, in order of appearance."""
+    names = [node.id for node in ast.walk(_parse(feature)) if isinstance(node, ast.Name)]
+    return list(dict.fromkeys(names))
+
+
+def _ordered(features, inputs):
+    """Features in dependency order; raises ValueError on unknown names or cycles."""
+    by_name = {f.name: f for f in features}
+    ordered, done, visiting = [], set(inputs), set()
+
+    def visit(feature):
+        if feature.name in done:
+            return
+        if feature.name in visiting:
+            raise ValueError(f"circular dependency through {feature.name}")
+        visiting.add(feature.name)
+        for name in dependencies(feature):
+            if name not in done:
+                if name not in by_name:
+                    raise ValueError(f"{feature.name} depends on unknown column {name!r}")
+                visit(by_name[name])
+        visiting.discard(feature.name)
+        done.add(feature.name)
+        ordered.append(feature)
+
+    for feature in features:
+        visit(feature)
+    return ordered
+
+
+class FeatureKernel:
+    """
+    The compiled registry: (n, len(inputs)) array -> (n, len(columns)) array.
+
+    `columns` is `passthrough` (input columns copied as they are) followed by
+    the features in declaration order.
+    """
+
+    def __init__(self, features, inputs, passthrough=()):
+        self.features = list(features)
+        self.inputs = list(inputs)
+        self.columns = list(passthrough) + [f.name for f in self.features]
+        # Passthrough copies as runs of adjacent columns: (first output, first input, width)
+        self.copies = []
+        for col in passthrough:
+            dst, src = self.columns.index(col), self.inputs.index(col)
+            last = self.copies[-1] if self.copies else None
+            if last and last[0] + last[2] == dst and last[1] + last[2] == src:
+                self.copies[-1] = (last[0], last[1], last[2] + 1)
+            else:
+                self.copies.append((dst, src, 1))
+
+        # Where each name is read from: ("in", j) or ("out", j)
+        slots = {col: ("in", j) for j, col in enumerate(self.inputs)}
+        slots.update((col, ("out", j)) for j, col in enumerate(self.columns))
+        steps = []   # (ufunc, left, right, target); None = copy left into target
+        self.scratch_rows = 0
+        for feature in _ordered(self.features, self.inputs):
+            target = ("out", self.columns.index(feature.name))
+            result = self._emit(_parse(feature), target, slots, 0, steps)
+            if result != target:
+                # A bare column or constant: one copy into the feature's column
+                steps.append((None, result, None, target))
+        self.steps = self._link(steps)
+
+    def _emit(self, node, target, slots, depth, steps):
+        """Append the steps computing `node` into `target`; returns where its value ends up."""
+        if isinstance(node, ast.Name):
+            return slots[node.id]
+        if isinstance(node, ast.Constant):
+            return ("const", float(node.value))
+        left = self._emit(node.left, target, slots, depth, steps)
+        # The right side can't share `target` with a left side still to be read
+        right_target = ("scratch", depth)
+        right = self._emit(node.right, right_target, slots, depth + 1, steps)
+        if right == right_target:
+            self.scratch_rows = max(self.scratch_rows, depth + 1)
+        if left[0] == "const" and right[0] == "const":
+            return ("const", _OPERATORS[type(node.op)](left[1], right[1]))
+        steps.append((_UFUNCS[type(node.op)], left, right, target))
+        return target
+
+    def _link(self, steps):
+        """Slots -> positions in the operand list __call__ builds per block (only the slots steps use)."""
+        self.operands = []   # ("in" | "out" | "scratch", j) or ("const", value)
+
+        def position(slot):
+            if slot is None:
+                return None
+            if slot not in self.operands:
+                self.operands.append(slot)
+            return self.operands.index(slot)
+
+        return [(ufunc, position(left), position(right), position(target)) for ufunc, left, right, target in steps]
+
+    def __call__(self, X, dtype=np.float64):
+        X = np.asarray(X, dtype=dtype)
+        n, width = X.shape[0], len(self.columns)
+        out = np.empty((n, width), dtype=dtype)
+        # One row per output column, then the scratch rows: every operand is contiguous
+        work = np.empty((width + self.scratch_rows, min(n, BLOCK_ROWS)), dtype=dtype)
+        for start in range(0, n, BLOCK_ROWS):
+            inputs = X[start:start + BLOCK_ROWS]
+            block = work[:, :len(inputs)]
+            for dst, src, count in self.copies:
+                block[dst:dst + count] = inputs[:, src:src + count].T
+            arrays = {"in": inputs.T, "out": block, "scratch": block[width:]}
+            operands = [j if kind == "const" else arrays[kind][j] for kind, j in self.operands]
+            for ufunc, left, right, target in self.steps:
+                if ufunc is None:
+                    operands[target][...] = operands[left]
+                else:
+                    ufunc(operands[left], operands[right], out=operands[target])
+            out[start:start + BLOCK_ROWS] = block[:width].T
+        return out
@@ -0,0 +1,192 @@
+"""
+Span timing and allocation tracking for the pages' hot paths.
+
+A page wraps its function in page_run and its stages in span:
+
+    with page_run("show_eda"):
+        ...
+        with span("correlations"):
+            ...
+
+Spans nest; each is recorded under its path ("show_eda/correlations") with
+its wall time and, in memory mode, the net bytes it allocated and its peak
+traced memory (tracemalloc). Per-path histograms are aggregated across runs
+and sessions and written after every page run to a Prometheus text file
+(app_span_seconds / app_span_peak_bytes), which a node_exporter textfile
+collector or any scraper can read. page_run also adds a sidebar expander
+with the stages of the current run.
+
+Off by default. Set APP_INSTRUMENT before starting the app:
+
+    APP_INSTRUMENT=time     wall time only (a few microseconds per span)
+    APP_INSTRUMENT=memory   wall time plus tracemalloc, which slows
+                            allocation-heavy code down noticeably
+
+When off, span and page_run return one shared no-op context manager, so an
+instrumented stage costs a function call. tracemalloc is process-wide:
+with several sessions running at once, allocations of one show up in the
+other's spans. The metrics file defaults to .cache/metrics/app.prom
+(APP_METRICS_PATH).
+"""
+import contextlib
+import os
+import threading
+import time
+import tracemalloc
+
+MODE = os.environ.get("APP_INSTRUMENT", "off").strip().lower()
+ENABLED = MODE in ("time", "memory")
+MEMORY = MODE == "memory"
+METRICS_PATH = os.environ.get("APP_METRICS_PATH", os.path.join(".cache", "metrics", "app.prom"))
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))   # 1 KB ... 1 GB
+
+_NOOP = contextlib.nullcontext()
+_lock = threading.Lock()
+_local = threading.local()   # per script thread: open spans and the current run's records
+_histograms = {}   # (metric, span path) -> Histogram
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _observe(metric, path, value, buckets):
+    with _lock:
+        histogram = _histograms.get((metric, path))
+        if histogram is None:
+            histogram = _histograms[(metric, path)] = Histogram(buckets)
+        histogram.observe(value)
+
+
+class _Span:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = "/".join([s.name for s in stack] + [self.name])
+        self.child_peak = 0
+        if MEMORY and tracemalloc.is_tracing():
+            # tracemalloc keeps one peak: remember the enclosing span's so far, then measure ours
+            self.start_bytes, self.outer_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        stack.append(self)
+        # Recorded at the start so the panel lists stages in the order they ran
+        self.record = {"stage": self.path}
+        records = getattr(_local, "records", None)
+        if records is not None:
+            records.append(self.record)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+        self.record["seconds"] = seconds
+        _observe("app_span_seconds", self.path, seconds, SECONDS_BUCKETS)
+        if MEMORY and hasattr(self, "start_bytes"):
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self.child_peak)
+            self.record.update(allocated=current - self.start_bytes, peak=peak - self.start_bytes)
+            _observe("app_span_peak_bytes", self.path, max(peak - self.start_bytes, 0), BYTES_BUCKETS)
+            # Our reset hid the enclosing span's peak so far: hand both peaks up to it
+            tracemalloc.reset_peak()
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak, self.outer_peak)
+        return False
+
+
+def span(name):
+    """Context manager timing the stage `name` (nested under any open span); a no-op when disabled."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name)
+
+
+@contextlib.contextmanager
+def _page_run(page):
+    if MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _local.records = []
+    try:
+        with _Span(page):
+            yield
+    finally:
+        records, _local.records = _local.records, None
+        write_metrics()
+        _render_panel(records)
+
+
+def page_run(page):
+    """Context manager around one run of a page: its root span, the sidebar panel and the metrics export."""
+    if not ENABLED:
+        return _NOOP
+    return _page_run(page)
+
+
+def _render_panel(records):
+    import pandas as pd
+    import streamlit as st
+
+    table = pd.DataFrame([r for r in records if "seconds" in r])
+    table = pd.DataFrame({
+        "Stage": table["stage"],
+        "Time (ms)": (table["seconds"] * 1e3).round(2),
+        **({"Allocated (KB)": (table["allocated"] / 1024).round(1),
+            "Peak (KB)": (table["peak"] / 1024).round(1)} if "peak" in table else {}),
+    })
+    with st.sidebar.expander("⏱️ Stage timings", expanded=False):
+        st.caption(f"This run, mode: {MODE}. Aggregates: {METRICS_PATH}")
+        st.dataframe(table, hide_index=True, use_container_width=True)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    """Every histogram in the Prometheus text exposition format."""
+    help_text = {"app_span_seconds": "Wall time of instrumented page stages in seconds.",
+                 "app_span_peak_bytes": "Peak traced memory of instrumented page stages in bytes."}
+    with _lock:
+        items = sorted(_histograms.items())
+        lines = []
+        for metric in sorted({metric for metric, _ in _histograms}):
+            lines += [f"# HELP {metric} {help_text[metric]}", f"# TYPE {metric} histogram"]
+            for (name, path), histogram in items:
+                if name != metric:
+                    continue
+                label = f'span="{_escape(path)}"'
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{metric}_bucket{{{label},le="{bound:.10g}"}} {count}')
+                lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum{{{label}}} {histogram.sum:.9g}")
+                lines.append(f"{metric}_count{{{label}}} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path=None):
+    path = path or METRICS_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
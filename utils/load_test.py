@@ -0,0 +1,92 @@
+"""
+Local load generator for utils.serve.
+
+Opens `--concurrency` keep-alive connections and sends single-row
+predictions sampled from evi.csv as fast as the server answers, then prints
+client-side throughput/latency and the server's own /metrics.
+
+    python -m utils.serve &
+    python -m utils.load_test --model catboost --requests 5000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from utils.data import load_dataset
+from utils.pipeline import RAW_FEATURES
+
+
+async def _request(reader, writer, method, path, body=b""):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        if key.lower() == "content-length":
+            length = int(value)
+    payload = await reader.readexactly(length)
+    if b" 200 " not in status:
+        raise RuntimeError(f"{status.decode().strip()}: {payload.decode()}")
+    return json.loads(payload)
+
+
+async def _client(host, port, path, bodies, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            start = time.perf_counter()
+            await _request(reader, writer, "POST", path, body)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run(host, port, model, n_requests, concurrency):
+    df = load_dataset()
+    rows = df[RAW_FEATURES].sample(n_requests, replace=True, random_state=0)
+    # JSON bodies are built up front so the clients only measure the server
+    records = rows.astype(object).where(rows.notna(), None).to_dict(orient="records")
+    bodies = [json.dumps(r).encode() for r in records]
+
+    latencies = []
+    path = f"/predict/{model}"
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, path, bodies[i::concurrency], latencies) for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000
+    print(f"{len(lat):,} requests in {elapsed:.2f}s -> {len(lat) / elapsed:,.0f} req/s")
+    print(f"client latency ms: p50={np.percentile(lat, 50):.2f} p95={np.percentile(lat, 95):.2f} "
+          f"p99={np.percentile(lat, 99):.2f}")
+
+    reader, writer = await asyncio.open_connection(host, port)
+    metrics = await _request(reader, writer, "GET", "/metrics")
+    writer.close()
+    print("server metrics:", json.dumps(metrics.get(model, metrics), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the prediction server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--model", default="catboost")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(run(args.host, args.port, args.model, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Cached HTML rendering of the project notebook.
+
+nbconvert output is stored in .cache/notebook/ under the notebook's content
+hash, so it runs once per notebook version instead of on every rerun and for
+every viewer. Editing the notebook changes the hash, which invalidates the
+cache. The notebook can also be rendered in pages of N cells, so the browser
+only gets the cells being viewed.
+
+The most recently served documents are also kept in memory, at most
+NOTEBOOK_CACHE_ENTRIES (env var, default 16) of them; older ones are read
+back from disk.
+
+Pre-render at deploy time (full document plus the default page size):
+    python -m utils.notebook_render
+"""
+import argparse
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from utils.data import file_hash
+
+NOTEBOOK_PATH = "Introverts_vs_Extroverts.ipynb"
+CACHE_DIR = os.path.join(".cache", "notebook")
+DEFAULT_CELLS_PER_PAGE = 10
+# Rendered documents kept in memory (a page of 10 cells is ~0.3-0.5 MB of HTML)
+MEMORY_ENTRIES = int(os.environ.get("NOTEBOOK_CACHE_ENTRIES", 16))
+
+_lock = threading.Lock()
+_memory = OrderedDict()   # cache file name -> HTML, LRU order
+
+
+def count_cells(path=NOTEBOOK_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return len(json.load(f)["cells"])
+
+
+def page_count(path=NOTEBOOK_PATH, cells_per_page=DEFAULT_CELLS_PER_PAGE):
+    return max(1, math.ceil(count_cells(path) / cells_per_page))
+
+
+def _export(path, cells=None):
+    # nbformat/nbconvert are only needed on a cache miss, so they are imported here
+    import nbformat
+    from nbconvert import HTMLExporter
+
+    # Load notebook
+    with open(path, "r", encoding="utf-8") as f:
+        notebook = nbformat.read(f, as_version=4)
+    if cells is not None:
+        notebook.cells = notebook.cells[cells]
+
+    # Convert notebook to HTML
+    html_exporter = HTMLExporter()
+    html_exporter.exclude_input_prompt = True
+    html_exporter.exclude_output_prompt = True
+
+    (body, _) = html_exporter.from_notebook_node(notebook)
+    return body
+
+
+def render_html(path=NOTEBOOK_PATH, page=None, cells_per_page=DEFAULT_CELLS_PER_PAGE):
+    """
+    HTML of the whole notebook, or of one page (0-based) of `cells_per_page` cells.
+
+    Served from memory or .cache/notebook/ when this notebook version was
+    rendered before.
+    """
+    suffix = "" if page is None else f"-p{page}x{cells_per_page}"
+    name = f"{file_hash(path)}{suffix}.html"
+    with _lock:
+        if name in _memory:
+            _memory.move_to_end(name)
+            return _memory[name]
+
+    # Read or rendered outside the lock, so other pages are served meanwhile; two
+    # sessions asking for the same new page may both render it, and the file
+    # write is atomic either way
+    cache_path = os.path.join(CACHE_DIR, name)
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            html = f.read()
+    else:
+        cells = None if page is None else slice(page * cells_per_page, (page + 1) * cells_per_page)
+        html = _export(path, cells)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(tmp_path, cache_path)
+
+    with _lock:
+        html = _memory.setdefault(name, html)
+        _memory.move_to_end(name)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+    return html
+
+
+def prerender(path=NOTEBOOK_PATH, cells_per_page=DEFAULT_CELLS_PER_PAGE):
+    render_html(path)
+    pages = page_count(path, cells_per_page)
+    for page in range(pages):
+        render_html(path, page, cells_per_page)
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render the notebook HTML cache.")
+    parser.add_argument("--notebook", default=NOTEBOOK_PATH)
+    parser.add_argument("--cells-per-page", type=int, default=DEFAULT_CELLS_PER_PAGE)
+    args = parser.parse_args()
+    pages = prerender(args.notebook, args.cells_per_page)
+    print(f"Rendered {args.notebook}: full document + {pages} pages of {args.cells_per_page} cells -> {CACHE_DIR}")
@@ -0,0 +1,367 @@
+"""
+Out-of-core training for datasets that don't fit in memory.
+
+The CSV is read in chunks and never held whole:
+
+    pass 1  per-column summaries (utils.stats_store: exact medians for the
+            survey's small integer answers, Yes/No counts) -> fill values
+    pass 2  each chunk is imputed and gets the derived features, then goes
+            to float32 files on disk (train and holdout rows separately),
+            while the scaler's mean/variance are merged chunk by chunk
+
+The result is the same PreprocessingPipeline the in-memory path saves. Models
+then read the feature cache in batches of `chunksize` rows:
+
+    logistic_regression  SGDClassifier(loss="log_loss") via partial_fit,
+                         a few shuffled epochs
+    xgboost              external-memory ExtMemQuantileDMatrix (pages cached
+                         on disk next to the features)
+    lightgbm             Dataset built from a Sequence over the feature file,
+                         saved as a binned .bin file and reused by later runs
+
+Peak memory is a few chunks plus the binned LightGBM dataset (one byte per
+value) instead of the full DataFrame. Holdout rows (`test_size`) are picked
+per chunk with a seeded RNG and scored at the end.
+
+The feature cache lives in .cache/out_of_core/<data hash>-<settings>/, so
+retraining on the same file skips both passes.
+
+    python -m utils.out_of_core pooled.csv --chunksize 200000 -o trained_models
+"""
+import argparse
+import json
+import os
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.data import CATEGORICAL_COLS, DTYPES, TARGET, file_hash
+from utils.pipeline import (LABELS, MODEL_FEATURES, MODELS_DIR, RAW_FEATURES, YES_NO, PreprocessingPipeline,
+                            encode_raw, save_pipeline)
+from utils.stats_store import DatasetStats
+
+CACHE_DIR = os.path.join(".cache", "out_of_core")
+LOG_NAME = "out_of_core_log.jsonl"
+OOC_MODELS = ["logistic_regression", "xgboost", "lightgbm"]
+N_FEATURES = len(MODEL_FEATURES)
+
+
+def iter_chunks(path, chunksize, test_size=0.2, seed=42):
+    """(chunk, holdout mask) pairs; the mask only depends on the chunk number and seed."""
+    columns = RAW_FEATURES + [TARGET]
+    reader = pd.read_csv(path, usecols=columns, chunksize=chunksize,
+                         dtype={col: DTYPES[col] for col in columns})
+    for chunk_no, chunk in enumerate(reader):
+        chunk = chunk[chunk[TARGET].notna()]
+        holdout = np.random.default_rng([seed, chunk_no]).random(len(chunk)) < test_size
+        yield chunk, holdout
+
+
+def fit_fill_values(chunks):
+    """Pass 1: imputation fill values in RAW_FEATURES order, from the training rows of `chunks`."""
+    stats = DatasetStats()
+    for chunk, holdout in chunks:
+        stats.update(chunk.loc[~holdout, RAW_FEATURES])
+    fill = stats.fill_values()
+    return np.array([YES_NO[fill[col]] if col in CATEGORICAL_COLS else fill[col] for col in RAW_FEATURES])
+
+
+class FeatureCache:
+    """Unscaled MODEL_FEATURES rows and labels in float32/int8 files, read back as memmaps."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    @property
+    def complete(self):
+        return os.path.exists(self.path("meta.json"))
+
+    def build(self, chunks, fill_values):
+        """Pass 2: write imputed + engineered rows; returns the fitted pipeline."""
+        pipeline = PreprocessingPipeline()
+        pipeline.fill_values_ = fill_values
+        n, mean, m2 = 0, np.zeros(N_FEATURES), np.zeros(N_FEATURES)
+        os.makedirs(self.directory, exist_ok=True)
+        files = {name: open(self.path(name), "wb") for name in ("X_train.f32", "y_train.i1", "X_test.f32", "y_test.i1")}
+        try:
+            for chunk, holdout in chunks:
+                features = pipeline.engineer(pipeline.impute(encode_raw(chunk)))
+                labels = chunk[TARGET].map({v: k for k, v in LABELS.items()}).to_numpy(dtype=np.int8)
+                train = features[~holdout]
+                # Chan et al.: merge this chunk's mean/M2 into the running ones
+                if len(train):
+                    batch_mean = train.mean(axis=0)
+                    batch_m2 = ((train - batch_mean) ** 2).sum(axis=0)
+                    delta = batch_mean - mean
+                    total = n + len(train)
+                    mean = mean + delta * len(train) / total
+                    m2 = m2 + batch_m2 + delta ** 2 * n * len(train) / total
+                    n = total
+                train.astype(np.float32).tofile(files["X_train.f32"])
+                labels[~holdout].tofile(files["y_train.i1"])
+                features[holdout].astype(np.float32).tofile(files["X_test.f32"])
+                labels[holdout].tofile(files["y_test.i1"])
+        finally:
+            for f in files.values():
+                f.close()
+
+        scale = np.sqrt(m2 / n)
+        scale[scale == 0] = 1.0
+        pipeline.mean_, pipeline.scale_ = mean, scale
+        with open(self.path("meta.json"), "w") as f:
+            json.dump({"fill_values": fill_values.tolist(), "mean": mean.tolist(), "scale": scale.tolist()}, f)
+        return pipeline
+
+    def pipeline(self):
+        with open(self.path("meta.json")) as f:
+            meta = json.load(f)
+        pipeline = PreprocessingPipeline()
+        pipeline.fill_values_ = np.array(meta["fill_values"])
+        pipeline.mean_, pipeline.scale_ = np.array(meta["mean"]), np.array(meta["scale"])
+        return pipeline
+
+    def arrays(self, split):
+        """(X, y) memmaps of the 'train' or 'test' rows."""
+        y = np.memmap(self.path(f"y_{split}.i1"), dtype=np.int8, mode="r")
+        if len(y) == 0:
+            return np.empty((0, N_FEATURES), dtype=np.float32), y
+        X = np.memmap(self.path(f"X_{split}.f32"), dtype=np.float32, mode="r", shape=(len(y), N_FEATURES))
+        return X, y
+
+
+def scaled(X, pipeline, dtype=np.float32):
+    """Scaled copy of unscaled feature rows (what pipeline.transform would give)."""
+    return ((X - pipeline.mean_) / pipeline.scale_).astype(dtype)
+
+
+def _batches(n, batch_rows):
+    for start in range(0, n, batch_rows):
+        yield start, min(start + batch_rows, n)
+
+
+def train_logistic_regression(X, y, pipeline, batch_rows, threads, epochs=5, seed=42):
+    from sklearn.linear_model import SGDClassifier
+
+    model = SGDClassifier(loss="log_loss", random_state=seed)
+    rng = np.random.default_rng(seed)
+    bounds = list(_batches(len(y), batch_rows))
+    for _ in range(epochs):
+        for i in rng.permutation(len(bounds)):
+            start, stop = bounds[i]
+            order = rng.permutation(stop - start)
+            model.partial_fit(scaled(X[start:stop], pipeline)[order], np.asarray(y[start:stop])[order],
+                              classes=[0, 1])
+    return model
+
+
+def train_xgboost(X, y, pipeline, batch_rows, threads, rounds=100, cache_prefix=None):
+    import xgboost as xgb
+
+    class BatchIter(xgb.DataIter):
+        def __init__(self):
+            self._bounds = list(_batches(len(y), batch_rows))
+            self._i = 0
+            super().__init__(cache_prefix=cache_prefix)
+
+        def next(self, input_data):
+            if self._i == len(self._bounds):
+                return False
+            start, stop = self._bounds[self._i]
+            input_data(data=scaled(X[start:stop], pipeline), label=np.asarray(y[start:stop]))
+            self._i += 1
+            return True
+
+        def reset(self):
+            self._i = 0
+
+    if hasattr(xgb, "ExtMemQuantileDMatrix"):
+        dtrain = xgb.ExtMemQuantileDMatrix(BatchIter(), nthread=threads)
+    else:
+        dtrain = xgb.DMatrix(BatchIter(), nthread=threads)
+    # XGBClassifier's defaults, as in the notebook
+    params = {"objective": "binary:logistic", "eval_metric": "logloss", "tree_method": "hist",
+              "seed": 42, "nthread": threads}
+    booster = xgb.train(params, dtrain, num_boost_round=rounds)
+    # Load into the sklearn wrapper so it serves and compiles like the other models
+    model = xgb.XGBClassifier()
+    model.load_model(bytearray(booster.save_raw(raw_format="json")))
+    return model
+
+
+class LGBMBoosterClassifier:
+    """
+    LGBMClassifier's prediction interface over a Booster trained with lgb.train.
+
+    predict and predict_proba take LGBMClassifier's keyword arguments
+    (raw_score, num_iteration, pred_leaf, pred_contrib, ...) and hand them to
+    Booster.predict, so SHAP values come from predict(X, pred_contrib=True)
+    as they do for the in-memory model.
+    """
+
+    def __init__(self, booster):
+        self.booster_ = booster
+        self.classes_ = np.array([0, 1])
+
+    @property
+    def n_classes_(self):
+        return len(self.classes_)
+
+    @property
+    def n_features_in_(self):
+        return self.booster_.num_feature()
+
+    def _predict(self, X, raw_score, num_iteration, pred_leaf, pred_contrib, kwargs):
+        return self.booster_.predict(X, raw_score=raw_score, num_iteration=num_iteration, pred_leaf=pred_leaf,
+                                     pred_contrib=pred_contrib, **kwargs)
+
+    def predict_proba(self, X, raw_score=False, num_iteration=None, pred_leaf=False, pred_contrib=False, **kwargs):
+        result = self._predict(X, raw_score, num_iteration, pred_leaf, pred_contrib, kwargs)
+        if raw_score or pred_leaf or pred_contrib:
+            return result
+        return np.column_stack([1 - result, result])
+
+    def predict(self, X, raw_score=False, num_iteration=None, pred_leaf=False, pred_contrib=False, **kwargs):
+        result = self._predict(X, raw_score, num_iteration, pred_leaf, pred_contrib, kwargs)
+        if raw_score or pred_leaf or pred_contrib:
+            return result
+        return self.classes_[(result >= 0.5).astype(np.int64)]
+
+    @property
+    def feature_importances_(self):
+        return self.booster_.feature_importance(importance_type="split")
+
+
+def train_lightgbm(X, y, pipeline, batch_rows, threads, rounds=100, binary_path=None):
+    import lightgbm as lgb
+
+    class ScaledSequence(lgb.Sequence):
+        batch_size = batch_rows
+
+        def __getitem__(self, idx):
+            # LightGBM samples bin boundaries from doubles only
+            return scaled(X[idx], pipeline, np.float64)
+
+        def __len__(self):
+            return len(y)
+
+    dataset_params = {"verbose": -1, "num_threads": threads}
+    if binary_path and os.path.exists(binary_path):
+        dtrain = lgb.Dataset(binary_path, params=dataset_params)
+    else:
+        dtrain = lgb.Dataset([ScaledSequence()], label=np.asarray(y, dtype=np.float32), params=dataset_params)
+        if binary_path:
+            dtrain.construct().save_binary(binary_path)
+    # LGBMClassifier's defaults, as in the notebook
+    params = {"objective": "binary", "seed": 42, **dataset_params}
+    return LGBMBoosterClassifier(lgb.train(params, dtrain, num_boost_round=rounds))
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _holdout_accuracy(model, X, y, pipeline, batch_rows):
+    if len(y) == 0:
+        return None
+    correct = 0
+    for start, stop in _batches(len(y), batch_rows):
+        p = model.predict_proba(scaled(X[start:stop], pipeline))[:, 1]
+        correct += int(((p >= 0.5) == np.asarray(y[start:stop])).sum())
+    return correct / len(y)
+
+
+def train_out_of_core(path, models=OOC_MODELS, chunksize=100_000, test_size=0.2, seed=42,
+                      models_dir=MODELS_DIR, threads=None):
+    """Stream `path` into the feature cache, train `models` from it and save them; returns the run record."""
+    import joblib
+    from threadpoolctl import threadpool_limits
+
+    from utils.compiled_trees import export_compiled
+    from utils.registry import write_manifest
+    from utils.shap_store import check_contributions
+
+    threads = threads or os.cpu_count() or 1
+    start = time.perf_counter()
+    cache = FeatureCache(os.path.join(CACHE_DIR, f"{file_hash(path)}-c{chunksize}-t{test_size}-s{seed}"))
+    if cache.complete:
+        pipeline = cache.pipeline()
+    else:
+        fill_values = fit_fill_values(iter_chunks(path, chunksize, test_size, seed))
+        pipeline = cache.build(iter_chunks(path, chunksize, test_size, seed), fill_values)
+    prepare_s = time.perf_counter() - start
+
+    X_train, y_train = cache.arrays("train")
+    X_test, y_test = cache.arrays("test")
+    os.makedirs(models_dir, exist_ok=True)
+    records = []
+    for name in models:
+        fit_start = time.perf_counter()
+        with threadpool_limits(limits=threads):
+            if name == "logistic_regression":
+                model = train_logistic_regression(X_train, y_train, pipeline, chunksize, threads, seed=seed)
+            elif name == "xgboost":
+                model = train_xgboost(X_train, y_train, pipeline, chunksize, threads,
+                                      cache_prefix=cache.path("xgb"))
+            elif name == "lightgbm":
+                model = train_lightgbm(X_train, y_train, pipeline, chunksize, threads,
+                                       binary_path=cache.path("lightgbm.bin"))
+            else:
+                raise KeyError(f"{name!r} has no out-of-core trainer; expected one of {OOC_MODELS}")
+        fit_s = time.perf_counter() - fit_start
+
+        model_path = os.path.join(models_dir, f"{name}_model.joblib")
+        joblib.dump(model, model_path)
+        save_pipeline(pipeline, model_path)
+        sample = scaled(X_train[:chunksize], pipeline)
+        if name != "logistic_regression":
+            # Check the compiled export on a slice; the full matrix is never loaded
+            export_compiled(model, model_path, sample)
+        # The SHAP store and the pages explain this pickle: make sure they can
+        check_contributions(name, model, sample)
+        records.append({
+            "model": name,
+            "threads": threads,
+            "fit_s": round(fit_s, 3),
+            "holdout_accuracy": _holdout_accuracy(model, X_test, y_test, pipeline, chunksize),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        })
+        print(f"{name:<22} {fit_s:7.2f}s  holdout accuracy {records[-1]['holdout_accuracy']}  "
+              f"peak {records[-1]['peak_rss_mb']:7.1f} MB")
+
+    write_manifest(os.path.join(models_dir, "manifest.json"), models_dir)
+    run = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data": path,
+        "train_rows": int(len(y_train)),
+        "test_rows": int(len(y_test)),
+        "chunksize": chunksize,
+        "prepare_s": round(prepare_s, 3),
+        "wall_s": round(time.perf_counter() - start, 3),
+        "models": records,
+    }
+    with open(os.path.join(models_dir, LOG_NAME), "a") as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train from a CSV too large to load, in chunks.")
+    parser.add_argument("input", help="CSV with the evi.csv columns")
+    parser.add_argument("-o", "--models-dir", default=MODELS_DIR)
+    parser.add_argument("--models", nargs="+", default=OOC_MODELS, choices=OOC_MODELS)
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Rows per chunk / training batch")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Share of rows held out for scoring")
+    parser.add_argument("--threads", type=int, default=None, help="Threads per model (default: all cores)")
+    args = parser.parse_args()
+    # Run the module's own copy: under -m this file is __main__, and models pickled from
+    # here would reference __main__.LGBMBoosterClassifier, which nothing else can load
+    from utils.out_of_core import train_out_of_core
+    run = train_out_of_core(args.input, args.models, args.chunksize, args.test_size,
+                            models_dir=args.models_dir, threads=args.threads)
+    print(f"Trained on {run['train_rows']:,} rows ({run['test_rows']:,} held out) in {run['wall_s']:.1f}s "
+          f"-> {args.models_dir}")
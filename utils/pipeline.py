@@ -0,0 +1,176 @@
+"""
+The fitted preprocessing used by every model in trained_models/.
+
+One PreprocessingPipeline covers the notebook's whole preparation:
+median/mode imputation, Yes/No encoding, the five derived features
+(declared in utils/features.py) and standard scaling. `transform` works on
+plain NumPy arrays, so the same object serves training, the Live Prediction
+page and batch scoring.
+
+Each model is saved with its own copy of the pipeline it was trained with:
+    trained_models/catboost_model.joblib
+    trained_models/catboost_pipeline.joblib
+
+Rebuild the pipelines of the shipped models (same split as the notebook):
+    python -m utils.pipeline
+"""
+import glob
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from utils.data import CATEGORICAL_COLS, NUMERIC_COLS, TARGET
+from utils.features import FEATURES, FeatureKernel
+
+MODELS_DIR = "trained_models"
+
+# Input columns, in the order `transform` expects them (same as evi.csv)
+RAW_FEATURES = ['Time_spent_Alone', 'Stage_fear', 'Social_event_attendance', 'Going_outside',
+                'Drained_after_socializing', 'Friends_circle_size', 'Post_frequency']
+DERIVED_FEATURES = [f.name for f in FEATURES]
+# The registry compiled over RAW_FEATURES; its output columns are the model
+# input, in the order the notebook's X has them
+FEATURE_KERNEL = FeatureKernel(FEATURES, RAW_FEATURES, passthrough=NUMERIC_COLS)
+MODEL_FEATURES = FEATURE_KERNEL.columns
+# The derived columns alone, for derive_frame
+_DERIVED_KERNEL = FeatureKernel(FEATURES, RAW_FEATURES)
+
+YES_NO = {'No': 0, 'Yes': 1}
+LABELS = {0: 'Introvert', 1: 'Extrovert'}
+
+
+def encode_raw(df, dtype=np.float64):
+    """DataFrame with the raw evi.csv columns -> float array in RAW_FEATURES order (NaN kept)."""
+    # Column-major, so each column is written (and later read by the feature kernel) contiguously
+    X = np.empty((len(df), len(RAW_FEATURES)), dtype=dtype, order="F")
+    for j, col in enumerate(RAW_FEATURES):
+        values = df[col]
+        if col in CATEGORICAL_COLS:
+            X[:, j] = values.map(YES_NO).to_numpy(dtype=dtype, na_value=np.nan)
+        else:
+            X[:, j] = values.to_numpy(dtype=dtype, na_value=np.nan)
+    return X
+
+
+def encode_records(records):
+    """List of dicts (JSON-style, Yes/No or 0/1 answers) -> float array in RAW_FEATURES order."""
+    X = np.full((len(records), len(RAW_FEATURES)), np.nan, dtype=np.float64)
+    for i, record in enumerate(records):
+        for j, col in enumerate(RAW_FEATURES):
+            value = record.get(col)
+            if value is None or value == "":
+                continue
+            X[i, j] = YES_NO[value] if isinstance(value, str) and col in CATEGORICAL_COLS else float(value)
+    return X
+
+
+def derive_frame(df):
+    """
+    Imputed DataFrame with the raw evi.csv columns -> the derived features,
+    each with its declared dtype.
+
+    The kernel runs in the widest declared dtype (float32), which is what
+    pandas does on the float32 columns of load_dataset.
+    """
+    dtype = np.result_type(*(f.dtype for f in FEATURES))
+    values = _DERIVED_KERNEL(encode_raw(df, dtype), dtype=dtype)
+    return pd.DataFrame({f.name: values[:, j].astype(f.dtype, copy=False) for j, f in enumerate(FEATURES)},
+                        index=df.index)
+
+
+def encode_target(df):
+    return df[TARGET].map({v: k for k, v in LABELS.items()}).to_numpy(dtype=np.int64)
+
+
+class PreprocessingPipeline:
+    """Imputation + encoding + derived features + StandardScaler, fitted once."""
+
+    VERSION = 1
+
+    def __init__(self):
+        self.version = self.VERSION   # stored in the pickle, checked by load_pipeline
+        self.fill_values_ = None   # per RAW_FEATURES column: median or (encoded) mode
+        self.mean_ = None          # per MODEL_FEATURES column
+        self.scale_ = None
+
+    def fit(self, df):
+        """Fit on a raw (un-imputed) training DataFrame."""
+        X = encode_raw(df)
+        fill = np.empty(X.shape[1])
+        for j, col in enumerate(RAW_FEATURES):
+            column = X[:, j][~np.isnan(X[:, j])]
+            if col in CATEGORICAL_COLS:
+                # Mode; ties go to the smaller code like pandas' mode()[0]
+                fill[j] = np.argmax(np.bincount(column.astype(np.int64), minlength=2))
+            else:
+                fill[j] = np.median(column)
+        self.fill_values_ = fill
+
+        features = self.engineer(self.impute(X))
+        self.mean_ = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0   # same guard as StandardScaler
+        self.scale_ = scale
+        return self
+
+    def impute(self, X):
+        X = np.array(X, dtype=np.float64)   # always a copy, the caller's array is untouched
+        rows, cols = np.nonzero(np.isnan(X))
+        X[rows, cols] = self.fill_values_[cols]
+        return X
+
+    @staticmethod
+    def engineer(X):
+        """Imputed RAW_FEATURES array -> unscaled MODEL_FEATURES array."""
+        return FEATURE_KERNEL(X)
+
+    def transform(self, X):
+        """Raw float array (n, 7) in RAW_FEATURES order -> scaled model input (n, 10)."""
+        out = self.engineer(self.impute(np.atleast_2d(X)))
+        out -= self.mean_
+        out /= self.scale_
+        return out
+
+    def transform_frame(self, df):
+        return self.transform(encode_raw(df))
+
+    def fit_transform(self, df):
+        return self.fit(df).transform_frame(df)
+
+
+def pipeline_path(model_path):
+    """trained_models/xgboost_model.joblib -> trained_models/xgboost_pipeline.joblib"""
+    root, ext = os.path.splitext(model_path)
+    if root.endswith("_model"):
+        root = root[:-len("_model")]
+    return f"{root}_pipeline{ext}"
+
+
+def save_pipeline(pipeline, model_path):
+    path = pipeline_path(model_path)
+    joblib.dump(pipeline, path)
+    return path
+
+
+def load_pipeline(model_path):
+    pipeline = joblib.load(pipeline_path(model_path))
+    if getattr(pipeline, "version", None) != PreprocessingPipeline.VERSION:
+        raise ValueError(f"{pipeline_path(model_path)} was saved by an incompatible pipeline version")
+    return pipeline
+
+
+if __name__ == "__main__":
+    from sklearn.model_selection import train_test_split
+
+    from utils.data import load_dataset
+    # Pickle the class under its importable name, not __main__
+    from utils.pipeline import PreprocessingPipeline, save_pipeline
+
+    df = load_dataset()
+    # Same split as the notebook, so the scaler matches the shipped models
+    train_df, _ = train_test_split(df, test_size=0.2, random_state=42)
+    pipeline = PreprocessingPipeline().fit(train_df)
+    for model_path in sorted(glob.glob(os.path.join(MODELS_DIR, "*_model.joblib"))):
+        print(f"Saved {save_pipeline(pipeline, model_path)}")
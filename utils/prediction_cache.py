@@ -0,0 +1,126 @@
+"""
+Prediction cache shared by every session of the app.
+
+The Live Prediction page's inputs are a handful of small integers and two
+Yes/No answers, and most visitors submit the same few profiles. Scores are
+kept per (model hash, raw input row), so a repeated submission is a dict
+lookup instead of a transform + predict_proba:
+
+    - the model hash is the manifest's sha256 of the artifact, so a
+      retrained model never sees the old model's scores (its pipeline is
+      saved alongside it by the same training run)
+    - the input row is the RAW_FEATURES vector with ints and floats alike
+      (5 and 5.0 are one key) and missing values as None
+    - at most `max_entries` rows are kept, the least recently used go first
+    - misses of one call are scored together in a single predict_proba
+
+warm_up scores the most common complete input rows of evi.csv up front.
+
+The size defaults to PREDICTION_CACHE_ENTRIES (env var) or 100,000 rows,
+~200 bytes each.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.data import DATA_PATH, load_dataset
+from utils.pipeline import encode_raw
+
+
+def canonical_rows(X):
+    """Hashable keys for the rows of a raw (n, len(RAW_FEATURES)) array."""
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    return [tuple(None if v != v else v for v in row) for row in X.tolist()]
+
+
+class PredictionCache:
+    """Thread-safe LRU of predict_proba rows keyed by model hash and input."""
+
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = int(os.environ.get("PREDICTION_CACHE_ENTRIES", 100_000))
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()   # (model hash, input row) -> probabilities, LRU order
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def predict_proba(self, registry, name, X):
+        """predict_proba of registry model `name` on raw rows X, scoring only the rows not cached."""
+        model_hash = registry.model_hash(name)
+        keys = [(model_hash, row) for row in canonical_rows(X)]
+        out = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                probs = self._rows.get(key)
+                if probs is not None:
+                    self._rows.move_to_end(key)
+                    out[i] = probs
+            hits = sum(probs is not None for probs in out)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        missing = [i for i, probs in enumerate(out) if probs is None]
+        if missing:
+            # Scored outside the lock: other sessions keep reading meanwhile
+            model, pipeline = registry.get(name)
+            X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+            scored = model.predict_proba(pipeline.transform(X[missing]))
+            with self._lock:
+                for i, probs in zip(missing, scored):
+                    probs.flags.writeable = False
+                    out[i] = probs
+                    self._rows[keys[i]] = probs
+                    self._rows.move_to_end(keys[i])
+                while len(self._rows) > self.max_entries:
+                    self._rows.popitem(last=False)
+                    self.evictions += 1
+        return np.vstack(out)
+
+    def warm_up(self, registry, names=None, top=1000, path=DATA_PATH):
+        """Score the `top` most common complete input rows of `path` with each model; returns rows scored."""
+        X = encode_raw(load_dataset(path))
+        X = X[~np.isnan(X).any(axis=1)]
+        rows, counts = np.unique(X, axis=0, return_counts=True)
+        common = rows[np.argsort(-counts, kind="stable")[:top]]
+        for name in names or registry.names:
+            self.predict_proba(registry, name, common)
+        return len(common)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._rows), "max_entries": self.max_entries, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": self.hits / lookups if lookups else None}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import timeit
+
+    from utils.registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Warm the prediction cache and time cached vs uncached calls.")
+    parser.add_argument("--top", type=int, default=1000, help="Most common evi.csv input rows to pre-score")
+    args = parser.parse_args()
+
+    registry, cache = ModelRegistry(), PredictionCache()
+    start = time.perf_counter()
+    rows = cache.warm_up(registry, top=args.top)
+    print(f"Warmed {rows} rows x {len(registry.names)} models in {time.perf_counter() - start:.2f}s")
+    row = np.array([[6, 0, 5, 5, 0, 10, 2]], dtype=np.float64)   # the page's default inputs
+    for name in registry.names:
+        model, pipeline = registry.get(name)
+        cold = min(timeit.repeat(lambda: model.predict_proba(pipeline.transform(row)), number=20, repeat=5)) / 20
+        warm = min(timeit.repeat(lambda: cache.predict_proba(registry, name, row), number=1000, repeat=5)) / 1000
+        print(f"{name:<22} predict_proba {cold * 1e3:7.3f} ms   cached {warm * 1e3:7.3f} ms")
+    print(cache.stats())
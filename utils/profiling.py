@@ -0,0 +1,318 @@
+"""
+One-pass profile of a CSV for the Data Inspection page.
+
+Instead of loading the whole frame and scanning it once per table (head,
+count, dtypes, describe, nunique, value_counts, isnull),
+profile_dataset reads the file block by block and updates everything in a
+single pass over each block's columns:
+
+    - utils.stats_store's mergeable column statistics: non-null and missing
+      counts, moments, min/max, quantiles, level counts
+    - whether each numeric column is whole numbers / exact in float32, which
+      with the ranges and level counts gives the compact dtypes load_dataset
+      would pick (utils.data.compact_numeric_dtype / compact_text_dtype)
+    - bytes per column as pandas parses it by default
+
+Quantiles are exact while a column has at most stats_store.MAX_EXACT_VALUES
+distinct values (every column here but `id`) and a close estimate beyond.
+
+Only one block of CHUNK_BYTES is parsed at a time, so memory stays bounded
+for multi-GB exports. With `sample` (a fraction), only that share of the
+blocks is read, picked at random (seeded): row counts and memory are then
+scaled up to the whole file, and the other numbers describe the sample.
+
+Profiles are cached in .cache/profile/ per dataset hash and options, so a
+rerun or another session just reads them back. The most recently used ones
+are also kept in memory, at most PROFILE_CACHE_ENTRIES (env var, default 8).
+When the cache directory can't be written, the profile is still returned,
+just not persisted.
+
+    python -m utils.profiling evi.csv
+    python -m utils.profiling big_export.csv --sample 0.02 --chunk-mb 64
+
+Duplicate rows are kept by utils.dedup's persistent row-hash index instead,
+which only has to hash the rows appended since its last run.
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.data import BLOCK_BYTES, DATA_PATH, compact_numeric_dtype, compact_text_dtype, file_hash
+from utils.stats_store import CategoricalStats, DatasetStats, NumericStats
+
+CACHE_DIR = os.path.join(".cache", "profile")
+# Bump when the stored layout changes so stale profiles are rebuilt
+PROFILE_VERSION = 2
+CHUNK_BYTES = BLOCK_BYTES
+HEAD_ROWS = 5
+QUANTILES = [0.25, 0.5, 0.75]
+# Profiles kept in memory; each dataset version or sampling option is a new one
+MEMORY_ENTRIES = int(os.environ.get("PROFILE_CACHE_ENTRIES", 8))
+
+_lock = threading.Lock()
+_memory = OrderedDict()   # cache name -> DatasetProfile, LRU order
+
+
+def _block_ranges(data_start, size, chunk_bytes):
+    return [(start, min(start + chunk_bytes, size)) for start in range(data_start, size, chunk_bytes)]
+
+
+def _read_block(f, start, end, data_start):
+    """The whole lines that start in [start, end) (a line belongs to the block it starts in)."""
+    if start > data_start:
+        f.seek(start - 1)
+        if f.read(1) != b"\n":
+            f.readline()   # the partial line belongs to the previous block
+    else:
+        f.seek(start)
+    begin = f.tell()
+    if begin >= end:
+        return b""
+    data = f.read(end - begin)
+    if not data.endswith(b"\n"):
+        data += f.readline()
+    return data
+
+
+class DatasetProfile:
+    """Everything the Data Inspection page shows, from one pass over the file."""
+
+    def __init__(self, header=None):
+        self.header = header or []
+        self.head_text = ""        # the first HEAD_ROWS data lines, as CSV text
+        self.stats = DatasetStats()
+        self.whole = {}            # numeric column -> every value is a whole number
+        self.fits_float32 = {}     # numeric column -> every value is exact in float32
+        self.default_dtypes = {}   # column -> dtype pandas infers
+        self.default_bytes = {}    # column -> bytes in pandas' default layout
+        self.rows_scanned = 0
+        self.bytes_scanned = 0
+        self.data_bytes = 0        # size of the file without the header line
+        self.sample = None
+
+    def update(self, df, nbytes):
+        """Fold one parsed block into the profile."""
+        self.stats.update(df)
+        for col in df.columns:
+            column = df[col]
+            if isinstance(self.stats.columns[col], NumericStats):
+                values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+                present = values[~np.isnan(values)]
+                with np.errstate(invalid="ignore"):
+                    self.whole[col] = self.whole.get(col, True) and bool(
+                        np.isfinite(present).all() and np.array_equal(present, np.round(present)))
+                self.fits_float32[col] = self.fits_float32.get(col, True) and (
+                    column.dtype != np.float64 or np.array_equal(present, present.astype(np.float32)))
+            dtype = str(column.dtype)
+            previous = self.default_dtypes.get(col)
+            if previous is not None and previous != dtype and pd.api.types.is_numeric_dtype(column):
+                dtype = str(np.result_type(previous, dtype))
+            self.default_dtypes[col] = dtype
+        for col, used in df.memory_usage(index=False, deep=True).items():
+            self.default_bytes[col] = self.default_bytes.get(col, 0) + int(used)
+        self.rows_scanned += len(df)
+        self.bytes_scanned += nbytes
+
+    # --- What the page shows ---
+
+    @property
+    def rows(self):
+        """Rows in the file (estimated from the bytes per row when sampled)."""
+        if self.sample is None or not self.bytes_scanned:
+            return self.rows_scanned
+        return int(round(self.rows_scanned * self.data_bytes / self.bytes_scanned))
+
+    @property
+    def scale(self):
+        return self.rows / self.rows_scanned if self.rows_scanned else 1.0
+
+    def head(self):
+        text = ",".join(self.header) + "\n" + self.head_text
+        df = pd.read_csv(io.StringIO(text))
+        dtypes = {}
+        for col, dtype in self.compact_dtypes().items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                # The levels of the whole file, not just the ones in the first rows
+                dtype = pd.CategoricalDtype(sorted(self.stats.columns[col].counts))
+            if dtype is not None:
+                dtypes[col] = dtype
+        return df.astype(dtypes)
+
+    def compact_dtypes(self):
+        """Column -> the dtype load_dataset gives it (None: pandas' default)."""
+        dtypes = {}
+        for col, s in self.stats.columns.items():
+            if isinstance(s, NumericStats):
+                low, high = (s.min, s.max) if s.count else (None, None)
+                dtypes[col] = compact_numeric_dtype(low, high, self.whole[col], s.missing > 0,
+                                                    self.fits_float32[col])
+            else:
+                dtypes[col] = compact_text_dtype(len(s.counts), self.rows_scanned)
+        return dtypes
+
+    def info(self):
+        """Column, non-null count and (compact) dtype, like df.info()."""
+        dtypes = self.compact_dtypes()
+        return pd.DataFrame({
+            'Column': self.header,
+            'Non-Null Count': [self.stats.columns[col].count for col in self.header],
+            'Dtype': [str(dtypes[col]) if dtypes[col] is not None else self.default_dtypes[col]
+                      for col in self.header],
+        })
+
+    def describe(self):
+        """df.describe() of the numeric columns."""
+        out = {}
+        for col in self.stats.numeric:
+            s = self.stats.columns[col]
+            out[col] = [s.count, s.mean if s.count else math.nan, s.std,
+                        s.min if s.count else math.nan] + \
+                       [s.sketch.quantile(q) for q in QUANTILES] + [s.max if s.count else math.nan]
+        return pd.DataFrame(out, index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"])
+
+    def nunique(self):
+        """Distinct values of each text column."""
+        return pd.Series({col: len(self.stats.columns[col].counts) for col in self.stats.categorical},
+                         dtype="int64")
+
+    def value_counts(self, col):
+        counts = self.stats.columns[col].counts
+        return pd.Series(counts, dtype="int64", name="count").rename_axis(col).sort_values(ascending=False,
+                                                                                        kind="stable")
+
+    def missing(self):
+        return pd.Series(self.stats.missing(), dtype="int64")[self.header]
+
+    def memory(self):
+        """Bytes per column for the whole file: pandas' default layout vs the compact one."""
+        rows = self.rows
+        dtypes = self.compact_dtypes()
+        table = []
+        for col in self.header:
+            default = int(round(self.default_bytes[col] * self.scale))
+            dtype = dtypes[col]
+            if dtype is None:
+                compact = default
+            elif isinstance(dtype, pd.CategoricalDtype):
+                levels = self.stats.columns[col].counts
+                codes = np.int8 if len(levels) < 127 else np.int16 if len(levels) < 32767 else np.int32
+                compact = rows * np.dtype(codes).itemsize + int(pd.Index(list(levels)).memory_usage(deep=True))
+            elif isinstance(dtype, pd.api.extensions.ExtensionDtype):
+                compact = rows * (dtype.numpy_dtype.itemsize + 1)   # values + mask
+            else:
+                compact = rows * dtype.itemsize
+            table.append({'Column': col, 'Default Dtype': self.default_dtypes[col], 'Default Bytes': default,
+                          'Compact Dtype': str(dtype) if dtype is not None else self.default_dtypes[col],
+                          'Compact Bytes': compact})
+        return pd.DataFrame(table)
+
+    # --- Storage ---
+
+    def to_dict(self):
+        return {"header": self.header, "head_text": self.head_text, "stats": self.stats.to_dict(),
+                "whole": self.whole, "fits_float32": self.fits_float32,
+                "default_dtypes": self.default_dtypes, "default_bytes": self.default_bytes,
+                "rows_scanned": self.rows_scanned,
+                "bytes_scanned": self.bytes_scanned, "data_bytes": self.data_bytes, "sample": self.sample}
+
+    @classmethod
+    def from_dict(cls, state):
+        profile = cls(state["header"])
+        profile.stats = DatasetStats.from_dict(state["stats"])
+        for name in ["head_text", "whole", "fits_float32", "default_dtypes", "default_bytes",
+                     "rows_scanned", "bytes_scanned", "data_bytes", "sample"]:
+            setattr(profile, name, state[name])
+        return profile
+
+
+def build_profile(path=DATA_PATH, sample=None, chunk_bytes=CHUNK_BYTES, seed=0):
+    """Profile `path` in one pass (uncached); `sample` reads only that fraction of the blocks."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        profile = DatasetProfile(pd.read_csv(io.BytesIO(header_line)).columns.tolist())
+        profile.head_text = b"".join(f.readline() for _ in range(HEAD_ROWS)).decode()
+        data_start = len(header_line)
+        profile.data_bytes = size - data_start
+        profile.sample = sample
+
+        blocks = _block_ranges(data_start, size, chunk_bytes)
+        if sample is not None and blocks:
+            rng = np.random.default_rng(seed)
+            k = min(len(blocks), max(1, math.ceil(sample * len(blocks))))
+            blocks = [blocks[i] for i in np.sort(rng.choice(len(blocks), k, replace=False))]
+
+        text_cols = []
+        for start, end in blocks:
+            data = _read_block(f, start, end, data_start)
+            if not data.strip():
+                continue
+            # Text columns stay text even in a block where they happen to be empty
+            df = pd.read_csv(io.BytesIO(data), names=profile.header, header=None,
+                             dtype={col: "str" for col in text_cols})
+            profile.update(df, len(data))
+            text_cols = [col for col, s in profile.stats.columns.items() if isinstance(s, CategoricalStats)]
+    return profile
+
+
+def profile_dataset(path=DATA_PATH, sample=None, chunk_bytes=CHUNK_BYTES, seed=0):
+    """DatasetProfile of `path`, cached per file content and options."""
+    options = ["full"] if sample is None else ["sample", sample, chunk_bytes, seed]
+    digest = hashlib.blake2b(json.dumps(options).encode(), digest_size=6).hexdigest()
+    name = f"{file_hash(path)}-{digest}.json"
+    with _lock:
+        if name in _memory:
+            _memory.move_to_end(name)
+            return _memory[name]
+        cache_path = os.path.join(CACHE_DIR, name)
+        profile = None
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                state = json.load(f)
+            if state.get("version") == PROFILE_VERSION:
+                profile = DatasetProfile.from_dict(state["profile"])
+        if profile is None:
+            profile = build_profile(path, sample, chunk_bytes, seed)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                with open(tmp_path, "w") as f:
+                    json.dump({"version": PROFILE_VERSION, "options": options, "profile": profile.to_dict()}, f)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                # Read-only or full disk: serve the profile without persisting it
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        _memory[name] = profile
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+        return profile
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="One-pass profile of a CSV file.")
+    parser.add_argument("path", nargs="?", default=DATA_PATH)
+    parser.add_argument("--sample", type=float, default=None, help="Fraction of the file to read")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / 2 ** 20, help="Block size in MB")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    profile = build_profile(args.path, args.sample, int(args.chunk_mb * 2 ** 20), args.seed)
+    print(f"{profile.rows:,} rows ({profile.rows_scanned:,} scanned), {len(profile.header)} columns "
+          f"in {time.perf_counter() - start:.2f}s")
+    print(profile.info().to_string(index=False))
+    print(profile.describe().round(3).to_string())
+    memory = profile.memory()
+    print(f"Memory: {memory['Default Bytes'].sum() / 2 ** 20:,.1f} MB default, "
+          f"{memory['Compact Bytes'].sum() / 2 ** 20:,.1f} MB compact")
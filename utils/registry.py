@@ -0,0 +1,187 @@
+"""
+Manifest-driven model registry.
+
+trained_models/manifest.json lists every servable model with its artifact
+path, format, feature schema, size and content hash. ModelRegistry reads the
+manifest only; a model is loaded the first time it is requested and kept
+under a memory budget, evicting the least recently used model when a new
+one doesn't fit.
+
+Rebuild the manifest after (re)training or compiling models:
+    python -m utils.registry
+
+The budget defaults to MODEL_MEMORY_BUDGET_MB (env var) or 512 MB; pass
+math.inf to never evict.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.compiled_trees import CompiledForest, compiled_path
+from utils.pipeline import MODEL_FEATURES, MODELS_DIR, load_pipeline, pipeline_path
+
+MANIFEST_PATH = os.path.join(MODELS_DIR, "manifest.json")
+
+DISPLAY_NAMES = {
+    "catboost": "CatBoost",
+    "logistic_regression": "Logistic Regression",
+    "lightgbm": "LightGBM",
+    "xgboost": "XGBoost",
+    "random_forest": "Random Forest",
+}
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def build_manifest(models_dir=MODELS_DIR):
+    """One entry per <name>_model.joblib; the compiled .npz is preferred when present."""
+    entries = []
+    for filename in sorted(os.listdir(models_dir)):
+        if not filename.endswith("_model.joblib"):
+            continue
+        name = filename[:-len("_model.joblib")]
+        model_path = os.path.join(models_dir, filename)
+        path, fmt = model_path, "joblib"
+        if os.path.exists(compiled_path(model_path)):
+            path, fmt = compiled_path(model_path), "compiled"
+        entries.append({
+            "name": name,
+            "display_name": DISPLAY_NAMES.get(name, name.replace("_", " ").title()),
+            "path": path.replace(os.sep, "/"),
+            "format": fmt,
+            "source": model_path.replace(os.sep, "/"),
+            "pipeline": pipeline_path(model_path).replace(os.sep, "/"),
+            "features": MODEL_FEATURES,
+            "size_bytes": os.path.getsize(path),
+            "sha256": _sha256(path),
+        })
+    return {"version": 1, "models": entries}
+
+
+def write_manifest(path=MANIFEST_PATH, models_dir=MODELS_DIR):
+    manifest = build_manifest(models_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_manifest(path=MANIFEST_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_artifact(entry):
+    """Load the model of one manifest entry."""
+    if not os.path.exists(entry["path"]):
+        raise FileNotFoundError(f"{entry['path']} listed in the manifest does not exist")
+    if os.path.getsize(entry["path"]) != entry["size_bytes"]:
+        raise ValueError(f"{entry['path']} changed since the manifest was built; run python -m utils.registry")
+    if entry["format"] == "compiled":
+        return CompiledForest.load(entry["path"])
+    if entry["format"] == "joblib":
+        import joblib
+        return joblib.load(entry["path"])
+    raise ValueError(f"unknown model format {entry['format']!r}")
+
+
+def _resident_bytes(model, entry):
+    if isinstance(model, CompiledForest):
+        return sum(a.nbytes for a in model.arrays.values())
+    # Unpickled library objects are roughly as large as their serialized form
+    return entry["size_bytes"]
+
+
+class ModelRegistry:
+    """Lazily loads manifest models, keeping them under `memory_budget_mb` (LRU)."""
+
+    def __init__(self, manifest_path=MANIFEST_PATH, memory_budget_mb=None):
+        manifest = read_manifest(manifest_path)
+        self.entries = {e["name"]: e for e in manifest["models"]}
+        if memory_budget_mb is None:
+            memory_budget_mb = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", 512))
+        # An unbounded budget stays a float: int(inf) raises OverflowError
+        self.budget_bytes = math.inf if math.isinf(memory_budget_mb) else int(memory_budget_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()   # name -> (model, pipeline, resident bytes), LRU order
+        self._stats = {name: {"loads": 0, "hits": 0, "evictions": 0, "load_time_s": None}
+                       for name in self.entries}
+
+    @property
+    def names(self):
+        return list(self.entries)
+
+    def display_name(self, name):
+        return self.entries[name]["display_name"]
+
+    def model_hash(self, name):
+        return self.entries[name]["sha256"]
+
+    def get(self, name):
+        """(model, pipeline) for `name`, loading it on first use."""
+        if name not in self.entries:
+            raise KeyError(f"unknown model {name!r}; manifest has {self.names}")
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                self._stats[name]["hits"] += 1
+                model, pipeline, _ = self._loaded[name]
+                return model, pipeline
+
+            entry = self.entries[name]
+            start = time.perf_counter()
+            model = load_artifact(entry)
+            pipeline = load_pipeline(entry["source"])
+            stats = self._stats[name]
+            stats["loads"] += 1
+            stats["load_time_s"] = time.perf_counter() - start
+
+            size = _resident_bytes(model, entry)
+            self._loaded[name] = (model, pipeline, size)
+            self._evict(keep=name)
+            return model, pipeline
+
+    def _evict(self, keep):
+        while self.resident_bytes > self.budget_bytes and len(self._loaded) > 1:
+            oldest = next(iter(self._loaded))
+            if oldest == keep:
+                break
+            del self._loaded[oldest]
+            self._stats[oldest]["evictions"] += 1
+
+    @property
+    def resident_bytes(self):
+        return sum(size for _, _, size in self._loaded.values())
+
+    def stats(self):
+        """Per-model load/residency stats, e.g. for a debug table."""
+        with self._lock:
+            return [
+                {
+                    "model": name,
+                    "format": self.entries[name]["format"],
+                    "loaded": name in self._loaded,
+                    "resident_mb": self._loaded[name][2] / 1e6 if name in self._loaded else 0.0,
+                    **self._stats[name],
+                }
+                for name in self.entries
+            ]
+
+
+if __name__ == "__main__":
+    manifest = write_manifest()
+    for entry in manifest["models"]:
+        print(f"{entry['name']:<22} {entry['format']:<9} {entry['size_bytes'] / 1e6:6.2f} MB  {entry['path']}")
+    print(f"Wrote {MANIFEST_PATH}")
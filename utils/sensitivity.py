@@ -0,0 +1,64 @@
+"""
+What-if grids around one input row for the Live Prediction page.
+
+grid_rows copies the user's raw input row once per grid point and overwrites
+the one or two varied columns, so the whole curve or surface is a single
+(points, len(RAW_FEATURES)) array. It is scored in one batch (one feature
+kernel pass, one transform and one predict_proba), not one call per point.
+
+Grid points are scored straight from the registry, not through the shared
+PredictionCache: they are rarely asked for twice, and hundreds of them per
+chart would evict the submitted rows the cache is for and skew its hit rate.
+
+    rows, xs, ys = grid_rows(raw_row, "Social_event_attendance", "Time_spent_Alone")
+    probs = score_grid(registry, name, rows)[:, 1].reshape(len(ys), len(xs))
+
+The default 31 x 25 surface (events 0-30 x hours alone 0-24) is 775 rows.
+"""
+import numpy as np
+
+from utils.pipeline import RAW_FEATURES
+
+# Range of each input on the Live Prediction page
+INPUT_RANGES = {
+    'Time_spent_Alone': (0, 24),
+    'Stage_fear': (0, 1),
+    'Social_event_attendance': (0, 30),
+    'Going_outside': (0, 14),
+    'Drained_after_socializing': (0, 1),
+    'Friends_circle_size': (0, 200),
+    'Post_frequency': (0, 50),
+}
+# Wider integer ranges are sampled at this many evenly spaced values
+MAX_STEPS = 51
+
+
+def grid_values(feature, steps=MAX_STEPS):
+    """The integer values `feature` takes on a grid axis: every one, or `steps` spread over the range."""
+    low, high = INPUT_RANGES[feature]
+    if high - low + 1 <= steps:
+        return np.arange(low, high + 1, dtype=np.float64)
+    return np.unique(np.round(np.linspace(low, high, steps)))
+
+
+def grid_rows(raw_row, x_feature, y_feature=None, steps=MAX_STEPS):
+    """
+    Raw rows for every grid point around `raw_row`, plus the x and y values.
+
+    Rows are y-major: reshape scores to (len(ys), len(xs)). Without a
+    y_feature, ys is empty and there is one row per x value.
+    """
+    base = np.asarray(raw_row, dtype=np.float64).reshape(-1)
+    xs = grid_values(x_feature, steps)
+    ys = grid_values(y_feature, steps) if y_feature else np.empty(0)
+    rows = np.tile(base, (len(xs) * max(len(ys), 1), 1))
+    rows[:, RAW_FEATURES.index(x_feature)] = np.tile(xs, max(len(ys), 1))
+    if y_feature:
+        rows[:, RAW_FEATURES.index(y_feature)] = np.repeat(ys, len(xs))
+    return rows, xs, ys
+
+
+def score_grid(registry, name, rows):
+    """predict_proba of registry model `name` on grid_rows output, in one batch."""
+    model, pipeline = registry.get(name)
+    return model.predict_proba(pipeline.transform(rows))
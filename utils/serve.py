@@ -0,0 +1,233 @@
+"""
+Standalone HTTP prediction server with request micro-batching.
+
+Concurrent requests for the same model are collected for up to `--window-ms`
+(or until `--max-batch` rows) and scored with a single predict_proba call,
+which is much cheaper than one call per row for the boosted models. The
+server is plain asyncio (no web framework needed).
+
+    python -m utils.serve --port 8600 --window-ms 5 --max-batch 128
+
+Endpoints:
+    GET  /health
+    GET  /models
+    GET  /metrics                 p50/p95 latency and batch-size histogram per model
+    POST /predict/<model>         one record or a list of records (raw evi.csv columns)
+
+    curl -d '{"Time_spent_Alone": 6, "Stage_fear": "Yes", "Social_event_attendance": 1}' \\
+         localhost:8600/predict/catboost
+
+Use utils.load_test to drive it with concurrent clients.
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.pipeline import LABELS, encode_records
+
+
+class LatencyStats:
+    """Rolling request latencies and a histogram of rows per batch."""
+
+    def __init__(self, window=10_000):
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = Counter()
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+
+    def record_batch(self, size):
+        self.batches += 1
+        self.rows += size
+        self.batch_sizes[size] += 1
+
+    def record_request(self, seconds):
+        self.requests += 1
+        self.latencies.append(seconds)
+
+    def summary(self):
+        lat = np.fromiter(self.latencies, dtype=np.float64) * 1000
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99]) if lat.size else (0.0, 0.0, 0.0)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "rows": self.rows,
+            # A request can carry many rows: the batching figure is rows per model call
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "latency_ms": {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3)},
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+        }
+
+
+class MicroBatcher:
+    """Queues single predictions and scores them in small batches."""
+
+    def __init__(self, model, pipeline, executor, window_ms=5.0, max_batch=128):
+        self.model = model
+        self.pipeline = pipeline
+        self.executor = executor
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.stats = LatencyStats()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def predict(self, X):
+        """Score the rows of X (raw float array); returns P(Extrovert) per row."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for row in X:
+            future = loop.create_future()
+            self.queue.put_nowait((row, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(items) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            X = np.stack([row for row, _ in items])
+            try:
+                # The model call runs off the event loop so new requests keep queueing
+                p = await loop.run_in_executor(self.executor, self._score, X)
+            except Exception as exc:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self.stats.record_batch(len(items))
+            for (_, future), value in zip(items, p):
+                if not future.done():
+                    future.set_result(float(value))
+
+    def _score(self, X):
+        return self.model.predict_proba(self.pipeline.transform(X))[:, 1]
+
+
+def load_models(names=None):
+    from utils.registry import ModelRegistry
+
+    # Every served model stays referenced by its batcher, so no budget here
+    registry = ModelRegistry(memory_budget_mb=math.inf)
+    return {name: registry.get(name) for name in (names or registry.names)}
+
+
+class PredictionServer:
+    def __init__(self, models, window_ms=5.0, max_batch=128):
+        # One scoring thread per model: batches of different models can run side by side
+        self.executor = ThreadPoolExecutor(max_workers=max(len(models), 1))
+        self.batchers = {
+            name: MicroBatcher(model, pipeline, self.executor, window_ms, max_batch)
+            for name, (model, pipeline) in models.items()
+        }
+
+    async def serve(self, host, port):
+        for batcher in self.batchers.values():
+            batcher.start()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"Serving {', '.join(self.batchers)} on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self._dispatch(method, target, body)
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        path = target.split("?", 1)[0].rstrip("/")
+        if method == "GET" and path == "/health":
+            return "200 OK", {"status": "ok"}
+        if method == "GET" and path == "/models":
+            return "200 OK", {"models": list(self.batchers)}
+        if method == "GET" and path == "/metrics":
+            return "200 OK", {name: b.stats.summary() for name, b in self.batchers.items()}
+        if method == "POST" and path.startswith("/predict/"):
+            batcher = self.batchers.get(path[len("/predict/"):])
+            if batcher is None:
+                return "404 Not Found", {"error": f"unknown model, available: {list(self.batchers)}"}
+            try:
+                records = json.loads(body or b"{}")
+                single = isinstance(records, dict)
+                records = [records] if single else records
+                if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+                    raise TypeError("expected a JSON object or a list of objects")
+                X = encode_records(records)
+            except (ValueError, KeyError, TypeError) as exc:
+                return "400 Bad Request", {"error": f"invalid input: {exc}"}
+
+            start = time.perf_counter()
+            p = await batcher.predict(X)
+            batcher.stats.record_request(time.perf_counter() - start)
+            results = [
+                {"Personality": LABELS[int(v >= 0.5)], "Confidence": max(v, 1 - v), "P_Extrovert": v}
+                for v in p
+            ]
+            return "200 OK", results[0] if single else results
+        return "404 Not Found", {"error": f"no route for {method} {path}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching prediction server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--models", nargs="*", help="Models to serve (default: every model in the manifest)")
+    parser.add_argument("--window-ms", type=float, default=5.0, help="How long a batch waits to fill up")
+    parser.add_argument("--max-batch", type=int, default=128, help="Largest batch sent to predict_proba")
+    args = parser.parse_args()
+
+    server = PredictionServer(load_models(args.models), args.window_ms, args.max_batch)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
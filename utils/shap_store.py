@@ -0,0 +1,317 @@
+"""
+Precomputed SHAP contributions of every dataset row, per model.
+
+Contributions come from each library's own exact tree SHAP:
+
+    catboost             get_feature_importance(type="ShapValues")
+    lightgbm             predict(pred_contrib=True)
+    xgboost              Booster.predict(pred_contribs=True)
+    logistic_regression  coef * x (the scaled inputs have mean 0, so this is
+                         the exact linear SHAP value)
+
+Each row holds one value per MODEL_FEATURES column plus the expected value
+(last column), in log-odds of Extrovert: they add up to the model's logit.
+The compiled models can't explain themselves, so the original pickle is used.
+
+The store for one model is a float32 .npy in
+.cache/shap/<data hash>/<model hash>.npy, one row per load_dataset() row,
+opened memory-mapped: global importance (mean |SHAP|) and a dataset row's
+explanation are read from it without loading the whole array. Identical
+model inputs are only explained once while it is built.
+
+New inputs (the Live Prediction page) go to BackgroundExplainer: requests
+are queued, a worker thread explains whatever has accumulated in one batch,
+and results are kept per (model hash, input row). A page can prefetch as
+soon as the inputs are set and read the result when it is shown. The worker
+is stopped at interpreter exit: a daemon thread still holding CatBoost
+objects while the interpreter tears down can crash it.
+
+Precompute after retraining (the pages also build missing stores on demand):
+    python -m utils.shap_store
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+from utils.data import DATA_PATH, file_hash, load_dataset
+from utils.pipeline import MODEL_FEATURES, encode_raw, load_pipeline
+from utils.prediction_cache import canonical_rows
+from utils.registry import MANIFEST_PATH, read_manifest
+
+CACHE_DIR = os.path.join(".cache", "shap")
+BLOCK_ROWS = 4096        # rows explained per library call while building a store
+MAX_BATCH = 256          # rows per background batch
+BATCH_WINDOW_S = 0.005   # how long the worker waits for more requests to join a batch
+SUPPORTED = ("catboost", "lightgbm", "xgboost", "logistic_regression")
+
+_lock = threading.Lock()   # guards the dicts below only; stores are built outside it
+_memory = {}   # store path -> memory-mapped array
+_build_locks = {}   # store path -> lock held while that store is built
+_row_index = {}   # data hash -> {raw input row: first dataset row}
+
+
+def load_source_model(entry):
+    """The library model behind a manifest entry (compiled ones don't carry SHAP support)."""
+    import joblib
+    return joblib.load(entry["source"])
+
+
+def contributions(name, model, X):
+    """(n, len(MODEL_FEATURES) + 1) float32 SHAP values of scaled model inputs X; the last column is the bias."""
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    if name == "catboost":
+        from catboost import Pool
+        values = model.get_feature_importance(Pool(X), type="ShapValues")
+    elif name == "lightgbm":
+        values = model.predict(X, pred_contrib=True)
+    elif name == "xgboost":
+        import xgboost as xgb
+        values = model.get_booster().predict(xgb.DMatrix(X), pred_contribs=True)
+    elif name == "logistic_regression":
+        values = np.empty((len(X), X.shape[1] + 1))
+        np.multiply(X, model.coef_[0], out=values[:, :-1])
+        values[:, -1] = model.intercept_[0]
+    else:
+        raise ValueError(f"no SHAP explainer for {name!r}; supported: {', '.join(SUPPORTED)}")
+    return np.asarray(values, dtype=np.float32)
+
+
+def check_contributions(name, model, X, tolerance=1e-4):
+    """
+    Explain scaled inputs X with `model` and check that each row's SHAP
+    values add up to its predicted log-odds. Raises ValueError when a row is
+    off by more than `tolerance` in probability; returns the max |dp|.
+    """
+    values = contributions(name, model, X).astype(np.float64)
+    p = 1.0 / (1.0 + np.exp(-values.sum(axis=1)))
+    diff = float(np.abs(p - model.predict_proba(X)[:, 1]).max()) if len(X) else 0.0
+    if diff > tolerance:
+        raise ValueError(f"{name}: SHAP values don't add up to the prediction (max |dp| = {diff:.2e})")
+    return diff
+
+
+def _entry(name, manifest_path):
+    entries = {e["name"]: e for e in read_manifest(manifest_path)["models"]}
+    if name not in entries:
+        raise KeyError(f"unknown model {name!r}; manifest has {list(entries)}")
+    return entries[name]
+
+
+def _build(entry, path, store_path):
+    model, pipeline = load_source_model(entry), load_pipeline(entry["source"])
+    X = pipeline.transform(encode_raw(load_dataset(path)))
+    unique, inverse = np.unique(X, axis=0, return_inverse=True)
+    values = np.empty((len(unique), len(MODEL_FEATURES) + 1), dtype=np.float32)
+    for start in range(0, len(unique), BLOCK_ROWS):
+        values[start:start + BLOCK_ROWS] = contributions(entry["name"], model, unique[start:start + BLOCK_ROWS])
+
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(X), values.shape[1]))
+    out[:] = values[inverse.reshape(-1)]
+    out.flush()
+    del out
+    os.replace(tmp_path, store_path)
+
+
+def _store_path(entry, path):
+    return os.path.join(CACHE_DIR, file_hash(path), f"{entry['sha256']}.npy")
+
+
+def shap_values(name, path=DATA_PATH, manifest_path=MANIFEST_PATH):
+    """
+    Read-only memory-mapped (rows, features + 1) SHAP array of model `name` over load_dataset(path).
+
+    A missing store is built first. Only callers of the same store wait for
+    that; the other stores and functions stay available.
+    """
+    entry = _entry(name, manifest_path)
+    store_path = _store_path(entry, path)
+    with _lock:
+        if store_path in _memory:
+            return _memory[store_path]
+        build_lock = _build_locks.setdefault(store_path, threading.Lock())
+    with build_lock:
+        if not os.path.exists(store_path):
+            _build(entry, path, store_path)
+    with _lock:
+        if store_path not in _memory:
+            _memory[store_path] = np.load(store_path, mmap_mode="r")
+        return _memory[store_path]
+
+
+def built_store(entry, path=DATA_PATH):
+    """The memory-mapped store of a manifest entry if it has been built, else None (nothing is computed)."""
+    store_path = _store_path(entry, path)
+    with _lock:
+        if store_path not in _memory and os.path.exists(store_path):
+            _memory[store_path] = np.load(store_path, mmap_mode="r")
+        return _memory.get(store_path)
+
+
+def dataset_rows(path=DATA_PATH):
+    """{raw input row (as in prediction_cache.canonical_rows): first load_dataset row with it}."""
+    data_hash = file_hash(path)
+    with _lock:
+        if data_hash in _row_index:
+            return _row_index[data_hash]
+    # Built outside the lock; if two sessions race, both build the same index
+    keys = canonical_rows(encode_raw(load_dataset(path)))
+    index = {key: row for row, key in reversed(list(enumerate(keys)))}
+    with _lock:
+        return _row_index.setdefault(data_hash, index)
+
+
+def global_importance(name, path=DATA_PATH, manifest_path=MANIFEST_PATH):
+    """{feature: share of the mean |SHAP value| in %} over the dataset."""
+    values = shap_values(name, path, manifest_path)
+    mean_abs = np.zeros(len(MODEL_FEATURES))
+    for start in range(0, len(values), BLOCK_ROWS):
+        mean_abs += np.abs(values[start:start + BLOCK_ROWS, :-1], dtype=np.float64).sum(axis=0)
+    return dict(zip(MODEL_FEATURES, (100 * mean_abs / mean_abs.sum()).tolist()))
+
+
+def explain_row(name, row, path=DATA_PATH, manifest_path=MANIFEST_PATH):
+    """({feature: SHAP value}, expected value) of dataset row `row` (load_dataset order)."""
+    values = np.asarray(shap_values(name, path, manifest_path)[row], dtype=np.float64)
+    return dict(zip(MODEL_FEATURES, values[:-1].tolist())), float(values[-1])
+
+
+class BackgroundExplainer:
+    """
+    Explains new raw input rows on a worker thread, batching requests that
+    arrive together and keeping the last `max_entries` results.
+    """
+
+    def __init__(self, manifest_path=MANIFEST_PATH, path=DATA_PATH, max_entries=10_000, max_batch=MAX_BATCH,
+                 window_s=BATCH_WINDOW_S):
+        self.path = path
+        self.entries = {e["name"]: e for e in read_manifest(manifest_path)["models"]}
+        self.max_entries = max_entries
+        self.max_batch = max_batch
+        self.window_s = window_s
+        self._lock = threading.Lock()
+        self._results = OrderedDict()   # (model hash, input row) -> SHAP row, LRU order
+        self._pending = {}              # (model hash, input row) -> Future
+        self._models = {}               # name -> (model, pipeline)
+        self._queue = queue.Queue()
+        self.batches = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="shap-explainer", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def submit(self, name, X):
+        """
+        Futures of the SHAP rows (as in contributions) for raw input rows X.
+        Rows found in the dataset store or among recent results resolve at once.
+        """
+        if name not in SUPPORTED:
+            raise ValueError(f"no SHAP explainer for {name!r}; supported: {', '.join(SUPPORTED)}")
+        entry = self.entries[name]
+        store = built_store(entry, self.path)
+        known = dataset_rows(self.path) if store is not None else {}
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        futures = []
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BackgroundExplainer is closed")
+            for row, raw_key in zip(X, canonical_rows(X)):
+                key = (entry["sha256"], raw_key)
+                if raw_key in known:
+                    future = Future()
+                    future.set_result(np.asarray(store[known[raw_key]]))
+                elif key in self._results:
+                    self._results.move_to_end(key)
+                    future = Future()
+                    future.set_result(self._results[key])
+                elif key in self._pending:
+                    future = self._pending[key]
+                else:
+                    future = self._pending[key] = Future()
+                    self._queue.put((name, key, row))
+                futures.append(future)
+        return futures
+
+    def prefetch(self, name, X):
+        """Start explaining X without waiting."""
+        self.submit(name, X)
+
+    def explain(self, name, X, timeout=None):
+        """(n, features + 1) SHAP array for raw input rows X, waiting for the worker if needed."""
+        return np.vstack([future.result(timeout) for future in self.submit(name, X)])
+
+    def close(self, timeout=10):
+        """Stop the worker once the requests already queued are explained."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join(timeout)
+        self._models.clear()
+
+    def _model(self, name):
+        if name not in self._models:
+            entry = self.entries[name]
+            self._models[name] = (load_source_model(entry), load_pipeline(entry["source"]))
+        return self._models[name]
+
+    def _collect(self):
+        """Block for one request, then take whatever else arrives within the window (up to max_batch)."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = None in batch   # close() was called
+            by_model = {}
+            for name, key, row in (item for item in batch if item is not None):
+                by_model.setdefault(name, []).append((key, row))
+            for name, requests in by_model.items():
+                keys = [key for key, _ in requests]
+                try:
+                    model, pipeline = self._model(name)
+                    values = contributions(name, model, pipeline.transform(np.vstack([r for _, r in requests])))
+                except Exception as e:   # hand the error to every waiting caller
+                    with self._lock:
+                        for key in keys:
+                            self._pending.pop(key).set_exception(e)
+                    continue
+                with self._lock:
+                    self.batches += 1
+                    for key, row_values in zip(keys, values):
+                        row_values.flags.writeable = False
+                        self._results[key] = row_values
+                        self._pending.pop(key).set_result(row_values)
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+            if stop:
+                return
+
+
+if __name__ == "__main__":
+    for entry in read_manifest()["models"]:
+        if entry["name"] not in SUPPORTED:
+            continue
+        start = time.perf_counter()
+        values = shap_values(entry["name"])
+        top = sorted(global_importance(entry["name"]).items(), key=lambda item: -item[1])[:3]
+        print(f"{entry['display_name']:<22} {values.shape[0]:,} rows in {time.perf_counter() - start:6.2f}s   "
+              + ", ".join(f"{feature} {share:.1f}%" for feature, share in top))
@@ -0,0 +1,414 @@
+"""
+Incrementally maintained column statistics of the dataset.
+
+Every column keeps mergeable summaries instead of its values:
+
+    numeric      Welford/Chan moments (count, mean, M2, min, max) and a
+                 quantile sketch: exact value counts while the column has at
+                 most MAX_EXACT_VALUES distinct values (the survey answers
+                 have a dozen), a KLL sketch after that
+    categorical  a count per level
+    both         the number of missing values
+
+These give the pages' median/mode fill values and summary numbers without
+another pass over the rows. The store is saved in .cache/stats/ along with
+the byte offset it has read up to and fingerprints of the file. When rows
+are appended to the CSV, only the new bytes are parsed and merged in. Any
+other edit to the file (a changed head or tail block, a shrunk file or a
+same-size rewrite) triggers a full rebuild.
+
+    stats = load_stats()
+    stats.fill_values()           # {column: median or mode}
+    stats.summary()               # rows for a per-column table
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.data import DATA_PATH, file_fingerprint, read_blocks
+
+CACHE_DIR = os.path.join(".cache", "stats")
+# Bump when the stored layout or the sketches change so stale files are rebuilt
+STORE_VERSION = 2
+MAX_EXACT_VALUES = 4096
+KLL_K = 200
+
+_lock = threading.Lock()
+_memory = {}   # (path, size, mtime) -> DatasetStats
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty, 2016).
+
+    Level h holds items of weight 2**h. A level over its capacity is sorted
+    and every other item, starting at a random one of the first two, is
+    promoted to the next level. Two sketches merge by concatenating their
+    levels. The worst rank error over the 1st-99th percentiles measured on
+    1M values (streamed or merged, in batches of 1k-50k) is about 2.4 / k,
+    ~1.2% at k=200; the typical error is about half that.
+    """
+
+    def __init__(self, k=KLL_K, levels=None, n=0):
+        self.k = k
+        self.levels = [np.asarray(level, dtype=np.float64) for level in levels] if levels else [np.empty(0)]
+        self.n = n
+
+    def _capacity(self, h):
+        return max(2, math.ceil(self.k * (2 / 3) ** (len(self.levels) - h - 1)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                # An odd item out stays. The promoted half starts at a random position: a fixed or
+                # alternating one lines up with batch sizes and biases the ranks (~3% at k=200).
+                # Seeded by (n, h) so the same input gives the same sketch.
+                keep, level = level[:len(level) % 2], level[len(level) % 2:]
+                offset = np.random.default_rng([self.n, h]).integers(2)
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], level[offset::2]])
+            h += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+
+    def add_weighted(self, value, count):
+        """Add `count` copies of `value` without materializing them (one item per set bit)."""
+        self.n += count
+        h = 0
+        while count:
+            if count & 1:
+                while h >= len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[h] = np.append(self.levels[h], value)
+            count >>= 1
+            h += 1
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.n += other.n
+        self._compress()
+
+    def quantile(self, q):
+        items = np.concatenate(self.levels)
+        if items.size == 0:
+            return float("nan")
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        return float(items[order][np.searchsorted(cumulative, q * cumulative[-1])])
+
+    def to_dict(self):
+        return {"k": self.k, "n": self.n, "levels": [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["k"], state["levels"], state["n"])
+
+
+class QuantileSketch:
+    """Exact {value: count} table, switching to a KLLSketch past MAX_EXACT_VALUES distinct values."""
+
+    def __init__(self, counts=None, kll=None):
+        self.kll = kll
+        self.counts = None if kll is not None else (counts or {})
+
+    @property
+    def exact(self):
+        return self.kll is None
+
+    def _switch_to_kll(self):
+        self.kll = KLLSketch()
+        for value, count in self.counts.items():
+            self.kll.add_weighted(value, count)
+        self.counts = None
+
+    def _add_counts(self, counts):
+        for value, count in counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        if len(self.counts) > MAX_EXACT_VALUES:
+            self._switch_to_kll()
+
+    def update(self, values):
+        """Add finite values (NaN already removed)."""
+        if self.exact:
+            values, counts = np.unique(values, return_counts=True)
+            self._add_counts(dict(zip(values.tolist(), counts.tolist())))
+        else:
+            self.kll.update(values)
+
+    def merge(self, other):
+        if self.exact and other.exact:
+            self._add_counts(other.counts)
+            return
+        if self.exact:
+            self._switch_to_kll()
+        if other.exact:
+            other = QuantileSketch(counts=dict(other.counts))
+            other._switch_to_kll()
+        self.kll.merge(other.kll)
+
+    def quantile(self, q):
+        """Linear-interpolated quantile like np.quantile (exact) or the KLL estimate."""
+        if not self.exact:
+            return self.kll.quantile(q)
+        if not self.counts:
+            return float("nan")
+        values = np.array(sorted(self.counts))
+        cumulative = np.cumsum([self.counts[v] for v in values])
+        rank = q * (cumulative[-1] - 1)
+        lo = values[np.searchsorted(cumulative, math.floor(rank) + 1)]
+        hi = values[np.searchsorted(cumulative, math.ceil(rank) + 1)]
+        return float(lo + (hi - lo) * (rank - math.floor(rank)))
+
+    def to_dict(self):
+        if self.exact:
+            return {"counts": [[v, c] for v, c in self.counts.items()]}
+        return {"kll": self.kll.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        if "kll" in state:
+            return cls(kll=KLLSketch.from_dict(state["kll"]))
+        return cls(counts={v: c for v, c in state["counts"]})
+
+
+class NumericStats:
+    """Missing count, Welford/Chan moments and a quantile sketch of one numeric column."""
+
+    def __init__(self):
+        self.missing = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def _merge_moments(self, count, mean, m2, low, high):
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.min, self.max = min(self.min, low), max(self.max, high)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        present = values[~np.isnan(values)]
+        self.missing += len(values) - len(present)
+        if len(present):
+            mean = float(present.mean())
+            self._merge_moments(len(present), mean, float(((present - mean) ** 2).sum()),
+                                float(present.min()), float(present.max()))
+            self.sketch.update(present)
+
+    def merge(self, other):
+        self.missing += other.missing
+        self._merge_moments(other.count, other.mean, other.m2, other.min, other.max)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def median(self):
+        return self.sketch.quantile(0.5)
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1, like pandas)."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float("nan")
+
+    def to_dict(self):
+        return {"missing": self.missing, "count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": self.min if self.count else None, "max": self.max if self.count else None,
+                "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.missing, stats.count, stats.mean, stats.m2 = state["missing"], state["count"], state["mean"], state["m2"]
+        if state["count"]:
+            stats.min, stats.max = state["min"], state["max"]
+        stats.sketch = QuantileSketch.from_dict(state["sketch"])
+        return stats
+
+
+class CategoricalStats:
+    """Missing count and per-level counts of one categorical column."""
+
+    def __init__(self):
+        self.missing = 0
+        self.counts = {}
+
+    def update(self, values):
+        counts = pd.Series(values).astype(object).value_counts(dropna=False)
+        for level, count in counts.items():
+            if pd.isna(level):
+                self.missing += int(count)
+            else:
+                self.counts[str(level)] = self.counts.get(str(level), 0) + int(count)
+
+    def merge(self, other):
+        self.missing += other.missing
+        for level, count in other.counts.items():
+            self.counts[level] = self.counts.get(level, 0) + count
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    @property
+    def mode(self):
+        """Most frequent level; ties go to the first in sort order, like pandas' mode()[0]."""
+        return max(sorted(self.counts), key=self.counts.get) if self.counts else None
+
+    def to_dict(self):
+        return {"missing": self.missing, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.missing, stats.counts = state["missing"], dict(state["counts"])
+        return stats
+
+
+class DatasetStats:
+    """Per-column NumericStats / CategoricalStats, updated chunk by chunk."""
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = {}
+
+    def update(self, df):
+        for col in df.columns:
+            if col not in self.columns:
+                numeric = pd.api.types.is_numeric_dtype(df[col])
+                self.columns[col] = NumericStats() if numeric else CategoricalStats()
+            self.columns[col].update(df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                                     if isinstance(self.columns[col], NumericStats) else df[col])
+        self.rows += len(df)
+        return self
+
+    def merge(self, other):
+        for col, stats in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(stats)
+            else:
+                self.columns[col] = stats
+        self.rows += other.rows
+        return self
+
+    @property
+    def numeric(self):
+        return [col for col, s in self.columns.items() if isinstance(s, NumericStats)]
+
+    @property
+    def categorical(self):
+        return [col for col, s in self.columns.items() if isinstance(s, CategoricalStats)]
+
+    def missing(self):
+        return {col: s.missing for col, s in self.columns.items()}
+
+    def fill_values(self):
+        """Median of each numeric column and mode of each categorical one (the pages' imputation)."""
+        return {col: s.median if isinstance(s, NumericStats) else s.mode for col, s in self.columns.items()}
+
+    def mean_after_fill(self, col):
+        """Column mean once its missing values are median-filled."""
+        s = self.columns[col]
+        total = s.count + s.missing
+        return (s.mean * s.count + s.median * s.missing) / total if total else float("nan")
+
+    def summary(self):
+        """One row per column: count, missing, fill value and (numeric) moments."""
+        rows = []
+        for col, s in self.columns.items():
+            row = {"Feature": col, "Count": s.count, "Missing": s.missing}
+            if isinstance(s, NumericStats):
+                row.update({"Mean": s.mean, "Std": s.std, "Min": s.min, "Median": s.median, "Max": s.max,
+                            "Fill Value": s.median})
+            else:
+                row.update({"Levels": len(s.counts), "Fill Value": s.mode})
+            rows.append(row)
+        return rows
+
+    def to_dict(self):
+        return {"rows": self.rows,
+                "columns": {col: {"kind": "numeric" if isinstance(s, NumericStats) else "categorical",
+                                  **s.to_dict()} for col, s in self.columns.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.rows = state["rows"]
+        for col, column in state["columns"].items():
+            kind = NumericStats if column["kind"] == "numeric" else CategoricalStats
+            stats.columns[col] = kind.from_dict(column)
+        return stats
+
+
+def load_stats(path=DATA_PATH):
+    """
+    DatasetStats of `path`, read from .cache/stats/ and brought up to date.
+
+    Rows appended since the last call are parsed and merged; an edited file
+    is rescanned from the start.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        if key in _memory:
+            return _memory[key]
+
+        name = hashlib.blake2b(os.path.abspath(path).encode(), digest_size=8).hexdigest()
+        store_path = os.path.join(CACHE_DIR, f"{name}.json")
+        state = None
+        if os.path.exists(store_path):
+            with open(store_path) as f:
+                state = json.load(f)
+            offset = state.get("offset", 0)
+            # Same size but touched means rewritten in place, not appended to
+            rewritten = stat.st_size == offset and stat.st_mtime_ns != state.get("mtime_ns")
+            if (state.get("version") != STORE_VERSION or stat.st_size < offset or rewritten
+                    or file_fingerprint(path, offset) != state["fingerprint"]):
+                state = None
+
+        with open(path, "rb") as f:
+            header_line = f.readline()
+        header = header_line.decode().strip().split(",")
+        if state is None:
+            stats, start = DatasetStats(), len(header_line)
+        else:
+            stats, start = DatasetStats.from_dict(state["stats"]), state["offset"]
+
+        if state is None or start < stat.st_size or stat.st_mtime_ns != state.get("mtime_ns"):
+            for df in read_blocks(path, start, header):
+                stats.update(df)
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{store_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"version": STORE_VERSION, "path": os.path.abspath(path), "offset": stat.st_size,
+                           "mtime_ns": stat.st_mtime_ns, "fingerprint": file_fingerprint(path, stat.st_size),
+                           "stats": stats.to_dict()}, f)
+            os.replace(tmp_path, store_path)
+
+        _memory[key] = stats
+        return stats
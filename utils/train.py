@@ -0,0 +1,218 @@
+"""
+Train the five notebook models concurrently under a shared core budget.
+
+Each model is fitted in its own process, with the same estimators,
+random_state, split and preprocessing as the notebook. The process gets a
+share of the cores through its library's threading parameter (n_jobs,
+thread_count) and a matching threadpoolctl limit for OpenMP/BLAS, so the
+fits together never use more than the budget. Spare cores go to the
+costliest fits; the cost of each model comes from the previous run's
+training log when there is one, else from rough defaults.
+
+After fitting, every model is saved as trained_models/<name>_model.joblib
+with its preprocessing pipeline. Tree models are also re-exported to
+compiled form, and the manifest is rebuilt. The fits write into a staging
+directory; only when all of them succeeded are the files moved into place
+(os.replace) and the manifest written last, so a failed fit leaves the
+previous models and manifest untouched. Each run appends its timing and
+peak-memory record to trained_models/training_log.jsonl.
+
+    python -m utils.train                        # all cores, all five models
+    python -m utils.train --cores 8 --models catboost lightgbm xgboost
+    python -m utils.train --tuned                # with utils.tune's best parameters
+
+Run python -m utils.evaluation afterwards to refresh the leaderboard.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.pipeline import MODELS_DIR
+
+LOG_NAME = "training_log.jsonl"
+MODEL_NAMES = ["logistic_regression", "random_forest", "xgboost", "lightgbm", "catboost"]
+# Relative CPU cost of a fit, used until a training log has measured ones
+DEFAULT_COSTS = {"logistic_regression": 1, "random_forest": 3, "xgboost": 2, "lightgbm": 1, "catboost": 4}
+# lbfgs on a binary target doesn't use extra threads
+SINGLE_THREADED = {"logistic_regression"}
+
+
+def make_model(name, threads=1, params=None):
+    """The notebook's estimator for `name`, limited to `threads` threads; `params` override its defaults."""
+    params = params or {}
+    if name == "logistic_regression":
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(random_state=42, **params)
+    if name == "random_forest":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(random_state=42, n_jobs=threads, **params)
+    if name == "xgboost":
+        from xgboost import XGBClassifier
+        return XGBClassifier(random_state=42, eval_metric='logloss', n_jobs=threads, **params)
+    if name == "lightgbm":
+        from lightgbm import LGBMClassifier
+        return LGBMClassifier(random_state=42, n_jobs=threads, verbose=-1, **params)
+    if name == "catboost":
+        from catboost import CatBoostClassifier
+        return CatBoostClassifier(random_state=42, verbose=False, thread_count=threads,
+                                  allow_writing_files=False, **params)
+    raise KeyError(f"unknown model {name!r}; expected one of {MODEL_NAMES}")
+
+
+def read_costs(models_dir=MODELS_DIR):
+    """CPU-seconds per model from the last training run, or DEFAULT_COSTS."""
+    costs = dict(DEFAULT_COSTS)
+    log_path = os.path.join(models_dir, LOG_NAME)
+    if os.path.exists(log_path):
+        with open(log_path) as f:
+            lines = f.read().splitlines()
+        if lines:
+            for record in json.loads(lines[-1])["models"]:
+                costs[record["model"]] = max(record["fit_s"] * record["threads"], 1e-3)
+    return costs
+
+
+def plan_threads(names, cores, costs):
+    """
+    Threads per model for `cores` cores.
+
+    Every model gets one thread; each spare core then goes to the model with
+    the highest cost per thread. With fewer cores than models, the extra fits
+    wait for a free core instead of sharing one.
+    """
+    threads = {name: 1 for name in names}
+    scalable = [name for name in names if name not in SINGLE_THREADED]
+    for _ in range(cores - len(names)):
+        if not scalable:
+            break
+        name = max(scalable, key=lambda n: costs.get(n, 1) / threads[n])
+        threads[name] += 1
+    return threads
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _fit_model(name, threads, X_train, y_train, out_dir, params=None):
+    """Worker: fit, save and (for tree models) compile one model into out_dir."""
+    import joblib
+    from threadpoolctl import threadpool_limits
+
+    from utils.compiled_trees import export_compiled
+
+    rss_before = _peak_rss_mb()
+    with threadpool_limits(limits=threads):
+        model = make_model(name, threads, params)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_s = time.perf_counter() - start
+
+    model_path = os.path.join(out_dir, f"{name}_model.joblib")
+    joblib.dump(model, model_path)
+    try:
+        export_compiled(model, model_path, X_train)
+        compiled = True
+    except TypeError:
+        compiled = False
+    return {
+        "model": name,
+        "threads": threads,
+        "fit_s": round(fit_s, 3),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_before_mb": round(rss_before, 1),
+        "compiled": compiled,
+        "params": params,
+        "path": model_path,
+    }
+
+
+def _install(staged_model_path, models_dir):
+    """Move a staged model, its pipeline and compiled export into models_dir; returns the final model path."""
+    from utils.compiled_trees import compiled_path
+    from utils.pipeline import pipeline_path
+
+    for staged in (staged_model_path, pipeline_path(staged_model_path), compiled_path(staged_model_path)):
+        target = os.path.join(models_dir, os.path.basename(staged))
+        if os.path.exists(staged):
+            os.replace(staged, target)
+        elif os.path.exists(target):
+            # A compiled file from an older fit would shadow the new model
+            os.remove(target)
+    return os.path.join(models_dir, os.path.basename(staged_model_path))
+
+
+def train_models(names=MODEL_NAMES, cores=None, models_dir=MODELS_DIR, tuned=False):
+    """
+    Fit `names` concurrently within `cores` cores; returns the run record.
+
+    With `tuned`, models that have a utils.tune result use its parameters.
+    """
+    from utils.data import load_dataset
+    from utils.evaluation import holdout_split
+    from utils.pipeline import PreprocessingPipeline, encode_target, save_pipeline
+    from utils.registry import write_manifest
+    from utils.tune import load_best_params
+
+    cores = cores or os.cpu_count() or 1
+    names = list(names)
+    costs = read_costs(models_dir)
+    threads = plan_threads(names, cores, costs)
+
+    start = time.perf_counter()
+    train_df, _ = holdout_split(load_dataset())
+    pipeline = PreprocessingPipeline().fit(train_df)
+    X_train, y_train = pipeline.transform_frame(train_df), encode_target(train_df)
+    os.makedirs(models_dir, exist_ok=True)
+
+    records = []
+    # One fresh process per fit, so each peak RSS belongs to one model.
+    # Costliest first, so they don't end up waiting behind cheap ones.
+    order = sorted(names, key=lambda n: -costs.get(n, 1) / threads[n])
+    # Same filesystem as models_dir, so the files can be moved into place with os.replace
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=models_dir)
+    try:
+        with ProcessPoolExecutor(min(len(names), cores), max_tasks_per_child=1) as pool:
+            futures = [pool.submit(_fit_model, name, threads[name], X_train, y_train, staging,
+                                   load_best_params(name) if tuned else None)
+                       for name in order]
+            for future in as_completed(futures):
+                record = future.result()
+                save_pipeline(pipeline, record["path"])
+                records.append(record)
+                print(f"{record['model']:<22} {record['threads']:>2} threads  {record['fit_s']:7.2f}s  "
+                      f"peak {record['peak_rss_mb']:7.1f} MB")
+        # Every fit succeeded: replace the old files, then the manifest
+        for record in records:
+            record["path"] = _install(record["path"], models_dir).replace(os.sep, "/")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    write_manifest(os.path.join(models_dir, "manifest.json"), models_dir)
+    run = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cores": cores,
+        "wall_s": round(time.perf_counter() - start, 3),
+        # What the fits would take back to back at these thread counts
+        "sum_fit_s": round(sum(r["fit_s"] for r in records), 3),
+        "models": sorted(records, key=lambda r: names.index(r["model"])),
+    }
+    with open(os.path.join(models_dir, LOG_NAME), "a") as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrain the models concurrently within a core budget.")
+    parser.add_argument("--cores", type=int, default=None, help="Core budget (default: all cores)")
+    parser.add_argument("--models", nargs="+", default=MODEL_NAMES, choices=MODEL_NAMES)
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--tuned", action="store_true", help="Use the parameters found by utils.tune")
+    args = parser.parse_args()
+    run = train_models(args.models, args.cores, args.models_dir, args.tuned)
+    print(f"Trained {len(run['models'])} models on {run['cores']} cores in {run['wall_s']:.1f}s "
+          f"(fits alone: {run['sum_fit_s']:.1f}s) -> {args.models_dir}")
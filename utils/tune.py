@@ -0,0 +1,277 @@
+"""
+Time-budgeted hyperparameter search for the boosted models (Hyperband).
+
+Configurations are sampled at random from SEARCH_SPACES and raced with
+successive halving. Each bracket starts many configurations with a small
+number of boosting rounds and gives only the best 1/ETA of them ETA times
+more rounds, up to MAX_ROUNDS. Within a trial the library's own early
+stopping (EARLY_STOPPING_ROUNDS on the validation split) ends unpromising
+runs even earlier. Trials of a rung run in parallel processes.
+
+Data: the notebook's training rows (the test rows are never used here),
+split again 80/20 into fit/validation. Trials are ranked by validation log
+loss.
+
+Every finished trial is appended to trained_models/tuning/<model>_trials.jsonl.
+Sampling is seeded, so a rerun proposes the same configurations and takes
+their results from the log instead of refitting. An interrupted or
+out-of-time search therefore resumes where it stopped. Once the wall-clock
+budget is used up, pending trials are cancelled and running ones abandoned;
+whatever finished in time is kept. The best configuration is written to
+<model>_best.json, which python -m utils.train --tuned picks up.
+
+    python -m utils.tune --models lightgbm xgboost --budget-minutes 30 --workers 4
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from utils.pipeline import MODELS_DIR
+
+TUNING_DIR = os.path.join(MODELS_DIR, "tuning")
+TUNABLE = ["catboost", "lightgbm", "xgboost"]
+MIN_ROUNDS = 50
+MAX_ROUNDS = 1350
+ETA = 3
+EARLY_STOPPING_ROUNDS = 50
+
+
+def _log_uniform(rng, low, high):
+    return float(np.exp(rng.uniform(np.log(low), np.log(high))))
+
+
+# name -> rng -> params (on top of make_model's defaults)
+SEARCH_SPACES = {
+    "xgboost": lambda rng: {
+        "max_depth": int(rng.integers(3, 11)),
+        "learning_rate": _log_uniform(rng, 0.01, 0.3),
+        "subsample": float(rng.uniform(0.6, 1.0)),
+        "colsample_bytree": float(rng.uniform(0.6, 1.0)),
+        "min_child_weight": _log_uniform(rng, 1, 20),
+        "reg_lambda": _log_uniform(rng, 0.1, 10),
+    },
+    "lightgbm": lambda rng: {
+        "num_leaves": int(rng.integers(8, 129)),
+        "learning_rate": _log_uniform(rng, 0.01, 0.3),
+        "subsample": float(rng.uniform(0.6, 1.0)),
+        "subsample_freq": 1,
+        "colsample_bytree": float(rng.uniform(0.6, 1.0)),
+        "min_child_samples": int(rng.integers(5, 101)),
+        "reg_lambda": _log_uniform(rng, 0.1, 10),
+    },
+    "catboost": lambda rng: {
+        "depth": int(rng.integers(4, 11)),
+        "learning_rate": _log_uniform(rng, 0.01, 0.3),
+        "l2_leaf_reg": _log_uniform(rng, 1, 10),
+        "random_strength": _log_uniform(rng, 0.1, 10),
+        "bagging_temperature": float(rng.uniform(0, 1)),
+    },
+}
+
+_data = None   # worker: (X_fit, y_fit, X_val, y_val)
+
+
+def _init_worker(data):
+    global _data
+    _data = data
+
+
+def trial_key(name, params, rounds, data_hash):
+    payload = json.dumps([name, params, rounds, data_hash], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _fit_early_stopped(name, params, rounds, threads):
+    """Fit with up to `rounds` boosting rounds and native early stopping on the validation rows."""
+    from utils.train import make_model
+
+    X_fit, y_fit, X_val, y_val = _data
+    model = make_model(name, threads, params={**params, "n_estimators": rounds})
+    if name == "xgboost":
+        model.set_params(early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+        best_iteration = model.best_iteration
+    elif name == "lightgbm":
+        import lightgbm
+        model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)],
+                  callbacks=[lightgbm.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+        best_iteration = model.best_iteration_ - 1
+    else:
+        model.fit(X_fit, y_fit, eval_set=(X_val, y_val), early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        best_iteration = model.get_best_iteration()
+    return model, int(best_iteration)
+
+
+def _run_trial(name, params, rounds, threads):
+    """Worker: one early-stopped fit; returns its validation scores."""
+    from sklearn.metrics import accuracy_score, log_loss
+    from threadpoolctl import threadpool_limits
+
+    start = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        model, best_iteration = _fit_early_stopped(name, params, rounds, threads)
+        probs = model.predict_proba(_data[2])[:, 1]
+    return {
+        "val_logloss": float(log_loss(_data[3], probs)),
+        "val_accuracy": float(accuracy_score(_data[3], probs >= 0.5)),
+        "best_iteration": best_iteration,
+        "fit_s": round(time.perf_counter() - start, 3),
+    }
+
+
+def hyperband_brackets(min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS, eta=ETA):
+    """[(bracket, [(n configs, rounds) per rung])], most aggressive bracket first."""
+    s_max = int(math.floor(math.log(max_rounds / min_rounds, eta) + 1e-9))
+    brackets = []
+    for s in range(s_max, -1, -1):
+        n = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+        rungs = [(max(1, n // eta ** i), int(round(max_rounds * eta ** (i - s)))) for i in range(s + 1)]
+        brackets.append((s, rungs))
+    return brackets
+
+
+def validation_split(seed=42):
+    """(X_fit, y_fit, X_val, y_val) from the notebook's training rows only."""
+    from sklearn.model_selection import train_test_split
+
+    from utils.data import TARGET, load_dataset
+    from utils.evaluation import holdout_split
+    from utils.pipeline import PreprocessingPipeline, encode_target
+
+    train_df, _ = holdout_split(load_dataset())
+    fit_df, val_df = train_test_split(train_df, test_size=0.2, random_state=seed, stratify=train_df[TARGET])
+    pipeline = PreprocessingPipeline().fit(fit_df)
+    return (pipeline.transform_frame(fit_df), encode_target(fit_df),
+            pipeline.transform_frame(val_df), encode_target(val_df))
+
+
+class TrialLog:
+    """Append-only JSONL of finished trials, indexed by trial key."""
+
+    def __init__(self, path):
+        self.path = path
+        self.trials = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        trial = json.loads(line)
+                        self.trials[trial["key"]] = trial
+
+    def add(self, trial):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(trial) + "\n")
+        self.trials[trial["key"]] = trial
+
+    def best(self, data_hash):
+        trials = [t for t in self.trials.values() if t["data_hash"] == data_hash]
+        return min(trials, key=lambda t: t["val_logloss"]) if trials else None
+
+
+def tune(name, budget_s, workers=1, cores=None, seed=0, tuning_dir=TUNING_DIR):
+    """Hyperband search for `name` within `budget_s` seconds; returns the best trial."""
+    from utils.data import file_hash
+
+    deadline = time.monotonic() + budget_s
+    cores = cores or os.cpu_count() or 1
+    threads = max(1, cores // workers)
+    data_hash = file_hash()
+    log = TrialLog(os.path.join(tuning_dir, f"{name}_trials.jsonl"))
+    sample = SEARCH_SPACES[name]
+    pool = None
+
+    def run(batch, timed=True):
+        """Results for [(params, rounds)], from the log where possible; `timed` ones stop at the deadline."""
+        nonlocal pool
+        keys = [trial_key(name, params, rounds, data_hash) for params, rounds in batch]
+        todo = [(key, params, rounds) for key, (params, rounds) in zip(keys, batch) if key not in log.trials]
+        if todo:
+            if pool is None:
+                pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(validation_split(),))
+            futures = {pool.submit(_run_trial, name, params, rounds, threads): (key, params, rounds)
+                       for key, params, rounds in todo}
+
+            def add(future):
+                key, params, rounds = futures[future]
+                if key not in log.trials:
+                    log.add({"key": key, "model": name, "data_hash": data_hash, "rounds": rounds,
+                             "threads": threads, "params": params, **future.result()})
+
+            try:
+                # Log each trial as it finishes and check the budget in between
+                timeout = max(0, deadline - time.monotonic()) if timed else None
+                for future in as_completed(futures, timeout=timeout):
+                    add(future)
+                    if timed and time.monotonic() >= deadline and not all(f.done() for f in futures):
+                        raise TimeoutError
+            except TimeoutError:
+                for future in futures:
+                    future.cancel()
+                # Keep whatever finished before the rung was cut short
+                for future in futures:
+                    if future.done() and not future.cancelled():
+                        add(future)
+                raise
+        return [log.trials[key] for key in keys]
+
+    try:
+        # Defaults at full length, as the reference the search has to beat (always finished,
+        # so there is a best trial however small the budget)
+        run([({}, MAX_ROUNDS)], timed=False)
+        for s, rungs in hyperband_brackets():
+            configs = [sample(np.random.default_rng([seed, s, i])) for i in range(rungs[0][0])]
+            for i, (_, rounds) in enumerate(rungs):
+                if time.monotonic() >= deadline:
+                    raise TimeoutError
+                results = run([(params, rounds) for params in configs])
+                if i + 1 < len(rungs):
+                    ranked = sorted(zip(results, configs), key=lambda rc: rc[0]["val_logloss"])
+                    configs = [params for _, params in ranked[:rungs[i + 1][0]]]
+    except TimeoutError:
+        # Trials still running are abandoned rather than waited for
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = None
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    best = log.best(data_hash)
+    with open(os.path.join(tuning_dir, f"{name}_best.json"), "w") as f:
+        # The early-stopped length becomes the tuned n_estimators
+        json.dump({"params": {**best["params"], "n_estimators": best["best_iteration"] + 1},
+                   "val_logloss": best["val_logloss"], "val_accuracy": best["val_accuracy"],
+                   "trials": len(log.trials), "data_hash": data_hash}, f, indent=2)
+        f.write("\n")
+    return best
+
+
+def load_best_params(name, tuning_dir=TUNING_DIR):
+    """Tuned params for `name`, or None when it hasn't been tuned."""
+    path = os.path.join(tuning_dir, f"{name}_best.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["params"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hyperband search for the boosted models.")
+    parser.add_argument("--models", nargs="+", default=TUNABLE, choices=TUNABLE)
+    parser.add_argument("--budget-minutes", type=float, default=60, help="Wall-clock budget per model")
+    parser.add_argument("--workers", type=int, default=1, help="Trials run in parallel")
+    parser.add_argument("--cores", type=int, default=None, help="Cores shared by the workers (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for name in args.models:
+        start = time.perf_counter()
+        best = tune(name, args.budget_minutes * 60, args.workers, args.cores, args.seed)
+        print(f"{name:<10} best val logloss {best['val_logloss']:.5f}  accuracy {best['val_accuracy']:.5f}  "
+              f"rounds {best['best_iteration'] + 1}  ({time.perf_counter() - start:.0f}s)  {best['params']}")